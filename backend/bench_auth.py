@@ -0,0 +1,42 @@
+"""
+Compare the cost of authenticating a request with a signed token
+against the old per-request "User" lookup.
+
+Usage: python bench_auth.py [user_id]
+"""
+import os
+import sys
+import timeit
+
+os.environ.setdefault("AUTH_SECRET_KEY", "bench-secret")
+
+import db
+from cache import user_cache
+from services import auth_service
+
+
+def bench(label: str, fn, number: int) -> None:
+    total = timeit.timeit(fn, number=number)
+    print(f"{label:<28} {total / number * 1e6:10.1f} us/op  ({number} runs)")
+
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    token = f"Bearer {auth_service.build_token(user_id or 1)}"
+
+    bench("verify_token (CPU only)", lambda: auth_service.verify_token(token), 100_000)
+
+    if user_id is None:
+        print("Pass an existing user id to also time the DB lookup.")
+        return
+
+    def db_lookup():
+        # Bypass the in-process cache to measure what every request used to pay
+        user_cache.invalidate(user_id)
+        db.fetch_user_by_id(user_id)
+
+    bench("fetch_user_by_id (DB)", db_lookup, 500)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the two calendar engines (CALENDAR_ENGINE=python|sql) on a scratch
+user with many supplements: check they return the same days, then time a
+month and a 12-month range. The scratch user is deleted afterwards.
+
+Usage: python bench_calendar.py [supplements]
+"""
+import random
+import sys
+import timeit
+import uuid
+from datetime import date, datetime, time, timedelta
+
+import db
+import recurrence
+from services import calendar_service, period_service
+
+CYCLES = ["daily", "weekly", "monthly", "none", "2d", "3w", "2m"]
+
+
+def seed_user(count: int) -> int:
+    user = db.create_user_email(f"bench-{uuid.uuid4().hex}@bench.local", "bench", "bench", True)
+    user_id = user["id"]
+    catalog = db.fetch_supplements()
+    if not catalog:
+        raise SystemExit("The Supplement catalog is empty; nothing to benchmark with.")
+    rng = random.Random(count)
+    with db.unit_of_work() as uow:
+        for _ in range(count):
+            row = db.add_user_supplement(
+                user_id, rng.choice(catalog)["id"], rng.choice(CYCLES), time(rng.randrange(6, 23), 0), uow=uow
+            )
+            # Spread start dates over several years so long-running schedules are covered
+            uow.conn.cursor().execute(
+                'UPDATE "UserSupplement" SET start_date = %s WHERE id = %s',
+                (date.today() - timedelta(days=rng.randrange(0, 365 * 5)), row["id"]),
+            )
+        db.upsert_pregnancy_info(user_id, due_date=date.today() + timedelta(days=140), pregnancy_start=date.today() - timedelta(days=140), uow=uow)
+        # Irregular history so the projection uses a non-28-day cycle
+        start = date.today() - timedelta(days=400)
+        for _ in range(8):
+            db.add_period_log(user_id, start, start + timedelta(days=rng.randrange(3, 7)), uow=uow)
+            start += timedelta(days=rng.randrange(24, 36))
+        for i in range(30):
+            db.upsert_calendar_event(user_id, f"todo {i}", date.today() + timedelta(days=i * 7), type="todo", uow=uow)
+        # Repeating todos with a cancelled, a renamed and a moved occurrence
+        first = datetime.combine(date.today() - timedelta(days=60), time(8, 0))
+        for rrule in ("FREQ=DAILY;INTERVAL=3", "FREQ=WEEKLY;COUNT=20", "FREQ=MONTHLY;UNTIL=" + f"{date.today() + timedelta(days=200):%Y%m%d}"):
+            series = db.upsert_calendar_event(user_id, rrule, first, type="todo", rrule=rrule, uow=uow)
+            rule = recurrence.parse_rrule(rrule).rule
+            db.upsert_event_override(user_id, series["id"], recurrence.nth(first.date(), rule, 3), cancelled=True, uow=uow)
+            db.upsert_event_override(user_id, series["id"], recurrence.nth(first.date(), rule, 4), title="renamed", uow=uow)
+            db.upsert_event_override(
+                user_id, series["id"], recurrence.nth(first.date(), rule, 5),
+                start_datetime=datetime.combine(date.today() + timedelta(days=45), time(8, 0)), uow=uow,
+            )
+    period_service.refresh_user(user_id)
+    return user_id
+
+
+def normalized(days):
+    # Engines may order items within a day differently
+    return [
+        (
+            d.date,
+            sorted((s.name, s.time) for s in d.supplements),
+            sorted((t.id, t.text, t.occurrenceDate) for t in d.todos),
+            d.pregnancyPhase,
+            d.menstrualPhase,
+        )
+        for d in days
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    user_id = seed_user(count)
+    today = date.today()
+    windows = {
+        "month": calendar_service.CalendarWindow.month(today.year, today.month),
+        "12 months": calendar_service.parse_month_range(f"{today.year}-01", f"{today.year}-12"),
+    }
+    ok = True
+    try:
+        for label, window in windows.items():
+            results = {}
+            for engine in ("python", "sql"):
+                results[engine] = calendar_service.build_calendar_days(user_id, window, engine=engine)
+                total = timeit.timeit(lambda: calendar_service.build_calendar_days(user_id, window, engine=engine), number=20)
+                print(f"{label:<10} {engine:<7} {total / 20 * 1000:8.2f} ms/op  ({count} supplements)")
+            same = normalized(results["python"]) == normalized(results["sql"])
+            ok = ok and same
+            print(f"{label:<10} engines agree: {'yes' if same else 'NO'}")
+    finally:
+        db.delete_user_by_id(user_id)
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
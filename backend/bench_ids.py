@@ -0,0 +1,66 @@
+"""
+Throughput and uniqueness check for the id generator in ids.py.
+Needs no database: WORKER_ID defaults to 0 here instead of a leased id.
+
+Usage: python bench_ids.py
+"""
+import os
+import sys
+import timeit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+os.environ.setdefault("WORKER_ID", "0")
+
+from ids import IdGenerator, id_generator
+
+PER_THREAD = 50_000
+THREADS = 8
+PROCESSES = 4
+
+
+def _ids_in_thread(_):
+    ids = [id_generator.next_id() for _ in range(PER_THREAD)]
+    # Within one thread the lock makes ids strictly increasing
+    assert all(a < b for a, b in zip(ids, ids[1:])), "ids went backwards"
+    return ids
+
+
+def _ids_in_process(worker_id):
+    generator = IdGenerator(worker_id)
+    return [generator.next_id() for _ in range(PER_THREAD)]
+
+
+def main():
+    number = 200_000
+    total = timeit.timeit(id_generator.next_id, number=number)
+    print(f"next_id single thread      {number / total:12,.0f} ids/s")
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        batches = list(pool.map(_ids_in_thread, range(THREADS)))
+    ids = [i for batch in batches for i in batch]
+    threads_ok = len(ids) == len(set(ids))
+    print(f"{THREADS} threads x {PER_THREAD}         {'unique' if threads_ok else 'DUPLICATES'}")
+
+    with ProcessPoolExecutor(max_workers=PROCESSES) as pool:
+        batches = list(pool.map(_ids_in_process, range(PROCESSES)))
+    ids = [i for batch in batches for i in batch]
+    procs_ok = len(ids) == len(set(ids))
+    print(f"{PROCESSES} processes x {PER_THREAD}       {'unique' if procs_ok else 'DUPLICATES'}")
+
+    # Children forked from this process must not replay the parent's sequence
+    parent_last = id_generator.next_id()
+    pid = os.fork() if hasattr(os, "fork") else None
+    if pid == 0:
+        os._exit(0 if id_generator._last_ms == 0 else 1)
+    fork_ok = True
+    if pid:
+        _, status = os.waitpid(pid, 0)
+        fork_ok = os.waitstatus_to_exitcode(status) == 0
+        print(f"fork resets generator       {'yes' if fork_ok else 'NO'}")
+    assert id_generator.next_id() > parent_last
+
+    return threads_ok and procs_ok and fork_ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
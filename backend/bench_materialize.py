@@ -0,0 +1,112 @@
+"""
+Time the nightly supplement reminder job (services/materialize_service.py) on
+many scratch users. Each user gets a daily supplement at the default time and
+one every other day at 21:00. The job runs three times:
+
+- first run: the whole rolling window, as for a new deployment
+- nightly: the one day the horizon moves forward, as on every later night
+- rerun: the whole window again with every row already there (all conflicts)
+
+The scratch rows use negative ids, which real rows never have, and are deleted
+afterwards. Run `python -m migrations upgrade` first.
+
+Usage: python bench_materialize.py [users] [batch_size]
+"""
+import sys
+from datetime import date, timedelta
+
+import db
+from services import materialize_service
+
+SCRATCH = 'BETWEEN %(first)s AND -1'
+
+
+def seed(users: int) -> None:
+    catalog = db.fetch_supplements()
+    if not catalog:
+        raise SystemExit("The Supplement catalog is empty; nothing to benchmark with.")
+    params = {"first": -users, "supplement": catalog[0]["id"], "start": date.today() - timedelta(days=30)}
+    with db.unit_of_work() as uow:
+        cur = uow.conn.cursor()
+        cur.execute(
+            'INSERT INTO "User" (id, email, provider, social_id, nickname, is_pregnant, gender, created_at, updated_at) '
+            "SELECT -g, 'bench' || g || '@bench.local', 'bench', 'bench-' || g, 'bench', FALSE, 'F', now(), now() "
+            'FROM generate_series(1, -%(first)s) g',
+            params,
+        )
+        cur.execute(
+            'INSERT INTO "UserSupplement" (id, user_id, supplement_id, cycle, time_of_day, start_date) '
+            "SELECT -2 * g, -g, %(supplement)s, 'daily', NULL, %(start)s FROM generate_series(1, -%(first)s) g "
+            'UNION ALL '
+            "SELECT -2 * g - 1, -g, %(supplement)s, '2d', TIME '21:00', %(start)s FROM generate_series(1, -%(first)s) g",
+            params,
+        )
+
+
+def cleanup(users: int) -> None:
+    params = {"first": -users}
+    with db.unit_of_work() as uow:
+        cur = uow.conn.cursor()
+        cur.execute(
+            'DELETE FROM "Notification" WHERE event_id IN '
+            f'(SELECT id FROM "CalendarEvent" WHERE user_id {SCRATCH})',
+            params,
+        )
+        for table in ("CalendarEvent", "UserSupplement", "UserDataVersion"):
+            cur.execute(f'DELETE FROM "{table}" WHERE user_id {SCRATCH}', params)
+        cur.execute(f'DELETE FROM "User" WHERE id {SCRATCH}', params)
+
+
+def events_without_reminder(users: int) -> int:
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f'SELECT count(*) AS n FROM "CalendarEvent" e WHERE e.user_id {SCRATCH} '
+            'AND NOT EXISTS (SELECT 1 FROM "Notification" n WHERE n.event_id = e.id)',
+            {"first": -users},
+        )
+        return cur.fetchone()["n"]
+
+
+def run(label: str, users: int, start: date, until: date, batch_size: int) -> dict:
+    report = materialize_service.materialize_users(start, until, batch_size, after_user_id=-users - 1, through_user_id=-1)
+    rows = report["events"] + report["reminders"]
+    print(
+        f"{label:<10} {(until - start).days:>2} days  {report['users']} users  {report['batches']} batches  "
+        f"{report['events']} events + {report['reminders']} reminders in {report['seconds']:.2f}s "
+        f"({rows / max(report['seconds'], 1e-6):,.0f} rows/s)"
+    )
+    return report
+
+
+def check(label, actual, expected):
+    ok = actual == expected
+    print(f"{'OK ' if ok else 'FAIL'} {label}: {actual} (expected {expected})")
+    return ok
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else materialize_service.MATERIALIZE_BATCH_USERS
+    start, until = materialize_service._window()
+    seed(users)
+    try:
+        first = run("first run", users, start, until, batch_size)
+        nightly = run("nightly", users, until, until + timedelta(days=1), batch_size)
+        rerun = run("rerun", users, start, until, batch_size)
+        days = (until - start).days
+        # Daily at 09:00 plus every other day at 21:00 (started 30 days ago, an even offset)
+        expected = users * (days + (days + 1) // 2)
+        return all([
+            check("first run events", first["events"], expected),
+            check("first run reminders", first["reminders"], expected),
+            check("nightly events", nightly["events"], users * (1 + (days + 1) % 2)),
+            check("rerun events", rerun["events"], 0),
+            check("events without a reminder", events_without_reminder(users), 0),
+        ])
+    finally:
+        cleanup(users)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,85 @@
+"""
+Check period_prediction against utils.calculate_period_phase for regular
+28-day histories, then time estimate_batch() and phases_for_window() for
+many synthetic users. Needs no database.
+
+Usage: python bench_period.py [users]
+"""
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+
+import period_prediction
+import utils
+
+
+def regular_history(last: date, cycles: int) -> list[date]:
+    return [last - timedelta(days=28 * k) for k in range(cycles - 1, -1, -1)]
+
+
+def check(cases: int) -> bool:
+    rng = random.Random(2025)
+    for _ in range(cases):
+        last = date(2020, 1, 1) + timedelta(days=rng.randrange(365 * 5))
+        starts = regular_history(last, rng.randrange(1, 8))
+        ends = [s + timedelta(days=4) for s in starts]
+        estimate = period_prediction.estimate_batch([1], [starts], [ends], years=1)[0]
+        window_start = last + timedelta(days=rng.randrange(0, 300))
+        window_end = window_start + timedelta(days=31)
+        phases = period_prediction.phases_for_window(
+            estimate.cycle_starts, estimate.cycle_length, estimate.period_length, window_start, window_end
+        )
+        for offset in range((window_end - window_start).days):
+            day = window_start + timedelta(days=offset)
+            if day not in phases:
+                # Past the projection horizon
+                continue
+            expected = utils.calculate_period_phase(day, last)
+            if phases[day] != expected:
+                print(f"mismatch: last={last} day={day} got={phases[day]} expected={expected}")
+                return False
+    return True
+
+
+def synthetic_histories(users: int):
+    rng = random.Random(users)
+    starts, ends = [], []
+    for _ in range(users):
+        cycle = rng.randrange(24, 36)
+        current = date(2024, 1, 1) + timedelta(days=rng.randrange(60))
+        row = []
+        for _ in range(rng.randrange(1, 15)):
+            row.append(current)
+            current += timedelta(days=cycle + rng.randrange(-3, 4))
+        starts.append(row)
+        ends.append([s + timedelta(days=rng.randrange(3, 8)) for s in row])
+    return list(range(1, users + 1)), starts, ends
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    if not check(500):
+        raise SystemExit(1)
+    print("28-day histories match utils.calculate_period_phase")
+
+    user_ids, starts, ends = synthetic_histories(users)
+    seconds = timeit.timeit(lambda: period_prediction.estimate_batch(user_ids, starts, ends), number=1)
+    estimates = period_prediction.estimate_batch(user_ids, starts, ends)
+    projected = sum(len(e.cycle_starts) for e in estimates)
+    print(f"estimate_batch: {users} users, {projected} cycle starts, {period_prediction.PROJECTION_YEARS} years: {seconds:.2f}s")
+
+    window_start = date.today()
+    window_end = window_start + timedelta(days=365)
+    seconds = timeit.timeit(
+        lambda: [
+            period_prediction.phases_for_window(e.cycle_starts, e.cycle_length, e.period_length, window_start, window_end)
+            for e in estimates[:1000]
+        ],
+        number=1,
+    )
+    print(f"phases_for_window: 1000 users x 12 months: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Check recurrence.occurrences() and RRULE end dates against the step-by-step
+expander on random schedules, then time both across long start-date spans.
+Needs no database.
+
+Usage: python bench_recurrence.py [cases]
+"""
+import itertools
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+import recurrence
+
+CYCLES = ["daily", "weekly", "monthly", "none", "", "bogus", "0d", "2d", "3w", "2m", "13m"]
+
+
+def random_case(rng: random.Random):
+    start = date(2000, 1, 1) + timedelta(days=rng.randrange(365 * 30))
+    window_start = date(2000, 1, 1) + timedelta(days=rng.randrange(365 * 32))
+    window_end = window_start + timedelta(days=rng.randrange(0, 400))
+    until = None if rng.random() < 0.5 else start + timedelta(days=rng.randrange(-30, 365 * 5))
+    # Month-end starts exercise clamping (Jan 31 -> Feb 28 -> Mar 31)
+    if rng.random() < 0.2:
+        start = date(start.year, start.month, 28) + timedelta(days=rng.randrange(4))
+    return start, rng.choice(CYCLES), window_start, window_end, until
+
+
+def check(cases: int) -> bool:
+    rng = random.Random(2025)
+    for i in range(cases):
+        args = random_case(rng)
+        fast = list(recurrence.occurrences(*args))
+        slow = list(recurrence.naive_occurrences(*args))
+        if fast != slow:
+            print(f"MISMATCH for {args}:\n  fast={fast[:5]}...\n  slow={slow[:5]}...")
+            return False
+    print(f"{cases} random schedules match the naive expander")
+    return True
+
+
+def check_rrules(cases: int) -> bool:
+    """recurrence.last_occurrence() against the last date the naive expander yields under COUNT / UNTIL."""
+    rng = random.Random(2026)
+    for _ in range(cases):
+        start = datetime(2000, 1, 1, rng.randrange(24)) + timedelta(days=rng.randrange(365 * 30))
+        freq = rng.choice(["DAILY", "WEEKLY", "MONTHLY", "YEARLY"])
+        text = f"FREQ={freq};INTERVAL={rng.randrange(1, 4)}"
+        if rng.random() < 0.5:
+            text += f";COUNT={rng.randrange(1, 50)}"
+        else:
+            until = start + timedelta(days=rng.randrange(0, 365 * 5), hours=rng.randrange(-12, 12))
+            text += f";UNTIL={until:%Y%m%dT%H%M%S}"
+        series = recurrence.parse_rrule(text)
+        if recurrence.parse_rrule(recurrence.format_rrule(series)) != series:
+            print(f"ROUND TRIP failed for {text}")
+            return False
+        try:
+            last = recurrence.last_occurrence(start, series)
+        except ValueError:
+            last = None
+        expanded = recurrence.naive_occurrences(
+            start.date(), series.rule, start.date(), date(9000, 1, 1), until=series.until and series.until.date()
+        )
+        dates = [
+            d for d in itertools.islice(expanded, series.count)
+            if series.until is None or datetime.combine(d, start.time()) <= series.until
+        ]
+        expected = datetime.combine(dates[-1], start.time()) if dates else None
+        if last != expected:
+            print(f"MISMATCH for {text} from {start}: {last} != {expected}")
+            return False
+    print(f"{cases} random RRULEs end where the naive expander does")
+    return True
+
+
+def bench() -> None:
+    window_start, window_end = date(2026, 3, 1), date(2026, 4, 1)
+    for years in (1, 10, 30):
+        start = window_start - timedelta(days=365 * years)
+        for cycle in ("daily", "weekly", "monthly"):
+            fast = timeit.timeit(lambda: list(recurrence.occurrences(start, cycle, window_start, window_end)), number=200)
+            slow = timeit.timeit(lambda: list(recurrence.naive_occurrences(start, cycle, window_start, window_end)), number=200)
+            print(f"{years:>2}y {cycle:<8} jump {fast / 200 * 1e6:8.1f} us   naive {slow / 200 * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ok = check(cases) and check_rrules(cases // 10)
+    bench()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries also expire after `ttl` seconds.
+    Values are deep-copied in and out so callers can mutate what they get back.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation so a load that raced with a write is not cached
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def generation(self) -> int:
+        """Take before loading from the DB and pass to set() as `since`."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, since: Optional[int] = None) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            if since is not None and since != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+# User aggregates (User + PregnancyInfo + UserProfile) keyed by user id.
+# Shared by db.py and db_async.py; every write to those tables invalidates explicitly.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
+
+# Serialized calendar responses keyed by (user id, requested span, data version).
+# A write bumps the version in "UserDataVersion", so stale entries are simply never asked for again.
+calendar_cache = TTLCache(
+    maxsize=int(os.getenv("CALENDAR_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("CALENDAR_CACHE_TTL", "3600")),
+)
+
+
+# Compiled notification delivery plans (services/delivery_plan.py) keyed by user id.
+# The "UserSetting" helpers invalidate explicitly; the TTL bounds staleness in other processes.
+delivery_plan_cache = TTLCache(
+    maxsize=int(os.getenv("DELIVERY_PLAN_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("DELIVERY_PLAN_CACHE_TTL", "300")),
+)
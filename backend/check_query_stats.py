@@ -0,0 +1,71 @@
+"""
+Smoke test for the statement instrumentation in query_stats.py.
+
+Records a statement through the same call shape as the instrumented cursors
+(caller -> execute -> record), then, when DATABASE_URL is set, runs one real
+query through db.get_conn and checks it was counted. Also checks that slow
+statements are kept without their values.
+
+Usage: python check_query_stats.py
+"""
+import os
+import sys
+
+from query_stats import QueryStats, parameterize
+
+
+class _Cursor:
+    """Stands in for db.InstrumentedCursor: record() runs in the finally of execute()."""
+
+    def __init__(self, stats: QueryStats):
+        self.stats = stats
+
+    def execute(self, query, vars=None):
+        try:
+            return None
+        finally:
+            self.stats.record(query, 1.0, 1)
+
+
+def issue_query(cursor: _Cursor) -> None:
+    cursor.execute('SELECT * FROM "User" WHERE email = %s', ("someone@example.com",))
+
+
+def check(label, actual, expected):
+    ok = actual == expected
+    print(f"{'OK ' if ok else 'FAIL'} {label}: {actual} (expected {expected})")
+    return ok
+
+
+def main():
+    stats = QueryStats(slow_ms=0, keep=10)
+    issue_query(_Cursor(stats))
+    entry = stats.snapshot()[0]
+    slow = stats.slow_query(1)
+    results = [
+        check("statements recorded", entry["calls"], 1),
+        check("caller", list(entry["callers"]), ["__main__.issue_query"]),
+        check("slow statement kept without values", slow["sql"], 'SELECT * FROM "User" WHERE email = $1'),
+        check(
+            "typed literals survive parameterize",
+            parameterize("SELECT TIME '09:00', 'secret', 42"),
+            "SELECT TIME '09:00', $1, $2",
+        ),
+    ]
+
+    if os.getenv("DATABASE_URL"):
+        import db
+        from query_stats import query_stats
+
+        query_stats.reset()
+        with db.get_conn() as conn:
+            conn.cursor().execute("SELECT 1")
+        calls = {q["fingerprint"]: q["calls"] for q in query_stats.snapshot()}
+        results.append(check("instrumented query counted", calls.get("SELECT ?"), 1))
+    else:
+        print("skip instrumented query: DATABASE_URL is not set")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
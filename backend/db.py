@@ -1,29 +1,131 @@
 from __future__ import annotations
 import os
-import random
+import threading
 import time
 from contextlib import contextmanager
 from typing import Optional
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
+from cache import delivery_plan_cache, user_cache
+from query_stats import query_stats
+from ids import id_generator
+import recurrence
+
 load_dotenv()
 
 DEFAULT_DATABASE_URL = os.getenv("DATABASE_URL")
 if not DEFAULT_DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Add it to your environment or .env file.")
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+# Seconds a request may wait for a free connection before giving up
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+# Callers allowed to queue for a connection; beyond this we shed load immediately
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "100"))
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection could be acquired in time (mapped to 503)."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BlockingConnectionPool:
+    """
+    Thread-safe pool that queues callers instead of failing when all connections are out.
+    A semaphore bounds checkouts to maxconn; ThreadedConnectionPool does the bookkeeping.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, dsn: str, acquire_timeout: float, max_waiting: int, **kwargs):
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, dsn, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_waiting = max_waiting
+        self._in_use = 0
+        self._waiting = 0
+
+    def getconn(self, timeout: Optional[float] = None):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_waiting:
+                    raise PoolExhaustedError("Too many requests waiting for a database connection")
+                self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.acquire_timeout if timeout is None else timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                raise PoolExhaustedError("Timed out waiting for a database connection")
+
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        try:
+            self._pool.putconn(conn, close=close or conn.closed)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self) -> None:
+        self._pool.closeall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                # Connections opened and parked in the pool, ready for checkout
+                "idle": len(self._pool._pool),
+                "waiting": self._waiting,
+            }
+
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor that reports every statement to query_stats."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            query_stats.record(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            query_stats.record(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+
 # Initialize Connection Pool
 try:
-    connection_pool = psycopg2.pool.SimpleConnectionPool(
-        1,  # minconn
-        20, # maxconn
+    connection_pool = BlockingConnectionPool(
+        DB_POOL_MIN,
+        DB_POOL_MAX,
         DEFAULT_DATABASE_URL,
-        cursor_factory=RealDictCursor
+        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+        max_waiting=DB_POOL_MAX_WAITING,
+        cursor_factory=InstrumentedCursor
     )
     if connection_pool:
         print("Connection pool created successfully")
@@ -32,97 +134,190 @@ except (Exception, psycopg2.DatabaseError) as error:
     raise error
 
 
+def pool_stats() -> dict:
+    return connection_pool.stats()
+
+
+class UnitOfWork:
+    """
+    One pooled connection and one transaction shared by every helper in a request.
+    Commits on success, rolls back on failure, then returns the connection to the pool.
+    """
+
+    def __init__(self):
+        self.conn = None
+        # Users whose cached aggregate must be dropped again once this transaction ends
+        self.dirty_users: set[int] = set()
+        # Same for compiled delivery plans
+        self.dirty_plans: set[int] = set()
+
+    def invalidate_user(self, user_id: str | int) -> None:
+        uid = int(user_id)
+        self.dirty_users.add(uid)
+        user_cache.invalidate(uid)
+
+    def invalidate_delivery_plan(self, user_id: str | int) -> None:
+        uid = int(user_id)
+        self.dirty_plans.add(uid)
+        delivery_plan_cache.invalidate(uid)
+
+    def __enter__(self) -> "UnitOfWork":
+        self.conn = connection_pool.getconn()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SET TIME ZONE 'Asia/Seoul'")
+        except Exception:
+            connection_pool.putconn(self.conn, close=True)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            connection_pool.putconn(self.conn)
+            self.conn = None
+            for uid in self.dirty_users:
+                user_cache.invalidate(uid)
+            self.dirty_users.clear()
+            for uid in self.dirty_plans:
+                delivery_plan_cache.invalidate(uid)
+            self.dirty_plans.clear()
+        return False
+
+
+def get_uow():
+    """FastAPI dependency: `uow: db.UnitOfWork = Depends(db.get_uow)`."""
+    with UnitOfWork() as uow:
+        yield uow
+
+
 @contextmanager
-def get_conn():
+def unit_of_work(uow: Optional[UnitOfWork] = None):
+    """
+    Yields the caller's unit of work, or opens a fresh one when none is given.
+    Helpers that call other helpers use this so the whole call tree shares one connection.
+    """
+    if uow is not None:
+        yield uow
+        return
+    with UnitOfWork() as own:
+        yield own
+
+
+@contextmanager
+def get_conn(uow: Optional[UnitOfWork] = None):
     """
     Yields a connection from the pool.
     Commits on success, rolls back on failure.
     Returns the connection to the pool when done.
+    Inside a unit of work the shared connection is yielded and the transaction is left to it.
     """
-    conn = connection_pool.getconn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SET TIME ZONE 'Asia/Seoul'")
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        connection_pool.putconn(conn)
+    with unit_of_work(uow) as scope:
+        yield scope.conn
 
 
-def _generate_id() -> int:
-    # Use millisecond timestamp with a small random offset to avoid collisions
-    return int(time.time() * 1000) * 1000 + random.randint(0, 999)
+def explain_query(sql: str) -> list[str]:
+    """
+    Generic plan text for a captured statement with $n placeholders (query_stats.parameterize).
+    Needs PostgreSQL 16+; the statement is not executed.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("EXPLAIN (GENERIC_PLAN) " + sql)
+        return [row["QUERY PLAN"] for row in cur.fetchall()]
 
 
-# ---------------- User & Auth ----------------
+def _generate_id() -> int:
+    # Time-ordered, per-worker unique id; see ids.py for the bit layout
+    return id_generator.next_id()
 
-def _attach_user_details(user: dict) -> dict:
-    if not user:
-        return None
-    
-    user_id = user["id"]
-    with get_conn() as conn:
-        cur = conn.cursor()
-        
-        # Fetch PregnancyInfo
-        cur.execute('SELECT * FROM "PregnancyInfo" WHERE user_id = %s', (user_id,))
-        pregnancy_info = cur.fetchone()
-        user["pregnancy_info"] = dict(pregnancy_info) if pregnancy_info else {}
-        
-        # Fetch UserProfile
-        cur.execute('SELECT * FROM "UserProfile" WHERE user_id = %s', (user_id,))
-        profile = cur.fetchone()
-        user["profile"] = dict(profile) if profile else {}
-        
-    return user
 
+# ---------------- User & Auth ----------------
 
-def fetch_user_by_email(email: str) -> Optional[dict]:
-    with get_conn() as conn:
+# User row with PregnancyInfo and UserProfile embedded as JSON, loaded in one round trip.
+# LATERAL ... LIMIT 1 keeps one row per user even if a detail table has stray duplicates.
+_USER_AGGREGATE_SQL = '''
+    SELECT u.*,
+           COALESCE(p.doc, '{}'::jsonb) AS pregnancy_info,
+           COALESCE(up.doc, '{}'::jsonb) AS profile
+    FROM "User" u
+    LEFT JOIN LATERAL (
+        SELECT to_jsonb(preg) AS doc FROM "PregnancyInfo" preg WHERE preg.user_id = u.id LIMIT 1
+    ) p ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT to_jsonb(prof) AS doc FROM "UserProfile" prof WHERE prof.user_id = u.id LIMIT 1
+    ) up ON TRUE
+'''
+
+
+def _fetch_user_aggregate(where: str, params: tuple, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
-        cur.execute('select * from "User" where email = %s limit 1', (email,))
+        cur.execute(_USER_AGGREGATE_SQL + ' WHERE ' + where + ' LIMIT 1', params)
         user = cur.fetchone()
-        return _attach_user_details(dict(user)) if user else None
+        return dict(user) if user else None
 
 
-def fetch_user_by_social(provider: str, social_id: str) -> Optional[dict]:
-    with get_conn() as conn:
+def fetch_users_by_ids(user_ids: list[int], uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """
+    Batch variant of fetch_user_by_id for admin and notification jobs.
+    Unknown ids are skipped; order follows user id.
+    """
+    if not user_ids:
+        return []
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
-            'select * from "User" where provider = %s and social_id = %s limit 1',
-            (provider, social_id),
+            _USER_AGGREGATE_SQL + ' WHERE u.id = ANY(%s) ORDER BY u.id',
+            ([int(uid) for uid in user_ids],),
         )
-        user = cur.fetchone()
-        return _attach_user_details(dict(user)) if user else None
+        return [dict(row) for row in cur.fetchall()]
+
+
+def fetch_user_by_email(email: str, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    return _fetch_user_aggregate('u.email = %s', (email,), uow=uow)
+
 
+def fetch_user_by_social(provider: str, social_id: str, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    return _fetch_user_aggregate('u.provider = %s AND u.social_id = %s', (provider, social_id), uow=uow)
 
-def upsert_social_user(provider: str, social_id: str, email: str, nickname: str) -> dict:
+
+def upsert_social_user(provider: str, social_id: str, email: str, nickname: str, uow: Optional[UnitOfWork] = None) -> dict:
     """
     Returns existing user if found by provider/social_id or email, otherwise inserts.
     """
-    existing = fetch_user_by_social(provider, social_id)
-    if existing:
-        return existing
+    with unit_of_work(uow) as uow:
+        existing = fetch_user_by_social(provider, social_id, uow=uow)
+        if existing:
+            return existing
 
-    user_by_email = fetch_user_by_email(email)
-    with get_conn() as conn:
-        cur = conn.cursor()
+        user_by_email = fetch_user_by_email(email, uow=uow)
+        cur = uow.conn.cursor()
         if user_by_email:
+            uow.invalidate_user(user_by_email["id"])
             cur.execute(
-                'update "User" set provider = %s, social_id = %s, nickname = %s, updated_at = now() where id = %s returning *',
+                'update "User" set provider = %s, social_id = %s, nickname = %s, updated_at = now() where id = %s returning id',
                 (provider, social_id, nickname, user_by_email["id"]),
             )
         else:
             cur.execute(
                 'insert into "User" (id, email, provider, social_id, nickname, is_pregnant, created_at, updated_at) '
-                'values (%s, %s, %s, %s, %s, %s, now(), now()) returning *',
+                'values (%s, %s, %s, %s, %s, %s, now(), now()) '
+                'on conflict (provider, social_id) where social_id is not null '
+                'do update set updated_at = now() '
+                'returning id',
                 (_generate_id(), email, provider, social_id, nickname, False),
             )
         user = cur.fetchone()
-        return _attach_user_details(dict(user)) if user else None
+        if not user:
+            return None
+        # An inserted row is not committed yet; keep it out of the user cache
+        uow.invalidate_user(user["id"])
+        return fetch_user_by_id(user["id"], uow=uow)
 
 
 def create_social_user_with_profile(
@@ -135,94 +330,63 @@ def create_social_user_with_profile(
     last_period_date: date = None,
     due_date: date = None,
     height: int = None,
-    weight: float = None
+    weight: float = None,
+    uow: Optional[UnitOfWork] = None,
 ) -> dict:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        user_id = _generate_id()
-        
-        # Insert User
+    with unit_of_work(uow) as uow:
+        cur = uow.conn.cursor()
+        # Insert User; a repeated signup for the same social account reuses the existing row
         cur.execute(
             'insert into "User" (id, email, provider, social_id, nickname, is_pregnant, gender, created_at, updated_at) '
-            'values (%s, %s, %s, %s, %s, %s, %s, now(), now()) returning *',
-            (user_id, email, provider, social_id, nickname, is_pregnant, gender),
+            'values (%s, %s, %s, %s, %s, %s, %s, now(), now()) '
+            'on conflict (provider, social_id) where social_id is not null '
+            'do update set updated_at = now() '
+            'returning id',
+            (_generate_id(), email, provider, social_id, nickname, is_pregnant, gender),
         )
-        user = cur.fetchone()
-        
+        user_id = (cur.fetchone())["id"]
+        uow.invalidate_user(user_id)
+
         # Insert Profile if needed
         if height is not None or weight is not None:
-            # Check if exists (unlikely for new user, but safe)
-            cur.execute('SELECT user_id FROM "UserProfile" WHERE user_id = %s', (user_id,))
-            if cur.fetchone():
-                cur.execute(
-                    'UPDATE "UserProfile" SET height = COALESCE(%s, height), current_weight = COALESCE(%s, current_weight), updated_at = NOW() WHERE user_id = %s',
-                    (height, weight, user_id)
-                )
-            else:
-                cur.execute(
-                    'INSERT INTO "UserProfile" (user_id, height, current_weight, initial_weight, updated_at) VALUES (%s, %s, %s, %s, NOW())',
-                    (user_id, height, weight, weight)
-                )
+            upsert_user_profile(user_id, height=height, initial_weight=weight, current_weight=weight, uow=uow)
 
         # Insert Pregnancy Info if needed
         if is_pregnant and (last_period_date or due_date):
-            from datetime import timedelta
-            # Calculate ovulation_week_start if pregnancy_start is provided (LMP + 14 days)
-            ovulation_week_start = None
-            if last_period_date:
-                ovulation_week_start = last_period_date + timedelta(days=14)
-
-            cur.execute('SELECT user_id FROM "PregnancyInfo" WHERE user_id = %s', (user_id,))
-            if cur.fetchone():
-                cur.execute(
-                    'UPDATE "PregnancyInfo" SET due_date = COALESCE(%s, due_date), pregnancy_start = COALESCE(%s, pregnancy_start), ovulation_week_start = COALESCE(%s, ovulation_week_start), updated_at = NOW() WHERE user_id = %s',
-                    (due_date, last_period_date, ovulation_week_start, user_id)
-                )
-            else:
-                cur.execute(
-                    'INSERT INTO "PregnancyInfo" (user_id, due_date, pregnancy_start, ovulation_week_start, created_at, updated_at) VALUES (%s, %s, %s, %s, NOW(), NOW())',
-                    (user_id, due_date, last_period_date, ovulation_week_start)
-                )
-        
-        # Construct return object manually since transaction isn't committed yet
-        # so _attach_user_details (new connection) won't see the data
-        user_dict = dict(user)
-        
-        user_dict["profile"] = {}
-        if height is not None or weight is not None:
-            user_dict["profile"] = {
-                "user_id": user_id,
-                "height": height,
-                "current_weight": weight,
-                "initial_weight": weight
-            }
-            
-        user_dict["pregnancy_info"] = {}
-        if is_pregnant and (last_period_date or due_date):
-            user_dict["pregnancy_info"] = {
-                "user_id": user_id,
-                "pregnancy_start": last_period_date,
-                "due_date": due_date,
-                "ovulation_week_start": ovulation_week_start
-            }
-            
-        return user_dict
+            upsert_pregnancy_info(user_id, due_date=due_date, pregnancy_start=last_period_date, uow=uow)
 
+        # Same connection, so the uncommitted rows above are visible here
+        return fetch_user_by_id(user_id, uow=uow)
 
-def fetch_user_by_id(user_id: str | int) -> Optional[dict]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute('select * from "User" where id = %s limit 1', (user_id,))
-        user = cur.fetchone()
-        return _attach_user_details(dict(user)) if user else None
+
+def fetch_user_by_id(user_id: str | int, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    try:
+        key = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    # Rows this unit of work wrote are not committed yet, so never serve or cache them
+    use_cache = uow is None or key not in uow.dirty_users
+    since = None
+    if use_cache:
+        cached = user_cache.get(key)
+        if cached is not None:
+            return cached
+        since = user_cache.generation()
+
+    user = _fetch_user_aggregate('u.id = %s', (key,), uow=uow)
+    if user and use_cache:
+        user_cache.set(key, user, since=since)
+    return user
 
 
-def delete_user_by_id(user_id: str | int) -> bool:
+def delete_user_by_id(user_id: str | int, uow: Optional[UnitOfWork] = None) -> bool:
     """
     Delete user by id. Returns True if a row was deleted.
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
+    with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
         # 1. Delete Notifications linked to user's calendar events
         cur.execute('''
             DELETE FROM "Notification" 
@@ -230,6 +394,8 @@ def delete_user_by_id(user_id: str | int) -> bool:
         ''', (user_id,))
         
         # 2. Delete CalendarEvents
+        cur.execute('DELETE FROM "CalendarEventOverride" WHERE user_id = %s', (user_id,))
+        cur.execute('DELETE FROM "CalendarFeed" WHERE user_id = %s', (user_id,))
         cur.execute('DELETE FROM "CalendarEvent" WHERE user_id = %s', (user_id,))
         
         # 3. Delete UserSupplements & CustomSupplements
@@ -239,6 +405,8 @@ def delete_user_by_id(user_id: str | int) -> bool:
         # 4. Delete PregnancyInfo, PeriodInfo, UserProfile, UserSetting
         cur.execute('DELETE FROM "PregnancyInfo" WHERE user_id = %s', (user_id,))
         cur.execute('DELETE FROM "PeriodInfo" WHERE user_id = %s', (user_id,))
+        cur.execute('DELETE FROM "PeriodLog" WHERE user_id = %s', (user_id,))
+        cur.execute('DELETE FROM "PeriodProjection" WHERE user_id = %s', (user_id,))
         cur.execute('DELETE FROM "UserProfile" WHERE user_id = %s', (user_id,))
         cur.execute('DELETE FROM "UserSetting" WHERE user_id = %s', (user_id,))
         
@@ -251,18 +419,20 @@ def delete_user_by_id(user_id: str | int) -> bool:
 
 
 
-def create_user_email(email: str, password: str, nickname: str, pregnant: bool) -> dict:
-    with get_conn() as conn:
-        cur = conn.cursor()
+def create_user_email(email: str, password: str, nickname: str, pregnant: bool, uow: Optional[UnitOfWork] = None) -> dict:
+    with unit_of_work(uow) as uow:
+        cur = uow.conn.cursor()
         cur.execute(
             'INSERT INTO "User" (id, email, password, provider, nickname, is_pregnant, created_at, updated_at) '
             "VALUES (%s, %s, %s, 'local', %s, %s, NOW(), NOW()) RETURNING *",
             (_generate_id(), email, password, nickname, pregnant)
         )
-        return cur.fetchone()
+        user = cur.fetchone()
+        uow.invalidate_user(user["id"])
+        return user
 
 
-def upsert_pregnancy_info(user_id: int, due_date: date = None, pregnancy_start: date = None) -> None:
+def upsert_pregnancy_info(user_id: int, due_date: date = None, pregnancy_start: date = None, uow: Optional[UnitOfWork] = None) -> None:
     from datetime import timedelta
     
     # Calculate ovulation_week_start if pregnancy_start is provided (LMP + 14 days)
@@ -270,57 +440,56 @@ def upsert_pregnancy_info(user_id: int, due_date: date = None, pregnancy_start:
     if pregnancy_start:
         ovulation_week_start = pregnancy_start + timedelta(days=14)
 
-    with get_conn() as conn:
-        cur = conn.cursor()
-        # Check if exists
-        cur.execute('SELECT user_id FROM "PregnancyInfo" WHERE user_id = %s', (user_id,))
-        if cur.fetchone():
-            cur.execute(
-                'UPDATE "PregnancyInfo" SET due_date = COALESCE(%s, due_date), pregnancy_start = COALESCE(%s, pregnancy_start), ovulation_week_start = COALESCE(%s, ovulation_week_start), updated_at = NOW() WHERE user_id = %s',
-                (due_date, pregnancy_start, ovulation_week_start, user_id)
-            )
-        else:
-            cur.execute(
-                'INSERT INTO "PregnancyInfo" (user_id, due_date, pregnancy_start, ovulation_week_start, created_at, updated_at) VALUES (%s, %s, %s, %s, NOW(), NOW())',
-                (user_id, due_date, pregnancy_start, ovulation_week_start)
-            )
+    with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        cur.execute(
+            'INSERT INTO "PregnancyInfo" (user_id, due_date, pregnancy_start, ovulation_week_start, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, NOW(), NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'due_date = COALESCE(EXCLUDED.due_date, "PregnancyInfo".due_date), '
+            'pregnancy_start = COALESCE(EXCLUDED.pregnancy_start, "PregnancyInfo".pregnancy_start), '
+            'ovulation_week_start = COALESCE(EXCLUDED.ovulation_week_start, "PregnancyInfo".ovulation_week_start), '
+            'updated_at = NOW()',
+            (user_id, due_date, pregnancy_start, ovulation_week_start)
+        )
 
 
-def upsert_period_info(user_id: int, last_period: date = None, period_start: date = None) -> None:
-    with get_conn() as conn:
+def upsert_period_info(user_id: int, last_period: date = None, period_start: date = None, uow: Optional[UnitOfWork] = None) -> None:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
-        cur.execute('SELECT user_id FROM "PeriodInfo" WHERE user_id = %s', (user_id,))
-        if cur.fetchone():
-            cur.execute(
-                'UPDATE "PeriodInfo" SET last_period = COALESCE(%s, last_period), period_start = COALESCE(%s, period_start), updated_at = NOW() WHERE user_id = %s',
-                (last_period, period_start, user_id)
-            )
-        else:
+        cur.execute(
+            'INSERT INTO "PeriodInfo" (user_id, last_period, period_start, updated_at) VALUES (%s, %s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'last_period = COALESCE(EXCLUDED.last_period, "PeriodInfo".last_period), '
+            'period_start = COALESCE(EXCLUDED.period_start, "PeriodInfo".period_start), '
+            'updated_at = NOW()',
+            (user_id, last_period, period_start)
+        )
+        if last_period is not None:
             cur.execute(
-                'INSERT INTO "PeriodInfo" (user_id, last_period, period_start, updated_at) VALUES (%s, %s, %s, NOW())',
-                (user_id, last_period, period_start)
+                'INSERT INTO "PeriodLog" (user_id, start_date) VALUES (%s, %s) ON CONFLICT (user_id, start_date) DO NOTHING',
+                (user_id, last_period)
             )
 
 
-def upsert_user_profile(user_id: int, height: int = None, initial_weight: float = None, current_weight: float = None) -> None:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute('SELECT user_id FROM "UserProfile" WHERE user_id = %s', (user_id,))
-        if cur.fetchone():
-            cur.execute(
-                'UPDATE "UserProfile" SET height = %s, initial_weight = %s, current_weight = %s, updated_at = NOW() WHERE user_id = %s',
-                (height, initial_weight, current_weight, user_id)
-            )
-        else:
-            cur.execute(
-                'INSERT INTO "UserProfile" (user_id, height, initial_weight, current_weight, updated_at) VALUES (%s, %s, %s, %s, NOW())',
-                (user_id, height, initial_weight, current_weight)
-            )
+def upsert_user_profile(user_id: int, height: int = None, initial_weight: float = None, current_weight: float = None, uow: Optional[UnitOfWork] = None) -> None:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        cur.execute(
+            'INSERT INTO "UserProfile" (user_id, height, initial_weight, current_weight, updated_at) VALUES (%s, %s, %s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'height = EXCLUDED.height, initial_weight = EXCLUDED.initial_weight, '
+            'current_weight = EXCLUDED.current_weight, updated_at = NOW()',
+            (user_id, height, initial_weight, current_weight)
+        )
 
 
-def update_user_nickname(user_id: int, nickname: str) -> bool:
-    with get_conn() as conn:
-        cur = conn.cursor()
+def update_user_nickname(user_id: int, nickname: str, uow: Optional[UnitOfWork] = None) -> bool:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
         cur.execute(
             'UPDATE "User" SET nickname = %s, updated_at = NOW() WHERE id = %s',
             (nickname, user_id)
@@ -328,26 +497,28 @@ def update_user_nickname(user_id: int, nickname: str) -> bool:
         return cur.rowcount > 0
 
 
-def update_user_pregnancy(user_id: int, is_pregnant: bool, last_period_date: date = None, due_date: date = None) -> bool:
-    with get_conn() as conn:
-        cur = conn.cursor()
+def update_user_pregnancy(user_id: int, is_pregnant: bool, last_period_date: date = None, due_date: date = None, uow: Optional[UnitOfWork] = None) -> bool:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
         cur.execute(
             'UPDATE "User" SET is_pregnant = %s, updated_at = NOW() WHERE id = %s',
             (is_pregnant, user_id)
         )
-        
+        updated = cur.rowcount > 0
+
         if is_pregnant and (last_period_date or due_date):
-            upsert_pregnancy_info(user_id, pregnancy_start=last_period_date, due_date=due_date)
-            
-        return cur.rowcount > 0
+            upsert_pregnancy_info(user_id, pregnancy_start=last_period_date, due_date=due_date, uow=uow)
+
+        return updated
 
 
 # ---------------- Supplements & Health Info ----------------
 
 
 
-def fetch_pregnancy_info(user_id: int) -> Optional[dict]:
-    with get_conn() as conn:
+def fetch_pregnancy_info(user_id: int, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'select * from "PregnancyInfo" where user_id = %s limit 1',
@@ -356,8 +527,8 @@ def fetch_pregnancy_info(user_id: int) -> Optional[dict]:
         return cur.fetchone()
 
 
-def fetch_period_info(user_id: int) -> Optional[dict]:
-    with get_conn() as conn:
+def fetch_period_info(user_id: int, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'select * from "PeriodInfo" where user_id = %s limit 1',
@@ -366,22 +537,23 @@ def fetch_period_info(user_id: int) -> Optional[dict]:
         return cur.fetchone()
 
 
-def fetch_supplements() -> list[dict]:
-    with get_conn() as conn:
+
+def fetch_supplements(uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute('select id, name, brand from "Supplement"')
         return cur.fetchall() or []
 
 
-def fetch_all_supplements() -> list[dict]:
-    with get_conn() as conn:
+def fetch_all_supplements(uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute('select * from "Supplement"')
         return cur.fetchall() or []
 
 
-def fetch_supplement_by_id(supplement_id: int | str) -> Optional[dict]:
-    with get_conn() as conn:
+def fetch_supplement_by_id(supplement_id: int | str, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'select * from "Supplement" where id = %s limit 1',
@@ -390,8 +562,8 @@ def fetch_supplement_by_id(supplement_id: int | str) -> Optional[dict]:
         return cur.fetchone()
 
 
-def fetch_nutrients_by_period(period: str) -> list[dict]:
-    with get_conn() as conn:
+def fetch_nutrients_by_period(period: str, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         # 1. Fetch Nutrients
         cur.execute(
@@ -440,26 +612,401 @@ def fetch_nutrients_by_period(period: str) -> list[dict]:
         return nutrients
 
 
+# ---------------- Period Log ----------------
+
+def add_period_log(user_id: int, start_date: date, end_date: date = None, uow: Optional[UnitOfWork] = None) -> dict:
+    """
+    Record a period. Logging the same start again only fills in end_date.
+    PeriodInfo.last_period follows the latest logged start.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO "PeriodLog" (user_id, start_date, end_date) VALUES (%s, %s, %s) '
+            'ON CONFLICT (user_id, start_date) DO UPDATE SET end_date = COALESCE(EXCLUDED.end_date, "PeriodLog".end_date) '
+            'RETURNING *',
+            (user_id, start_date, end_date)
+        )
+        log = cur.fetchone()
+        cur.execute(
+            'INSERT INTO "PeriodInfo" (user_id, last_period, updated_at) VALUES (%s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'last_period = GREATEST(EXCLUDED.last_period, "PeriodInfo".last_period), updated_at = NOW()',
+            (user_id, start_date)
+        )
+        return log
+
+
+def fetch_period_logs(user_id: int, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM "PeriodLog" WHERE user_id = %s ORDER BY start_date', (user_id,))
+        return cur.fetchall() or []
+
+
+def delete_period_log(user_id: int, log_id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM "PeriodLog" WHERE id = %s AND user_id = %s', (log_id, user_id))
+        deleted = cur.rowcount > 0
+        if deleted:
+            # Fall back to the latest remaining start; with no logs left last_period is kept as entered
+            cur.execute(
+                'UPDATE "PeriodInfo" p SET last_period = l.latest, updated_at = NOW() '
+                'FROM (SELECT max(start_date) AS latest FROM "PeriodLog" WHERE user_id = %s) l '
+                'WHERE p.user_id = %s AND l.latest IS NOT NULL AND p.last_period IS DISTINCT FROM l.latest',
+                (user_id, user_id)
+            )
+        return deleted
+
+
+def fetch_period_projection(user_id: int, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM "PeriodProjection" WHERE user_id = %s', (user_id,))
+        return cur.fetchone()
+
+
+def fetch_period_histories(user_ids: Optional[list[int]] = None, after_user_id: int = 0, limit: int = 5000, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """
+    Logged starts and ends per user, ascending, for period_prediction.estimate_batch.
+    Pages through all users by id unless user_ids is given.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        where = 'user_id = ANY(%s)' if user_ids is not None else 'user_id > %s'
+        cur.execute(
+            'SELECT user_id, array_agg(start_date ORDER BY start_date) AS starts, '
+            'array_agg(end_date ORDER BY start_date) AS ends '
+            f'FROM "PeriodLog" WHERE {where} GROUP BY user_id ORDER BY user_id LIMIT %s',
+            (user_ids if user_ids is not None else after_user_id, limit),
+        )
+        return cur.fetchall() or []
+
+
+_UPSERT_PERIOD_PROJECTION_SQL = (
+    'INSERT INTO "PeriodProjection" (user_id, cycle_length, cycle_stddev, period_length, cycle_starts, computed_at) '
+    'VALUES {values} '
+    'ON CONFLICT (user_id) DO UPDATE SET cycle_length = EXCLUDED.cycle_length, cycle_stddev = EXCLUDED.cycle_stddev, '
+    'period_length = EXCLUDED.period_length, cycle_starts = EXCLUDED.cycle_starts, computed_at = NOW() '
+    # Unchanged projections are skipped, so a nightly rerun does not bump every calendar version
+    'WHERE ("PeriodProjection".cycle_length, "PeriodProjection".cycle_stddev, "PeriodProjection".period_length, "PeriodProjection".cycle_starts) '
+    'IS DISTINCT FROM (EXCLUDED.cycle_length, EXCLUDED.cycle_stddev, EXCLUDED.period_length, EXCLUDED.cycle_starts)'
+)
+
+
+def upsert_period_projections(estimates: list, uow: Optional[UnitOfWork] = None) -> None:
+    """Store period_prediction.CycleEstimate rows, many users per statement."""
+    if not estimates:
+        return
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        execute_values(
+            cur,
+            _UPSERT_PERIOD_PROJECTION_SQL.format(values='%s'),
+            [(e.user_id, e.cycle_length, e.cycle_stddev, e.period_length, e.cycle_starts) for e in estimates],
+            template='(%s, %s, %s, %s, %s::date[], NOW())',
+            page_size=1000,
+        )
+
+
+def delete_period_projection(user_id: int, uow: Optional[UnitOfWork] = None) -> None:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM "PeriodProjection" WHERE user_id = %s', (user_id,))
+
+
 # ---------------- Calendar & Notifications ----------------
 
-def fetch_calendar_event(event_id: int) -> Optional[dict]:
-    with get_conn() as conn:
+# Expands every matching UserSupplement into (user_supplement_id, ..., day) rows over
+# [%(from)s, %(until)s) for the users in [%(first_user)s, %(last_user)s]. Cycles follow recurrence.py:
+# daily/weekly/monthly or "<n>d"/"<n>w"/"<n>m", true calendar months, anything else once.
+# Occurrence k is start + k * step, and k starts at the first step inside the window.
+# Used as the leading CTEs of the statements below.
+# recurrence.parse_cycle in SQL: {cycle} -> (unit, every); a NULL unit occurs once.
+# The cycle is trimmed and lower-cased first, as parse_cycle does.
+_CYCLE_RULE_SQL = r'''
+        CROSS JOIN LATERAL (SELECT lower(btrim({cycle}, E' \t\n\r\f\x0b')) AS c) cyc_norm
+        CROSS JOIN LATERAL (
+            SELECT CASE
+                       WHEN cyc_norm.c = 'daily' THEN 'day'
+                       WHEN cyc_norm.c = 'weekly' THEN 'week'
+                       WHEN cyc_norm.c = 'monthly' THEN 'month'
+                       -- Nested CASE so the cast only runs on strings that passed the pattern
+                       WHEN cyc_norm.c ~ '^[0-9]+[dwm]$' THEN CASE
+                           WHEN left(cyc_norm.c, -1)::int = 0 THEN NULL
+                           WHEN right(cyc_norm.c, 1) = 'd' THEN 'day'
+                           WHEN right(cyc_norm.c, 1) = 'w' THEN 'week'
+                           ELSE 'month'
+                       END
+                   END AS unit,
+                   CASE WHEN cyc_norm.c ~ '^[0-9]+[dwm]$' THEN left(cyc_norm.c, -1)::int ELSE 1 END AS every
+        ) rule'''
+
+# recurrence.occurrences in SQL. {schedule} must have start_date, last_date, unit and every;
+# {occurrence} gets every {schedule} column plus the occurrence `day` within [%(from)s, last_date].
+_OCCURRENCES_SQL = '''
+    {bounds} AS (
+        SELECT sc.*,
+               CASE sc.unit WHEN 'day' THEN sc.every WHEN 'week' THEN sc.every * 7 END AS step_days,
+               (EXTRACT(YEAR FROM %(from)s::date) * 12 + EXTRACT(MONTH FROM %(from)s::date)
+                - EXTRACT(YEAR FROM sc.start_date) * 12 - EXTRACT(MONTH FROM sc.start_date))::int AS months_to_from,
+               (EXTRACT(YEAR FROM sc.last_date) * 12 + EXTRACT(MONTH FROM sc.last_date)
+                - EXTRACT(YEAR FROM sc.start_date) * 12 - EXTRACT(MONTH FROM sc.start_date))::int AS months_to_last
+        FROM {schedule} sc
+        WHERE sc.last_date >= sc.start_date
+    ),
+    {occurrence} AS (
+        SELECT b.*, d.day
+        FROM {bounds} b
+        CROSS JOIN LATERAL generate_series(
+            CASE
+                WHEN b.unit = 'month' THEN GREATEST(b.months_to_from / b.every, 0)
+                WHEN b.unit IS NOT NULL THEN CEIL(GREATEST(%(from)s::date - b.start_date, 0)::numeric / b.step_days)::int
+                ELSE 0
+            END,
+            CASE
+                WHEN b.unit = 'month' THEN b.months_to_last / b.every
+                WHEN b.unit IS NOT NULL THEN (b.last_date - b.start_date) / b.step_days
+                ELSE 0
+            END
+        ) AS k
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN b.unit = 'month'
+                        THEN (b.start_date + make_interval(months => k * b.every))::date
+                        ELSE b.start_date + k * COALESCE(b.step_days, 0)
+                   END AS day
+        ) d
+        WHERE d.day BETWEEN %(from)s::date AND b.last_date
+    )'''
+
+_SUPPLEMENT_OCCURRENCES_CTE = '''
+    schedule AS (
+        SELECT us.id AS user_supplement_id, us.user_id, us.supplement_id, s.name, us.time_of_day,
+               us.start_date::date AS start_date,
+               LEAST(COALESCE(us.end_date::date, %(until)s::date), %(until)s::date - 1) AS last_date,
+               rule.unit, rule.every
+        FROM "UserSupplement" us
+        JOIN "Supplement" s ON s.id = us.supplement_id''' + _CYCLE_RULE_SQL.format(cycle="us.cycle") + '''
+        WHERE us.user_id BETWEEN %(first_user)s AND %(last_user)s
+          AND us.start_date < %(until)s AND (us.end_date IS NULL OR us.end_date >= %(from)s)
+    ),''' + _OCCURRENCES_SQL.format(schedule="schedule", bounds="bounds", occurrence="occurrence") + '''
+'''
+
+# Alternative calendar engine (CALENDAR_ENGINE=sql): the whole window as ready-to-serialize
+# day rows in one statement. Mirrors the layers in services/calendar_service.py.
+_CALENDAR_DAYS_SQL = 'WITH ' + _SUPPLEMENT_OCCURRENCES_CTE + ''',
+    days AS (
+        SELECT d::date AS day FROM generate_series(%(from)s::date, %(until)s::date - 1, interval '1 day') AS d
+    ),
+    supplements AS (
+        SELECT day, jsonb_agg(jsonb_build_object('name', name, 'time', time_of_day) ORDER BY user_supplement_id) AS items
+        FROM occurrence GROUP BY day
+    ),
+    event_schedule AS (
+        -- Repeating todos, stored once per series (migrations/m0007_event_recurrence.py)
+        SELECT e.id, e.title, e.start_datetime,
+               e.start_datetime::date AS start_date,
+               LEAST(COALESCE(e.series_until::date, %(until)s::date - 1), %(until)s::date - 1) AS last_date,
+               rule.unit, rule.every
+        FROM "CalendarEvent" e''' + _CYCLE_RULE_SQL.format(cycle="e.repeat_cycle") + '''
+        WHERE e.user_id = %(user_id)s AND e.type = 'todo' AND e.rrule IS NOT NULL
+          AND e.start_datetime < %(until)s AND (e.series_until IS NULL OR e.series_until >= %(from)s)
+    ),''' + _OCCURRENCES_SQL.format(schedule="event_schedule", bounds="event_bounds", occurrence="event_occurrence") + ''',
+    todo_rows AS (
+        SELECT e.id, e.title, e.start_datetime, NULL::date AS occurrence_date, e.completed
+        FROM "CalendarEvent" e
+        WHERE e.user_id = %(user_id)s AND e.type = 'todo' AND e.rrule IS NULL
+          AND e.start_datetime >= %(from)s AND e.start_datetime < %(until)s
+        UNION ALL
+        SELECT o.id, COALESCE(ov.title, o.title), COALESCE(ov.start_datetime, o.day + o.start_datetime::time), o.day,
+               COALESCE(ov.completed, FALSE)
+        FROM event_occurrence o
+        LEFT JOIN "CalendarEventOverride" ov ON ov.event_id = o.id AND ov.occurrence_date = o.day
+        WHERE ov.cancelled IS NOT TRUE
+        UNION ALL
+        -- Occurrences moved into the window from a date outside it
+        SELECT e.id, COALESCE(ov.title, e.title), ov.start_datetime, ov.occurrence_date, ov.completed
+        FROM "CalendarEventOverride" ov
+        JOIN "CalendarEvent" e ON e.id = ov.event_id AND e.type = 'todo'
+        WHERE ov.user_id = %(user_id)s AND NOT ov.cancelled
+          AND ov.start_datetime >= %(from)s AND ov.start_datetime < %(until)s
+          AND (ov.occurrence_date < %(from)s::date OR ov.occurrence_date >= %(until)s::date)
+    ),
+    todos AS (
+        SELECT start_datetime::date AS day,
+               jsonb_agg(jsonb_build_object(
+                   'id', id::text, 'text', title, 'date', to_char(start_datetime, 'YYYY-MM-DD'), 'completed', completed,
+                   'occurrenceDate', to_char(occurrence_date, 'YYYY-MM-DD')
+               ) ORDER BY start_datetime, id) AS items
+        FROM todo_rows
+        WHERE start_datetime >= %(from)s AND start_datetime < %(until)s
+        GROUP BY 1
+    ),
+    proj AS (
+        -- numeric round() rounds halves up like period_prediction._round; float round() does not
+        SELECT cycle_starts,
+               round(cycle_length::numeric)::int AS cycle,
+               round(period_length::numeric)::int AS period
+        FROM "PeriodProjection" WHERE user_id = %(user_id)s
+    )
+    SELECT to_char(days.day, 'YYYY-MM-DD') AS date,
+           COALESCE(supplements.items, '[]'::jsonb) AS supplements,
+           COALESCE(todos.items, '[]'::jsonb) AS todos,
+           CASE WHEN days.day BETWEEN preg.pregnancy_start AND preg.due_date
+                THEN ((days.day - preg.pregnancy_start) / 7 + 1) || '주차'
+           END AS "pregnancyPhase",
+           -- Same phase bounds as period_prediction.phase_codes
+           CASE WHEN cyc.covered THEN
+                CASE WHEN cyc.off < cyc.period THEN 'menstruation'
+                     WHEN cyc.off < cyc.ovulation THEN 'follicular'
+                     WHEN cyc.off < cyc.ovulation + 7 THEN 'ovulation'
+                     ELSE 'luteal'
+                END
+           END AS "menstrualPhase"
+    FROM days
+    LEFT JOIN supplements ON supplements.day = days.day
+    LEFT JOIN todos ON todos.day = days.day
+    LEFT JOIN LATERAL (
+        SELECT pregnancy_start, due_date FROM "PregnancyInfo" WHERE user_id = %(user_id)s LIMIT 1
+    ) preg ON TRUE
+    LEFT JOIN LATERAL (
+        -- The cycle a day falls in: the latest projected start on or before it
+        SELECT days.day - s.start AS off,
+               proj.period,
+               GREATEST(proj.cycle - 14, proj.period) AS ovulation,
+               s.ord < cardinality(proj.cycle_starts) OR days.day - s.start < GREATEST(proj.cycle, 1) AS covered
+        FROM proj, unnest(proj.cycle_starts) WITH ORDINALITY AS s(start, ord)
+        WHERE s.start <= days.day
+        ORDER BY s.start DESC
+        LIMIT 1
+    ) cyc ON TRUE
+    ORDER BY days.day
+'''
+
+
+def fetch_calendar_days(user_id: int, from_date: date, until: date, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """Day rows for [from_date, until) shaped like CalendarDayInfo."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            _CALENDAR_DAYS_SQL,
+            {"from": from_date, "until": until, "user_id": user_id, "first_user": user_id, "last_user": user_id},
+        )
+        return cur.fetchall()
+
+
+def fetch_user_data_version(user_id: int, uow: Optional[UnitOfWork] = None) -> dict:
+    """
+    Version of everything the calendar shows for this user; bumped by triggers
+    (migrations/m0005_user_data_version.py). Users with no writes yet are version 0.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT version, updated_at FROM "UserDataVersion" WHERE user_id = %s', (user_id,))
+        row = cur.fetchone()
+        return dict(row) if row else {"version": 0, "updated_at": None}
+
+
+def fetch_calendar_event(event_id: int, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute('select * from "CalendarEvent" where id = %s limit 1', (event_id,))
         return cur.fetchone()
 
 
-def fetch_calendar_events_range(user_id: int, start_date, end_date, type: Optional[str] = None) -> list[dict]:
-    with get_conn() as conn:
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.combine(value, datetime.min.time())
+
+
+def _series_columns(rrule: Optional[str], start_datetime) -> tuple[str, Optional[str], Optional[datetime]]:
+    """
+    (repeat_cycle, rrule, series_until) for a new event. The RRULE is stored
+    canonically, repeat_cycle carries the same rule for the SQL calendar engine.
+    Raises ValueError for rules outside recurrence.parse_rrule's subset.
+    """
+    if not rrule:
+        return "none", None, None
+    series = recurrence.parse_rrule(rrule)
+    until = recurrence.last_occurrence(_as_datetime(start_datetime), series)
+    return recurrence.cycle_of(series.rule), recurrence.format_rrule(series), until
+
+
+def _expand_series(series: list[dict], overrides: list[dict], start_date, end_date) -> list[dict]:
+    """
+    One row per occurrence of each repeating event in [start_date, end_date),
+    with overrides applied. Occurrence rows are copies of the series row (same id)
+    with the occurrence's start/end and its rule date in occurrence_date.
+    """
+    start, end = _as_datetime(start_date), _as_datetime(end_date)
+    first_day = start.date()
+    end_day = (end - timedelta(microseconds=1)).date() + timedelta(days=1)
+    by_event: dict[int, dict[date, dict]] = {}
+    for o in overrides:
+        by_event.setdefault(o["event_id"], {})[o["occurrence_date"]] = o
+
+    rows = []
+    for ev in series:
+        rule = recurrence.parse_rrule(ev["rrule"]).rule
+        first = ev["start_datetime"]
+        duration = ev["end_datetime"] - first if ev["end_datetime"] else None
+        event_overrides = by_event.get(ev["id"], {})
+        days = list(recurrence.occurrences(first, rule, first_day, end_day, until=ev["series_until"]))
+        # Occurrences moved into the window from a date outside it
+        days += [d for d in event_overrides if not first_day <= d < end_day]
+        for day in days:
+            override = event_overrides.get(day)
+            if override and override["cancelled"]:
+                continue
+            occurrence_start = (override and override["start_datetime"]) or datetime.combine(day, first.time())
+            if not start <= occurrence_start < end:
+                continue
+            row = dict(ev)
+            row["start_datetime"] = occurrence_start
+            row["end_datetime"] = occurrence_start + duration if duration is not None else None
+            row["title"] = (override and override["title"]) or ev["title"]
+            row["occurrence_date"] = day
+            row["completed"] = bool(override and override["completed"])
+            rows.append(row)
+    return rows
+
+
+def fetch_calendar_events_range(user_id: int, start_date, end_date, type: Optional[str] = None, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """
+    Events starting in [start_date, end_date), ordered by start. Repeating events
+    are stored once per series and expanded here for the requested window only;
+    one-off rows have occurrence_date None.
+    """
+    with get_conn(uow) as conn:
         cur = conn.cursor()
-        query = 'SELECT * FROM "CalendarEvent" WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s'
-        params = [user_id, start_date, end_date]
-        if type:
-            query += ' AND type = %s'
-            params.append(type)
-        
-        cur.execute(query, tuple(params))
-        return cur.fetchall() or []
+        type_filter = ' AND type = %s' if type else ''
+        type_params = [type] if type else []
+        cur.execute(
+            'SELECT *, NULL::date AS occurrence_date FROM "CalendarEvent" '
+            'WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s AND rrule IS NULL' + type_filter,
+            (user_id, start_date, end_date, *type_params),
+        )
+        events = cur.fetchall() or []
+
+        cur.execute(
+            'SELECT * FROM "CalendarEvent" WHERE user_id = %s AND rrule IS NOT NULL' + type_filter + ' AND ('
+            '(start_datetime < %s AND (series_until IS NULL OR series_until >= %s)) '
+            'OR id IN (SELECT event_id FROM "CalendarEventOverride" WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s))',
+            (user_id, *type_params, end_date, start_date, user_id, start_date, end_date),
+        )
+        series = cur.fetchall() or []
+        if series:
+            first_day = _as_datetime(start_date).date()
+            end_day = (_as_datetime(end_date) - timedelta(microseconds=1)).date() + timedelta(days=1)
+            cur.execute(
+                'SELECT * FROM "CalendarEventOverride" WHERE event_id = ANY(%s) AND ('
+                '(occurrence_date >= %s AND occurrence_date < %s) OR (start_datetime >= %s AND start_datetime < %s))',
+                ([ev["id"] for ev in series], first_day, end_day, start_date, end_date),
+            )
+            events += _expand_series(series, cur.fetchall() or [], start_date, end_date)
+
+        events.sort(key=lambda ev: (ev["start_datetime"], ev["id"]))
+        return events
 
 
 def upsert_calendar_event(
@@ -467,47 +1014,57 @@ def upsert_calendar_event(
     title: str,
     start_datetime,
     linked_supplement_id: int | str | None = None,
-    type: str = "supplement" 
+    type: str = "supplement",
+    rrule: Optional[str] = None,
+    uow: Optional[UnitOfWork] = None,
 ) -> dict:
     """
-    Find existing event or insert a new CalendarEvent row.
+    Insert a CalendarEvent row, or return the existing one for the same
+    (user, type, supplement, start) slot. Supplement events are deduplicated by
+    a partial unique index; todos have no supplement and are always inserted.
+    With `rrule` the row is a whole repeating series starting at start_datetime.
     """
-    with get_conn() as conn:
+    repeat_cycle, rrule, series_until = _series_columns(rrule, start_datetime)
+    with get_conn(uow) as conn:
         cur = conn.cursor()
-        # Check for existing event to avoid duplicates
-        cur.execute(
-            'select * from "CalendarEvent" where user_id = %s and type = %s and linked_supplement_id = %s and start_datetime = %s limit 1',
-            (user_id, type, linked_supplement_id, start_datetime),
+        insert_sql = (
+            'insert into "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, rrule, series_until, linked_supplement_id, created_at, updated_at) '
+            'values (%s, %s, %s, %s, %s, %s, %s, %s, %s, now(), now()) '
         )
-        existing = cur.fetchone()
-        if existing:
-            return existing
-
+        if linked_supplement_id is not None:
+            # DO UPDATE (not DO NOTHING) so RETURNING also yields the row that already existed
+            insert_sql += (
+                'on conflict (user_id, type, linked_supplement_id, start_datetime) '
+                'where linked_supplement_id is not null '
+                'do update set title = excluded.title '
+            )
         cur.execute(
-            'insert into "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, linked_supplement_id, created_at, updated_at) '
-            'values (%s, %s, %s, %s, %s, %s, %s, now(), now()) returning *',
+            insert_sql + 'returning *',
             (
                 user_id,
                 type,
                 title,
                 start_datetime,
                 None,
-                "none",
+                repeat_cycle,
+                rrule,
+                series_until,
                 linked_supplement_id,
             ),
         )
         return cur.fetchone()
 
 
-def delete_calendar_event(event_id: int, user_id: int) -> bool:
+def delete_calendar_event(event_id: int, user_id: int, uow: Optional[UnitOfWork] = None) -> bool:
     """
     Delete a calendar event.
     """
-    with get_conn() as conn:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         # First delete notifications linked to this event
         cur.execute('DELETE FROM "Notification" WHERE event_id = %s', (event_id,))
-        
+        cur.execute('DELETE FROM "CalendarEventOverride" WHERE event_id = %s AND user_id = %s', (event_id, user_id))
+
         cur.execute(
             'DELETE FROM "CalendarEvent" WHERE id = %s AND user_id = %s',
             (event_id, user_id),
@@ -515,89 +1072,564 @@ def delete_calendar_event(event_id: int, user_id: int) -> bool:
         return cur.rowcount > 0
 
 
+def upsert_event_override(
+    user_id: int,
+    event_id: int,
+    occurrence_date: date,
+    title: Optional[str] = None,
+    start_datetime: Optional[datetime] = None,
+    cancelled: bool = False,
+    uow: Optional[UnitOfWork] = None,
+) -> dict:
+    """
+    Move, rename or cancel one occurrence of a repeating event; only changed occurrences get a row.
+    A None title or start keeps what an earlier override set.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO "CalendarEventOverride" (event_id, user_id, occurrence_date, cancelled, title, start_datetime, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, NOW()) '
+            'ON CONFLICT (event_id, occurrence_date) DO UPDATE SET cancelled = EXCLUDED.cancelled, '
+            'title = COALESCE(EXCLUDED.title, "CalendarEventOverride".title), '
+            'start_datetime = COALESCE(EXCLUDED.start_datetime, "CalendarEventOverride".start_datetime), updated_at = NOW() '
+            'WHERE "CalendarEventOverride".user_id = EXCLUDED.user_id '
+            'RETURNING *',
+            (event_id, user_id, occurrence_date, cancelled, title, start_datetime),
+        )
+        return cur.fetchone()
+
+
+def delete_event_override(user_id: int, event_id: int, occurrence_date: date, uow: Optional[UnitOfWork] = None) -> bool:
+    """Restore one occurrence to what the rule says."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'DELETE FROM "CalendarEventOverride" WHERE event_id = %s AND occurrence_date = %s AND user_id = %s',
+            (event_id, occurrence_date, user_id),
+        )
+        return cur.rowcount > 0
+
+def create_todos(user_id: int, todos: list[tuple], uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """
+    Insert many todos in one statement. `todos` holds (title, start_datetime, rrule)
+    tuples; rows come back in the same order.
+    """
+    if not todos:
+        return []
+    columns = [(title, start) + _series_columns(rrule, start) for title, start, rrule in todos]
+    titles, starts, cycles, rrules, untils = (list(c) for c in zip(*columns))
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, rrule, series_until, completed, created_at, updated_at) '
+            "SELECT %s, 'todo', t.title, t.start_datetime, NULL, t.repeat_cycle, t.rrule, t.series_until, FALSE, NOW(), NOW() "
+            'FROM unnest(%s::varchar[], %s::timestamp[], %s::varchar[], %s::text[], %s::timestamp[]) '
+            'WITH ORDINALITY AS t(title, start_datetime, repeat_cycle, rrule, series_until, ord) '
+            'ORDER BY t.ord '
+            'RETURNING *',
+            (user_id, titles, starts, cycles, rrules, untils),
+        )
+        # Ids are assigned in ORDER BY order, so sorting by id restores the input order
+        return sorted(cur.fetchall(), key=lambda row: row["id"])
+
+
+def delete_todos(user_id: int, event_ids: list[int], uow: Optional[UnitOfWork] = None) -> set[int]:
+    """Delete the user's todos among `event_ids` with their notifications and overrides; returns the ids deleted."""
+    if not event_ids:
+        return set()
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'DELETE FROM "Notification" WHERE event_id IN '
+            "(SELECT id FROM \"CalendarEvent\" WHERE id = ANY(%s) AND user_id = %s AND type = 'todo')",
+            (event_ids, user_id),
+        )
+        cur.execute('DELETE FROM "CalendarEventOverride" WHERE event_id = ANY(%s) AND user_id = %s', (event_ids, user_id))
+        cur.execute(
+            "DELETE FROM \"CalendarEvent\" WHERE id = ANY(%s) AND user_id = %s AND type = 'todo' RETURNING id",
+            (event_ids, user_id),
+        )
+        return {row["id"] for row in cur.fetchall()}
+
+
+def set_todos_completed(user_id: int, items: list[tuple], uow: Optional[UnitOfWork] = None) -> set[tuple]:
+    """
+    Mark todos done or not done. `items` holds (event_id, occurrence_date, completed);
+    occurrence_date is None for one-off todos and the rule date for an occurrence
+    of a repeating one. Returns the (event_id, occurrence_date) pairs that were updated.
+    """
+    single = [(event_id, done) for event_id, day, done in items if day is None]
+    occurrences = [(event_id, day, done) for event_id, day, done in items if day is not None]
+    updated = set()
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        if single:
+            ids, done = (list(c) for c in zip(*single))
+            cur.execute(
+                'UPDATE "CalendarEvent" e SET completed = v.completed, updated_at = NOW() '
+                'FROM unnest(%s::bigint[], %s::boolean[]) AS v(id, completed) '
+                "WHERE e.id = v.id AND e.user_id = %s AND e.type = 'todo' AND e.rrule IS NULL "
+                'RETURNING e.id',
+                (ids, done, user_id),
+            )
+            updated |= {(row["id"], None) for row in cur.fetchall()}
+        if occurrences:
+            ids, days, done = (list(c) for c in zip(*occurrences))
+            cur.execute(
+                'INSERT INTO "CalendarEventOverride" (event_id, user_id, occurrence_date, completed, updated_at) '
+                'SELECT v.id, e.user_id, v.day, v.completed, NOW() '
+                'FROM unnest(%s::bigint[], %s::date[], %s::boolean[]) AS v(id, day, completed) '
+                "JOIN \"CalendarEvent\" e ON e.id = v.id AND e.user_id = %s AND e.type = 'todo' AND e.rrule IS NOT NULL "
+                'ON CONFLICT (event_id, occurrence_date) DO UPDATE SET completed = EXCLUDED.completed, updated_at = NOW() '
+                'RETURNING event_id, occurrence_date',
+                (ids, days, done, user_id),
+            )
+            updated |= {(row["event_id"], row["occurrence_date"]) for row in cur.fetchall()}
+    return updated
+
+
+def fetch_calendar_events_by_ids(user_id: int, event_ids: list[int], uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM "CalendarEvent" WHERE id = ANY(%s) AND user_id = %s', (event_ids, user_id))
+        return cur.fetchall() or []
+
+def ensure_calendar_feed(user_id: int, token: str, uow: Optional[UnitOfWork] = None) -> str:
+    """The user's feed token; `token` is stored only if the user has none yet."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO "CalendarFeed" (user_id, token) VALUES (%s, %s) '
+            'ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id RETURNING token',
+            (user_id, token),
+        )
+        return cur.fetchone()["token"]
+
+
+def rotate_calendar_feed(user_id: int, token: str, uow: Optional[UnitOfWork] = None) -> str:
+    """Replace the user's feed token; the old feed URL stops working."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO "CalendarFeed" (user_id, token) VALUES (%s, %s) '
+            'ON CONFLICT (user_id) DO UPDATE SET token = EXCLUDED.token, created_at = NOW() RETURNING token',
+            (user_id, token),
+        )
+        return cur.fetchone()["token"]
+
+
+def delete_calendar_feed(user_id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM "CalendarFeed" WHERE user_id = %s', (user_id,))
+        return cur.rowcount > 0
+
+
+def fetch_calendar_feed(token: str, uow: Optional[UnitOfWork] = None) -> Optional[dict]:
+    """Owner and data version (see fetch_user_data_version) of a feed token in one lookup."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT f.user_id, COALESCE(v.version, 0) AS version, v.updated_at '
+            'FROM "CalendarFeed" f LEFT JOIN "UserDataVersion" v ON v.user_id = f.user_id '
+            'WHERE f.token = %s',
+            (token,),
+        )
+        return cur.fetchone()
+
+
+def fetch_user_todo_events(user_id: int, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """Every todo row of the user, series unexpanded, with its overrides under "overrides"."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM \"CalendarEvent\" WHERE user_id = %s AND type = 'todo' ORDER BY start_datetime, id",
+            (user_id,),
+        )
+        events = cur.fetchall() or []
+        cur.execute(
+            'SELECT * FROM "CalendarEventOverride" WHERE user_id = %s ORDER BY event_id, occurrence_date',
+            (user_id,),
+        )
+        overrides: dict[int, list[dict]] = {}
+        for o in cur.fetchall():
+            overrides.setdefault(o["event_id"], []).append(o)
+        return [dict(ev, overrides=overrides.get(ev["id"], [])) for ev in events]
+
+
 # Alias for backward compatibility if needed, or just use upsert_calendar_event directly
 def upsert_calendar_event_for_supplement(
     user_id: int,
     supplement_id: str | int,
     start_dt,
     title: str,
+    uow: Optional[UnitOfWork] = None,
 ) -> dict:
-    return upsert_calendar_event(user_id, title, start_dt, supplement_id, type="supplement")
+    return upsert_calendar_event(user_id, title, start_dt, supplement_id, type="supplement", uow=uow)
 
 
-def ensure_notification(event_id: int, notify_time) -> dict:
-    with get_conn() as conn:
+def ensure_notification(event_id: int, notify_time, uow: Optional[UnitOfWork] = None) -> dict:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
-            'select * from "Notification" where event_id = %s and notify_time = %s limit 1',
-            (event_id, notify_time),
+            'insert into "Notification" (event_id, notify_time, is_sent) values (%s, %s, %s) '
+            'on conflict (event_id, notify_time) do update set notify_time = excluded.notify_time '
+            'returning *',
+            (event_id, notify_time, False),
         )
-        existing = cur.fetchone()
-        if existing:
-            return existing
+        return cur.fetchone()
+
+
+# Reminders with the event title and recipient
+_NOTIFICATION_DELIVERY_SQL = '''
+    SELECT n.id, n.event_id, n.notify_time, n.is_sent, e.title, e.type, e.user_id, u.email, u.nickname
+    FROM "Notification" n
+    JOIN "CalendarEvent" e ON e.id = n.event_id
+    JOIN "User" u ON u.id = e.user_id
+'''
+
+# Due ones, oldest first; failed deliveries wait for retry_at
+_DUE_NOTIFICATIONS_SQL = _NOTIFICATION_DELIVERY_SQL + '''
+    WHERE n.notify_time <= %(now)s AND n.is_sent = false
+      AND (n.retry_at IS NULL OR n.retry_at <= %(now)s)
+    ORDER BY n.notify_time, n.id
+    LIMIT %(limit)s
+'''
+
+
+_USER_DUE_NOTIFICATIONS_SQL = '''
+    SELECT n.id, n.event_id, n.notify_time, n.is_sent, e.title, e.type, e.user_id
+    FROM "CalendarEvent" e
+    JOIN "Notification" n ON n.event_id = e.id
+    WHERE e.user_id = %s AND n.notify_time <= %s AND n.notify_time > %s AND n.is_sent = false
+    ORDER BY n.notify_time, n.id
+    LIMIT %s
+'''
+
+
+def fetch_notifications_due(now, limit: int = 500, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(_DUE_NOTIFICATIONS_SQL, {"now": now, "limit": limit})
+        return cur.fetchall() or []
 
+
+def claim_due_notifications(now, limit: int, uow: UnitOfWork) -> list[dict]:
+    """
+    Lock up to `limit` due reminders for delivery. Rows another worker already
+    holds are skipped rather than waited on, so concurrent dispatchers split the
+    backlog. The locks last until `uow` ends: mark what was delivered with
+    mark_notifications_sent (or defer_notifications) before committing;
+    anything else is released.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(_DUE_NOTIFICATIONS_SQL + ' FOR UPDATE OF n SKIP LOCKED', {"now": now, "limit": limit})
+        return cur.fetchall() or []
+
+
+def claim_notifications(notification_ids: list[int], now, uow: UnitOfWork) -> list[dict]:
+    """
+    claim_due_notifications for specific reminders, as fired by the in-memory
+    scheduler. Ids that are not due, already sent or held by another worker
+    are left out.
+    """
+    if not notification_ids:
+        return []
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
         cur.execute(
-            'insert into "Notification" (event_id, notify_time, is_sent) '
-            "values (%s, %s, %s) returning *",
-            (event_id, notify_time, False),
+            _NOTIFICATION_DELIVERY_SQL + '''
+            WHERE n.id = ANY(%(ids)s) AND n.notify_time <= %(now)s AND n.is_sent = false
+              AND (n.retry_at IS NULL OR n.retry_at <= %(now)s)
+            ORDER BY n.notify_time, n.id
+            FOR UPDATE OF n SKIP LOCKED
+            ''',
+            {"ids": [int(i) for i in notification_ids], "now": now},
         )
-        return cur.fetchone()
+        return cur.fetchall() or []
 
 
-def fetch_notifications_due(now) -> list[dict]:
-    with get_conn() as conn:
+def fetch_pending_notifications(until, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """Unsent reminders that fall due (or are retried) before `until`: what the scheduler holds in memory."""
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
-            'select * from "Notification" where notify_time <= %s and is_sent = false',
-            (now,),
+            'SELECT id, notify_time, retry_at FROM "Notification" '
+            'WHERE notify_time < %(until)s AND is_sent = false AND (retry_at IS NULL OR retry_at < %(until)s)',
+            {"until": until},
         )
         return cur.fetchall() or []
 
 
-def mark_notification_sent(notification_id: int) -> None:
-    with get_conn() as conn:
+def fetch_notification_schedule(notification_ids: list[int], uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """Current notify_time / retry_at / is_sent of the given reminders; deleted ones are missing."""
+    if not notification_ids:
+        return []
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
-            'update "Notification" set is_sent = true, updated_at = now() where id = %s',
-            (notification_id,),
+            'SELECT id, notify_time, retry_at, is_sent FROM "Notification" WHERE id = ANY(%s)',
+            ([int(i) for i in notification_ids],),
         )
+        return cur.fetchall() or []
 
-# ---------------- User Settings ----------------
 
-def fetch_user_settings(user_id: int) -> list[dict]:
-    with get_conn() as conn:
+def open_listener(channel: str):
+    """
+    A dedicated autocommit connection LISTENing on `channel`, outside the pool
+    because it stays open for the life of the listener. Wait on its fileno()
+    and call poll() to collect conn.notifies.
+    """
+    conn = psycopg2.connect(DEFAULT_DATABASE_URL)
+    conn.autocommit = True
+    conn.cursor().execute(f'LISTEN "{channel}"')
+    return conn
+
+
+def set_push_presence(conn, lock_ids: list[int], unlock_ids: list[int]) -> None:
+    """
+    Take or release the shared advisory locks, one per user id, that mark users
+    with an open reminder stream in this process (services/push_service.PushRelay).
+    `conn` is the relay's listener connection: the locks go when it closes.
+    """
+    cur = conn.cursor()
+    if lock_ids:
+        cur.execute('SELECT pg_advisory_lock_shared(id) FROM unnest(%s::bigint[]) AS id', ([int(i) for i in lock_ids],))
+    if unlock_ids:
+        cur.execute('SELECT pg_advisory_unlock_shared(id) FROM unnest(%s::bigint[]) AS id', ([int(i) for i in unlock_ids],))
+
+
+def fetch_push_presence(user_ids, uow: Optional[UnitOfWork] = None) -> set[int]:
+    """The given users that have a reminder stream open in any app process (see set_push_presence)."""
+    if not user_ids:
+        return set()
+    with get_conn(uow) as conn:
         cur = conn.cursor()
-        cur.execute('select * from "UserSetting" where user_id = %s order by default_notify_time', (user_id,))
+        # One-key advisory locks show up with the key split into classid (high) and objid (low)
+        cur.execute(
+            'SELECT DISTINCT (l.classid::bigint << 32) | l.objid::bigint AS user_id FROM pg_locks l '
+            "WHERE l.locktype = 'advisory' AND l.objsubid = 1 AND l.granted "
+            'AND l.database = (SELECT oid FROM pg_database WHERE datname = current_database()) '
+            'AND (l.classid::bigint << 32) | l.objid::bigint = ANY(%s)',
+            ([int(i) for i in user_ids],),
+        )
+        return {row["user_id"] for row in cur.fetchall()}
+
+
+def publish_push(channel: str, payloads: list[str], uow: Optional[UnitOfWork] = None) -> None:
+    """NOTIFY every payload on `channel`; delivered to the listeners when this transaction commits."""
+    if not payloads:
+        return
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT pg_notify(%s, p) FROM unnest(%s::text[]) AS p', (channel, payloads))
+
+
+def fetch_user_notifications_due(user_id: int, now, since, limit: int = 100, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """One user's unsent reminders due in (since, now], reached through their CalendarEvent rows."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(_USER_DUE_NOTIFICATIONS_SQL, (user_id, now, since, limit))
         return cur.fetchall() or []
 
 
-def add_user_setting_time(user_id: int, notify_time: time) -> dict:
-    # Check if exists
-    with get_conn() as conn:
+def mark_notification_sent(notification_id: int, user_id: Optional[int] = None, uow: Optional[UnitOfWork] = None) -> bool:
+    """Mark one reminder sent; with `user_id`, only if it belongs to that user's event."""
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
-            'select * from "UserSetting" where user_id = %s and default_notify_time = %s limit 1',
-            (user_id, notify_time)
+            'UPDATE "Notification" n SET is_sent = true, updated_at = now() WHERE n.id = %s '
+            'AND (%s::bigint IS NULL OR EXISTS (SELECT 1 FROM "CalendarEvent" e WHERE e.id = n.event_id AND e.user_id = %s::bigint))',
+            (notification_id, user_id, user_id),
         )
-        existing = cur.fetchone()
-        if existing:
-            return existing
+        return cur.rowcount > 0
+
+
+def mark_notifications_sent(notification_ids: list[int], uow: Optional[UnitOfWork] = None) -> int:
+    """Batch variant of mark_notification_sent; returns how many rows changed."""
+    if not notification_ids:
+        return 0
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'UPDATE "Notification" SET is_sent = true, updated_at = now() WHERE id = ANY(%s) AND is_sent = false',
+            ([int(i) for i in notification_ids],),
+        )
+        return cur.rowcount
+
+
+def defer_notifications(
+    notification_ids: list[int], now, max_attempts: int, expire_after: timedelta, uow: Optional[UnitOfWork] = None
+) -> int:
+    """
+    Push undelivered reminders back: 1, 2, 4 ... minutes after `now`, never past
+    notify_time + `expire_after`. After `max_attempts` they wait for that expiry
+    time, when the dispatcher marks them sent unless a client fetched them first.
+    """
+    if not notification_ids:
+        return 0
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'UPDATE "Notification" SET attempts = attempts + 1, updated_at = now(), retry_at = CASE '
+            'WHEN attempts + 1 >= %(max_attempts)s THEN notify_time + %(expire)s '
+            "ELSE LEAST(%(now)s + LEAST(interval '1 minute' * power(2, attempts), interval '1 day'), notify_time + %(expire)s) END "
+            'WHERE id = ANY(%(ids)s) AND is_sent = false',
+            {"now": now, "max_attempts": max_attempts, "expire": expire_after, "ids": [int(i) for i in notification_ids]},
+        )
+        return cur.rowcount
+
+
+# Supplement intake events are materialized ahead of time by services/materialize_service.py,
+# never while serving a read. One statement inserts the events plus their reminders.
+# Reminder times follow services/delivery_plan.DeliveryPlan.supplement_times: the supplement's
+# own time, else every reminder time in the user's "UserSetting" rows, else 09:00.
+_MATERIALIZE_SUPPLEMENTS_SQL = 'WITH ' + _SUPPLEMENT_OCCURRENCES_CTE + ''',
+    reminder_times AS (
+        SELECT user_id, array_agg(DISTINCT default_notify_time) AS times
+        FROM "UserSetting"
+        WHERE default_notify_time IS NOT NULL AND user_id BETWEEN %(first_user)s AND %(last_user)s
+        GROUP BY user_id
+    ),
+    inserted AS (
+        INSERT INTO "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, linked_supplement_id, created_at, updated_at)
+        SELECT o.user_id, 'supplement', o.name || ' 복용', o.day + at.t, NULL, 'none', o.supplement_id, now(), now()
+        FROM occurrence o
+        LEFT JOIN reminder_times rt ON rt.user_id = o.user_id
+        CROSS JOIN LATERAL unnest(
+            CASE WHEN o.time_of_day IS NOT NULL THEN ARRAY[o.time_of_day] ELSE COALESCE(rt.times, ARRAY[TIME '09:00']) END
+        ) AS at(t)
+        ON CONFLICT (user_id, type, linked_supplement_id, start_datetime) WHERE linked_supplement_id IS NOT NULL
+        DO NOTHING
+        RETURNING id, start_datetime
+    ),
+    notified AS (
+        INSERT INTO "Notification" (event_id, notify_time, is_sent)
+        SELECT id, start_datetime, FALSE FROM inserted
+        ON CONFLICT (event_id, notify_time) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM inserted) AS events, (SELECT count(*) FROM notified) AS reminders
+'''
+
+
+def materialize_supplement_events(
+    from_date: date,
+    until: date,
+    first_user: int,
+    last_user: Optional[int] = None,
+    uow: Optional[UnitOfWork] = None,
+) -> dict:
+    """
+    Create the supplement CalendarEvent and Notification rows in [from_date, until)
+    for the users in [first_user, last_user] (just first_user by default).
+    Existing rows are left alone. Returns {"events", "reminders"} created.
+    """
+    params = {"from": from_date, "until": until, "first_user": first_user, "last_user": first_user if last_user is None else last_user}
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(_MATERIALIZE_SUPPLEMENTS_SQL, params)
+        return dict(cur.fetchone())
+
+
+def fetch_supplement_user_batch(
+    after_user_id: int, limit: int, through_user_id: Optional[int] = None, uow: Optional[UnitOfWork] = None
+) -> Optional[dict]:
+    """
+    The next `limit` users with a UserSupplement after `after_user_id` (keyset paging
+    for services/materialize_service.py), as {"first_user", "last_user", "users"};
+    None once past the last one or `through_user_id`.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT min(user_id) AS first_user, max(user_id) AS last_user, count(*) AS users FROM ('
+            '  SELECT DISTINCT user_id FROM "UserSupplement"'
+            '  WHERE user_id > %s AND (%s::bigint IS NULL OR user_id <= %s::bigint)'
+            '  ORDER BY user_id LIMIT %s'
+            ') batch',
+            (after_user_id, through_user_id, through_user_id, limit),
+        )
+        row = cur.fetchone()
+        return dict(row) if row and row["users"] else None
 
-        # Get current enabled status from another row, or default to True
-        cur.execute('select notification_enabled from "UserSetting" where user_id = %s limit 1', (user_id,))
+
+def fetch_job_watermark(job: str, uow: Optional[UnitOfWork] = None) -> Optional[date]:
+    """The day a batch job has completed up to, exclusive (migrations/m0012_job_watermark.py)."""
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT done_until FROM "JobWatermark" WHERE job = %s', (job,))
         row = cur.fetchone()
-        current_enabled = row['notification_enabled'] if row else True
+        return row["done_until"] if row else None
 
+
+def set_job_watermark(job: str, done_until: date, uow: Optional[UnitOfWork] = None) -> None:
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
         cur.execute(
-            'INSERT INTO "UserSetting" (user_id, notification_enabled, default_notify_time, language) VALUES (%s, %s, %s, %s) RETURNING *',
-            (user_id, current_enabled, notify_time, 'ko')
+            'INSERT INTO "JobWatermark" (job, done_until, updated_at) VALUES (%s, %s, now()) '
+            'ON CONFLICT (job) DO UPDATE SET done_until = EXCLUDED.done_until, updated_at = now()',
+            (job, done_until),
         )
-        return cur.fetchone()
 
 
-def delete_user_setting_time(user_id: int, notify_time: time) -> bool:
-    with get_conn() as conn:
+def delete_pending_supplement_events(user_id: int, since: datetime, uow: Optional[UnitOfWork] = None) -> int:
+    """
+    Drop a user's future supplement events whose reminders have not gone out yet,
+    so a changed schedule can be materialized again from scratch. Earlier unsent
+    reminders of supplements the user no longer takes are marked sent, so they
+    do not fire late.
+    """
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        pending = '''
+            SELECT e.id FROM "CalendarEvent" e
+            WHERE e.user_id = %s AND e.type = 'supplement' AND e.start_datetime >= %s
+              AND NOT EXISTS (SELECT 1 FROM "Notification" n WHERE n.event_id = e.id AND n.is_sent)
+        '''
+        cur.execute(f'DELETE FROM "Notification" WHERE event_id IN ({pending})', (user_id, since))
+        cur.execute(f'DELETE FROM "CalendarEvent" WHERE id IN ({pending})', (user_id, since))
+        deleted = cur.rowcount
+        cur.execute(
+            'UPDATE "Notification" n SET is_sent = true, updated_at = now() '
+            'FROM "CalendarEvent" e '
+            "WHERE n.event_id = e.id AND e.user_id = %s AND e.type = 'supplement' AND NOT n.is_sent "
+            'AND NOT EXISTS (SELECT 1 FROM "UserSupplement" us WHERE us.user_id = e.user_id AND us.supplement_id = e.linked_supplement_id)',
+            (user_id,),
+        )
+        return deleted
+
+
+# ---------------- User Settings ----------------
+
+def fetch_user_settings(user_id: int, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
+        cur.execute('select * from "UserSetting" where user_id = %s order by default_notify_time', (user_id,))
+        return cur.fetchall() or []
+
+
+def add_user_setting_time(user_id: int, notify_time: time, uow: Optional[UnitOfWork] = None) -> dict:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
+        # New times inherit the enabled flag from the user's other rows, or default to True
+        cur.execute(
+            'INSERT INTO "UserSetting" (user_id, notification_enabled, default_notify_time, language) '
+            'SELECT %s, COALESCE((SELECT notification_enabled FROM "UserSetting" WHERE user_id = %s LIMIT 1), TRUE), %s, %s '
+            'ON CONFLICT (user_id, default_notify_time) DO UPDATE SET default_notify_time = EXCLUDED.default_notify_time '
+            'RETURNING *',
+            (user_id, user_id, notify_time, 'ko')
+        )
+        return cur.fetchone()
+
+
+def delete_user_setting_time(user_id: int, notify_time: time, uow: Optional[UnitOfWork] = None) -> bool:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
         cur.execute(
             'DELETE FROM "UserSetting" WHERE user_id = %s AND default_notify_time = %s',
             (user_id, notify_time)
@@ -605,18 +1637,43 @@ def delete_user_setting_time(user_id: int, notify_time: time) -> bool:
         return cur.rowcount > 0
 
 
-def update_user_notification_toggle(user_id: int, enabled: bool) -> bool:
-    with get_conn() as conn:
-        cur = conn.cursor()
+def update_user_notification_toggle(user_id: int, enabled: bool, uow: Optional[UnitOfWork] = None) -> bool:
+    with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
         cur.execute(
             'UPDATE "UserSetting" SET notification_enabled = %s WHERE user_id = %s',
             (enabled, user_id)
         )
-        return cur.rowcount > 0
+        if cur.rowcount == 0:
+            # No reminder times yet: keep the flag on a row without one
+            cur.execute(
+                'INSERT INTO "UserSetting" (user_id, notification_enabled, default_notify_time, language) VALUES (%s, %s, NULL, %s)',
+                (user_id, enabled, 'ko')
+            )
+        return True
 
 
-def add_custom_supplement(user_id: int, name: str, note: str = None) -> dict:
-    with get_conn() as conn:
+def fetch_delivery_settings(user_ids: list[int], uow: Optional[UnitOfWork] = None) -> list[dict]:
+    """
+    Enabled flag and reminder times per user, for services/delivery_plan.py.
+    Users without "UserSetting" rows are missing.
+    """
+    if not user_ids:
+        return []
+    with get_conn(uow) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT user_id, bool_and(notification_enabled IS NOT FALSE) AS enabled, '
+            'COALESCE(array_agg(DISTINCT default_notify_time) FILTER (WHERE default_notify_time IS NOT NULL), \'{}\') AS times '
+            'FROM "UserSetting" WHERE user_id = ANY(%s) GROUP BY user_id',
+            ([int(uid) for uid in user_ids],),
+        )
+        return cur.fetchall() or []
+
+
+def add_custom_supplement(user_id: int, name: str, note: str = None, uow: Optional[UnitOfWork] = None) -> dict:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'INSERT INTO "CustomSupplement" (id, user_id, name, note, start_date, is_active) VALUES (%s, %s, %s, %s, NOW(), FALSE) RETURNING *',
@@ -625,8 +1682,8 @@ def add_custom_supplement(user_id: int, name: str, note: str = None) -> dict:
         return cur.fetchone()
 
 
-def toggle_custom_supplement(user_id: int, id: int, is_active: bool) -> bool:
-    with get_conn() as conn:
+def toggle_custom_supplement(user_id: int, id: int, is_active: bool, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'UPDATE "CustomSupplement" SET is_active = %s WHERE id = %s AND user_id = %s',
@@ -635,8 +1692,8 @@ def toggle_custom_supplement(user_id: int, id: int, is_active: bool) -> bool:
         return cur.rowcount > 0
 
 
-def delete_custom_supplement(user_id: int, id: int) -> bool:
-    with get_conn() as conn:
+def delete_custom_supplement(user_id: int, id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'DELETE FROM "CustomSupplement" WHERE id = %s AND user_id = %s',
@@ -645,8 +1702,8 @@ def delete_custom_supplement(user_id: int, id: int) -> bool:
         return cur.rowcount > 0
 
 
-def fetch_custom_supplements(user_id: int, active_only: bool = False) -> list:
-    with get_conn() as conn:
+def fetch_custom_supplements(user_id: int, active_only: bool = False, uow: Optional[UnitOfWork] = None) -> list:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         if active_only:
             cur.execute('SELECT * FROM "CustomSupplement" WHERE user_id = %s AND is_active = TRUE', (user_id,))
@@ -657,8 +1714,8 @@ def fetch_custom_supplements(user_id: int, active_only: bool = False) -> list:
 
 
 
-def fetch_user_profile(user_id: int) -> dict:
-    with get_conn() as conn:
+def fetch_user_profile(user_id: int, uow: Optional[UnitOfWork] = None) -> dict:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute('SELECT * FROM "UserProfile" WHERE user_id = %s', (user_id,))
         return cur.fetchone()
@@ -668,8 +1725,8 @@ def fetch_user_profile(user_id: int) -> dict:
 
 # ---------------- Doctor's Note ----------------
 
-def fetch_doctors_notes(user_id: int) -> list[dict]:
-    with get_conn() as conn:
+def fetch_doctors_notes(user_id: int, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'SELECT * FROM "DoctorsNote" WHERE user_id = %s ORDER BY visit_date DESC, created_at DESC',
@@ -678,8 +1735,8 @@ def fetch_doctors_notes(user_id: int) -> list[dict]:
         return cur.fetchall() or []
 
 
-def create_doctors_note(user_id: int, content: str, visit_date: date = None) -> dict:
-    with get_conn() as conn:
+def create_doctors_note(user_id: int, content: str, visit_date: date = None, uow: Optional[UnitOfWork] = None) -> dict:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'INSERT INTO "DoctorsNote" (id, user_id, content, visit_date, created_at, updated_at) '
@@ -689,8 +1746,8 @@ def create_doctors_note(user_id: int, content: str, visit_date: date = None) ->
         return cur.fetchone()
 
 
-def delete_doctors_note(note_id: int, user_id: int) -> bool:
-    with get_conn() as conn:
+def delete_doctors_note(note_id: int, user_id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'DELETE FROM "DoctorsNote" WHERE id = %s AND user_id = %s',
@@ -701,8 +1758,8 @@ def delete_doctors_note(note_id: int, user_id: int) -> bool:
 
 # ---------------- Tips ----------------
 
-def fetch_random_tips(limit: int = 3) -> list[dict]:
-    with get_conn() as conn:
+def fetch_random_tips(limit: int = 3, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         # Use RANDOM() for PostgreSQL to get random rows
         cur.execute('SELECT * FROM "Tip" ORDER BY RANDOM() LIMIT %s', (limit,))
@@ -711,8 +1768,8 @@ def fetch_random_tips(limit: int = 3) -> list[dict]:
 
 # ---------------- User Supplements ----------------
 
-def add_user_supplement(user_id: int, supplement_id: int, cycle: str = 'daily', time_of_day: time = None) -> dict:
-    with get_conn() as conn:
+def add_user_supplement(user_id: int, supplement_id: int, cycle: str = 'daily', time_of_day: time = None, uow: Optional[UnitOfWork] = None) -> dict:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'INSERT INTO "UserSupplement" (id, user_id, supplement_id, cycle, time_of_day, start_date) '
@@ -721,8 +1778,8 @@ def add_user_supplement(user_id: int, supplement_id: int, cycle: str = 'daily',
         )
         return cur.fetchone()
 
-def fetch_user_supplements(user_id: int) -> list[dict]:
-    with get_conn() as conn:
+def fetch_user_supplements(user_id: int, uow: Optional[UnitOfWork] = None) -> list[dict]:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         # Join with Supplement table to get name
         query = '''
@@ -735,8 +1792,8 @@ def fetch_user_supplements(user_id: int) -> list[dict]:
         return cur.fetchall() or []
 
 
-def delete_user_supplement(user_id: int, id: int) -> bool:
-    with get_conn() as conn:
+def delete_user_supplement(user_id: int, id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'DELETE FROM "UserSupplement" WHERE id = %s AND user_id = %s',
@@ -745,8 +1802,8 @@ def delete_user_supplement(user_id: int, id: int) -> bool:
         return cur.rowcount > 0
 
 
-def delete_user_supplement_by_supplement_id(user_id: int, supplement_id: int) -> bool:
-    with get_conn() as conn:
+def delete_user_supplement_by_supplement_id(user_id: int, supplement_id: int, uow: Optional[UnitOfWork] = None) -> bool:
+    with get_conn(uow) as conn:
         cur = conn.cursor()
         cur.execute(
             'DELETE FROM "UserSupplement" WHERE supplement_id = %s AND user_id = %s',
@@ -0,0 +1,1127 @@
+"""
+Async counterpart of db.py built on psycopg 3 and psycopg_pool.
+Exposes the same helper names so routers can `await` them from `async def` handlers
+without hopping to the threadpool. db.py stays as the blocking shim for scripts
+and the routes that still run sync.
+"""
+from __future__ import annotations
+from contextlib import asynccontextmanager
+from typing import Optional
+from datetime import date, datetime, timedelta
+
+import time
+
+from psycopg import AsyncCursor
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
+from db import (
+    DEFAULT_DATABASE_URL,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_MAX,
+    DB_POOL_MAX_WAITING,
+    DB_POOL_MIN,
+    PoolExhaustedError,
+    _DUE_NOTIFICATIONS_SQL,
+    _USER_DUE_NOTIFICATIONS_SQL,
+    _as_datetime,
+    _expand_series,
+    _generate_id,
+    _series_columns,
+)
+from cache import delivery_plan_cache, user_cache
+from query_stats import query_stats
+
+
+class InstrumentedAsyncCursor(AsyncCursor):
+    """AsyncCursor that reports every statement to query_stats."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            query_stats.record(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            query_stats.record(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+# Opened and closed by the app lifespan in main.py
+connection_pool = AsyncConnectionPool(
+    DEFAULT_DATABASE_URL,
+    min_size=DB_POOL_MIN,
+    max_size=DB_POOL_MAX,
+    timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    max_waiting=DB_POOL_MAX_WAITING,
+    # Session time zone is set once per physical connection instead of per checkout
+    kwargs={
+        "row_factory": dict_row,
+        "cursor_factory": InstrumentedAsyncCursor,
+        "options": "-c timezone=Asia/Seoul",
+    },
+    open=False,
+)
+
+
+async def open_pool() -> None:
+    await connection_pool.open()
+
+
+async def close_pool() -> None:
+    await connection_pool.close()
+
+
+def pool_stats() -> dict:
+    stats = connection_pool.get_stats()
+    return {
+        "max": DB_POOL_MAX,
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "idle": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+    }
+
+
+class AsyncUnitOfWork:
+    """
+    Async version of db.UnitOfWork: one pooled connection and one transaction per request.
+    """
+
+    def __init__(self):
+        self.conn = None
+        # Users whose cached aggregate must be dropped again once this transaction ends
+        self.dirty_users: set[int] = set()
+        # Same for compiled delivery plans
+        self.dirty_plans: set[int] = set()
+
+    def invalidate_user(self, user_id: str | int) -> None:
+        uid = int(user_id)
+        self.dirty_users.add(uid)
+        user_cache.invalidate(uid)
+
+    def invalidate_delivery_plan(self, user_id: str | int) -> None:
+        uid = int(user_id)
+        self.dirty_plans.add(uid)
+        delivery_plan_cache.invalidate(uid)
+
+    async def __aenter__(self) -> "AsyncUnitOfWork":
+        try:
+            self.conn = await connection_pool.getconn()
+        except (PoolTimeout, TooManyRequests) as exc:
+            raise PoolExhaustedError(str(exc)) from exc
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if exc_type is None:
+                await self.conn.commit()
+            else:
+                await self.conn.rollback()
+        finally:
+            await connection_pool.putconn(self.conn)
+            self.conn = None
+            for uid in self.dirty_users:
+                user_cache.invalidate(uid)
+            self.dirty_users.clear()
+            for uid in self.dirty_plans:
+                delivery_plan_cache.invalidate(uid)
+            self.dirty_plans.clear()
+        return False
+
+
+async def get_uow():
+    """FastAPI dependency: `uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)`."""
+    async with AsyncUnitOfWork() as uow:
+        yield uow
+
+
+@asynccontextmanager
+async def unit_of_work(uow: Optional[AsyncUnitOfWork] = None):
+    """
+    Yields the caller's unit of work, or opens a fresh one when none is given.
+    """
+    if uow is not None:
+        yield uow
+        return
+    async with AsyncUnitOfWork() as own:
+        yield own
+
+
+@asynccontextmanager
+async def get_conn(uow: Optional[AsyncUnitOfWork] = None):
+    """
+    Async version of db.get_conn().
+    Commits on success, rolls back on failure.
+    Returns the connection to the pool when done.
+    Inside a unit of work the shared connection is yielded and the transaction is left to it.
+    """
+    async with unit_of_work(uow) as scope:
+        yield scope.conn
+
+
+# ---------------- User & Auth ----------------
+
+# User row with PregnancyInfo and UserProfile embedded as JSON, loaded in one round trip.
+# LATERAL ... LIMIT 1 keeps one row per user even if a detail table has stray duplicates.
+_USER_AGGREGATE_SQL = '''
+    SELECT u.*,
+           COALESCE(p.doc, '{}'::jsonb) AS pregnancy_info,
+           COALESCE(up.doc, '{}'::jsonb) AS profile
+    FROM "User" u
+    LEFT JOIN LATERAL (
+        SELECT to_jsonb(preg) AS doc FROM "PregnancyInfo" preg WHERE preg.user_id = u.id LIMIT 1
+    ) p ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT to_jsonb(prof) AS doc FROM "UserProfile" prof WHERE prof.user_id = u.id LIMIT 1
+    ) up ON TRUE
+'''
+
+
+async def _fetch_user_aggregate(where: str, params: tuple, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(_USER_AGGREGATE_SQL + ' WHERE ' + where + ' LIMIT 1', params)
+        user = await cur.fetchone()
+        return dict(user) if user else None
+
+
+async def fetch_users_by_ids(user_ids: list[int], uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    """
+    Batch variant of fetch_user_by_id for admin and notification jobs.
+    Unknown ids are skipped; order follows user id.
+    """
+    if not user_ids:
+        return []
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            _USER_AGGREGATE_SQL + ' WHERE u.id = ANY(%s) ORDER BY u.id',
+            ([int(uid) for uid in user_ids],),
+        )
+        return [dict(row) for row in await cur.fetchall()]
+
+
+async def fetch_user_by_email(email: str, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    return await _fetch_user_aggregate('u.email = %s', (email,), uow=uow)
+
+
+async def fetch_user_by_social(provider: str, social_id: str, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    return await _fetch_user_aggregate('u.provider = %s AND u.social_id = %s', (provider, social_id), uow=uow)
+
+
+async def upsert_social_user(provider: str, social_id: str, email: str, nickname: str, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    """
+    Returns existing user if found by provider/social_id or email, otherwise inserts.
+    """
+    async with unit_of_work(uow) as uow:
+        existing = await fetch_user_by_social(provider, social_id, uow=uow)
+        if existing:
+            return existing
+
+        user_by_email = await fetch_user_by_email(email, uow=uow)
+        cur = uow.conn.cursor()
+        if user_by_email:
+            uow.invalidate_user(user_by_email["id"])
+            await cur.execute(
+                'update "User" set provider = %s, social_id = %s, nickname = %s, updated_at = now() where id = %s returning id',
+                (provider, social_id, nickname, user_by_email["id"]),
+            )
+        else:
+            await cur.execute(
+                'insert into "User" (id, email, provider, social_id, nickname, is_pregnant, created_at, updated_at) '
+                'values (%s, %s, %s, %s, %s, %s, now(), now()) '
+                'on conflict (provider, social_id) where social_id is not null '
+                'do update set updated_at = now() '
+                'returning id',
+                (_generate_id(), email, provider, social_id, nickname, False),
+            )
+        user = await cur.fetchone()
+        if not user:
+            return None
+        # An inserted row is not committed yet; keep it out of the user cache
+        uow.invalidate_user(user["id"])
+        return await fetch_user_by_id(user["id"], uow=uow)
+
+
+async def create_social_user_with_profile(
+    provider: str, 
+    social_id: str, 
+    email: str, 
+    nickname: str, 
+    gender: str,
+    is_pregnant: bool = False,
+    last_period_date: date = None,
+    due_date: date = None,
+    height: int = None,
+    weight: float = None,
+    uow: Optional[AsyncUnitOfWork] = None,
+) -> dict:
+    async with unit_of_work(uow) as uow:
+        cur = uow.conn.cursor()
+        # Insert User; a repeated signup for the same social account reuses the existing row
+        await cur.execute(
+            'insert into "User" (id, email, provider, social_id, nickname, is_pregnant, gender, created_at, updated_at) '
+            'values (%s, %s, %s, %s, %s, %s, %s, now(), now()) '
+            'on conflict (provider, social_id) where social_id is not null '
+            'do update set updated_at = now() '
+            'returning id',
+            (_generate_id(), email, provider, social_id, nickname, is_pregnant, gender),
+        )
+        user_id = (await cur.fetchone())["id"]
+        uow.invalidate_user(user_id)
+
+        # Insert Profile if needed
+        if height is not None or weight is not None:
+            await upsert_user_profile(user_id, height=height, initial_weight=weight, current_weight=weight, uow=uow)
+
+        # Insert Pregnancy Info if needed
+        if is_pregnant and (last_period_date or due_date):
+            await upsert_pregnancy_info(user_id, due_date=due_date, pregnancy_start=last_period_date, uow=uow)
+
+        # Same connection, so the uncommitted rows above are visible here
+        return await fetch_user_by_id(user_id, uow=uow)
+
+
+async def fetch_user_by_id(user_id: str | int, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    try:
+        key = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    # Rows this unit of work wrote are not committed yet, so never serve or cache them
+    use_cache = uow is None or key not in uow.dirty_users
+    since = None
+    if use_cache:
+        cached = user_cache.get(key)
+        if cached is not None:
+            return cached
+        since = user_cache.generation()
+
+    user = await _fetch_user_aggregate('u.id = %s', (key,), uow=uow)
+    if user and use_cache:
+        user_cache.set(key, user, since=since)
+    return user
+
+
+async def delete_user_by_id(user_id: str | int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    """
+    Delete user by id. Returns True if a row was deleted.
+    """
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        # 1. Delete Notifications linked to user's calendar events
+        await cur.execute('''
+            DELETE FROM "Notification" 
+            WHERE event_id IN (SELECT id FROM "CalendarEvent" WHERE user_id = %s)
+        ''', (user_id,))
+        
+        # 2. Delete CalendarEvents
+        await cur.execute('DELETE FROM "CalendarEventOverride" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "CalendarFeed" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "CalendarEvent" WHERE user_id = %s', (user_id,))
+        
+        # 3. Delete UserSupplements & CustomSupplements
+        await cur.execute('DELETE FROM "UserSupplement" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "CustomSupplement" WHERE user_id = %s', (user_id,))
+        
+        # 4. Delete PregnancyInfo, PeriodInfo, UserProfile, UserSetting
+        await cur.execute('DELETE FROM "PregnancyInfo" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "PeriodInfo" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "PeriodLog" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "PeriodProjection" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "UserProfile" WHERE user_id = %s', (user_id,))
+        await cur.execute('DELETE FROM "UserSetting" WHERE user_id = %s', (user_id,))
+        
+        # 5. Delete PartnerShare (both as user and partner)
+        await cur.execute('DELETE FROM "PartnerShare" WHERE user_id = %s OR partner_id = %s', (user_id, user_id))
+        
+        # 6. Delete User
+        await cur.execute('DELETE FROM "User" WHERE id = %s', (user_id,))
+        return cur.rowcount > 0
+
+
+
+async def create_user_email(email: str, password: str, nickname: str, pregnant: bool, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with unit_of_work(uow) as uow:
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'INSERT INTO "User" (id, email, password, provider, nickname, is_pregnant, created_at, updated_at) '
+            "VALUES (%s, %s, %s, 'local', %s, %s, NOW(), NOW()) RETURNING *",
+            (_generate_id(), email, password, nickname, pregnant)
+        )
+        user = await cur.fetchone()
+        uow.invalidate_user(user["id"])
+        return user
+
+
+async def upsert_pregnancy_info(user_id: int, due_date: date = None, pregnancy_start: date = None, uow: Optional[AsyncUnitOfWork] = None) -> None:
+    from datetime import timedelta
+    
+    # Calculate ovulation_week_start if pregnancy_start is provided (LMP + 14 days)
+    ovulation_week_start = None
+    if pregnancy_start:
+        ovulation_week_start = pregnancy_start + timedelta(days=14)
+
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'INSERT INTO "PregnancyInfo" (user_id, due_date, pregnancy_start, ovulation_week_start, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, NOW(), NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'due_date = COALESCE(EXCLUDED.due_date, "PregnancyInfo".due_date), '
+            'pregnancy_start = COALESCE(EXCLUDED.pregnancy_start, "PregnancyInfo".pregnancy_start), '
+            'ovulation_week_start = COALESCE(EXCLUDED.ovulation_week_start, "PregnancyInfo".ovulation_week_start), '
+            'updated_at = NOW()',
+            (user_id, due_date, pregnancy_start, ovulation_week_start)
+        )
+
+
+async def upsert_period_info(user_id: int, last_period: date = None, period_start: date = None, uow: Optional[AsyncUnitOfWork] = None) -> None:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "PeriodInfo" (user_id, last_period, period_start, updated_at) VALUES (%s, %s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'last_period = COALESCE(EXCLUDED.last_period, "PeriodInfo".last_period), '
+            'period_start = COALESCE(EXCLUDED.period_start, "PeriodInfo".period_start), '
+            'updated_at = NOW()',
+            (user_id, last_period, period_start)
+        )
+        if last_period is not None:
+            await cur.execute(
+                'INSERT INTO "PeriodLog" (user_id, start_date) VALUES (%s, %s) ON CONFLICT (user_id, start_date) DO NOTHING',
+                (user_id, last_period)
+            )
+
+
+async def upsert_user_profile(user_id: int, height: int = None, initial_weight: float = None, current_weight: float = None, uow: Optional[AsyncUnitOfWork] = None) -> None:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'INSERT INTO "UserProfile" (user_id, height, initial_weight, current_weight, updated_at) VALUES (%s, %s, %s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'height = EXCLUDED.height, initial_weight = EXCLUDED.initial_weight, '
+            'current_weight = EXCLUDED.current_weight, updated_at = NOW()',
+            (user_id, height, initial_weight, current_weight)
+        )
+
+
+async def update_user_nickname(user_id: int, nickname: str, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'UPDATE "User" SET nickname = %s, updated_at = NOW() WHERE id = %s',
+            (nickname, user_id)
+        )
+        return cur.rowcount > 0
+
+
+async def update_user_pregnancy(user_id: int, is_pregnant: bool, last_period_date: date = None, due_date: date = None, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_user(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'UPDATE "User" SET is_pregnant = %s, updated_at = NOW() WHERE id = %s',
+            (is_pregnant, user_id)
+        )
+        updated = cur.rowcount > 0
+
+        if is_pregnant and (last_period_date or due_date):
+            await upsert_pregnancy_info(user_id, pregnancy_start=last_period_date, due_date=due_date, uow=uow)
+
+        return updated
+
+
+# ---------------- Supplements & Health Info ----------------
+
+
+
+async def fetch_pregnancy_info(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'select * from "PregnancyInfo" where user_id = %s limit 1',
+            (user_id,),
+        )
+        return await cur.fetchone()
+
+
+async def fetch_period_info(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'select * from "PeriodInfo" where user_id = %s limit 1',
+            (user_id,),
+        )
+        return await cur.fetchone()
+
+
+
+async def fetch_supplements(uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('select id, name, brand from "Supplement"')
+        return await cur.fetchall() or []
+
+
+async def fetch_all_supplements(uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('select * from "Supplement"')
+        return await cur.fetchall() or []
+
+
+async def fetch_supplement_by_id(supplement_id: int | str, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'select * from "Supplement" where id = %s limit 1',
+            (supplement_id,),
+        )
+        return await cur.fetchone()
+
+
+async def fetch_nutrients_by_period(period: str, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        # 1. Fetch Nutrients
+        await cur.execute(
+            'select * from "Nutrient" where recommended_period = %s',
+            (period,),
+        )
+        nutrients = await cur.fetchall()
+        
+        if not nutrients:
+            return []
+
+        # 2. Fetch Supplements for these nutrients
+        # psycopg 3 does not expand tuples for IN, so bind a list to ANY instead
+        nutrient_ids = [n['id'] for n in nutrients]
+
+        query = """
+            SELECT s.*, sn.nutrient_id
+            FROM "Supplement" s
+            JOIN "SupplementNutrient" sn ON s.id = sn.supplement_id
+            WHERE sn.nutrient_id = ANY(%s)
+        """
+        await cur.execute(query, (nutrient_ids,))
+        supplements = await cur.fetchall()
+        
+        # 3. Attach supplements to nutrients
+        supp_map = {n['id']: [] for n in nutrients}
+        for s in supplements:
+            s_formatted = {
+                'id': s['id'],
+                'name': s['name'],
+                'schedule': s.get('dosage_info'), # Map dosage_info to schedule
+                'caution': s.get('caution'),
+                'brand': s.get('brand')
+            }
+            supp_map[s['nutrient_id']].append(s_formatted)
+            
+        for n in nutrients:
+            n['supplements'] = supp_map.get(n['id'], [])
+            # Ensure benefits is at least an empty list if not present (schema doesn't have it)
+            if 'benefits' not in n:
+                n['benefits'] = []
+                
+        return nutrients
+
+
+# ---------------- Period Log ----------------
+
+async def add_period_log(user_id: int, start_date: date, end_date: date = None, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    """
+    Record a period. Logging the same start again only fills in end_date.
+    PeriodInfo.last_period follows the latest logged start.
+    """
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "PeriodLog" (user_id, start_date, end_date) VALUES (%s, %s, %s) '
+            'ON CONFLICT (user_id, start_date) DO UPDATE SET end_date = COALESCE(EXCLUDED.end_date, "PeriodLog".end_date) '
+            'RETURNING *',
+            (user_id, start_date, end_date)
+        )
+        log = await cur.fetchone()
+        await cur.execute(
+            'INSERT INTO "PeriodInfo" (user_id, last_period, updated_at) VALUES (%s, %s, NOW()) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'last_period = GREATEST(EXCLUDED.last_period, "PeriodInfo".last_period), updated_at = NOW()',
+            (user_id, start_date)
+        )
+        return log
+
+
+async def fetch_period_logs(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('SELECT * FROM "PeriodLog" WHERE user_id = %s ORDER BY start_date', (user_id,))
+        return await cur.fetchall() or []
+
+
+async def delete_period_log(user_id: int, log_id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('DELETE FROM "PeriodLog" WHERE id = %s AND user_id = %s', (log_id, user_id))
+        deleted = cur.rowcount > 0
+        if deleted:
+            # Fall back to the latest remaining start; with no logs left last_period is kept as entered
+            await cur.execute(
+                'UPDATE "PeriodInfo" p SET last_period = l.latest, updated_at = NOW() '
+                'FROM (SELECT max(start_date) AS latest FROM "PeriodLog" WHERE user_id = %s) l '
+                'WHERE p.user_id = %s AND l.latest IS NOT NULL AND p.last_period IS DISTINCT FROM l.latest',
+                (user_id, user_id)
+            )
+        return deleted
+
+
+async def fetch_period_projection(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('SELECT * FROM "PeriodProjection" WHERE user_id = %s', (user_id,))
+        return await cur.fetchone()
+
+
+# ---------------- Calendar & Notifications ----------------
+
+async def fetch_calendar_event(event_id: int, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('select * from "CalendarEvent" where id = %s limit 1', (event_id,))
+        return await cur.fetchone()
+
+
+async def fetch_calendar_events_range(user_id: int, start_date, end_date, type: Optional[str] = None, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    """
+    Events starting in [start_date, end_date), ordered by start. Repeating events
+    are stored once per series and expanded here for the requested window only;
+    one-off rows have occurrence_date None.
+    """
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        type_filter = ' AND type = %s' if type else ''
+        type_params = [type] if type else []
+        await cur.execute(
+            'SELECT *, NULL::date AS occurrence_date FROM "CalendarEvent" '
+            'WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s AND rrule IS NULL' + type_filter,
+            (user_id, start_date, end_date, *type_params),
+        )
+        events = await cur.fetchall() or []
+
+        await cur.execute(
+            'SELECT * FROM "CalendarEvent" WHERE user_id = %s AND rrule IS NOT NULL' + type_filter + ' AND ('
+            '(start_datetime < %s AND (series_until IS NULL OR series_until >= %s)) '
+            'OR id IN (SELECT event_id FROM "CalendarEventOverride" WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s))',
+            (user_id, *type_params, end_date, start_date, user_id, start_date, end_date),
+        )
+        series = await cur.fetchall() or []
+        if series:
+            first_day = _as_datetime(start_date).date()
+            end_day = (_as_datetime(end_date) - timedelta(microseconds=1)).date() + timedelta(days=1)
+            await cur.execute(
+                'SELECT * FROM "CalendarEventOverride" WHERE event_id = ANY(%s) AND ('
+                '(occurrence_date >= %s AND occurrence_date < %s) OR (start_datetime >= %s AND start_datetime < %s))',
+                ([ev["id"] for ev in series], first_day, end_day, start_date, end_date),
+            )
+            events += _expand_series(series, await cur.fetchall() or [], start_date, end_date)
+
+        events.sort(key=lambda ev: (ev["start_datetime"], ev["id"]))
+        return events
+
+
+async def upsert_calendar_event(
+    user_id: int,
+    title: str,
+    start_datetime,
+    linked_supplement_id: int | str | None = None,
+    type: str = "supplement",
+    rrule: Optional[str] = None,
+    uow: Optional[AsyncUnitOfWork] = None,
+) -> dict:
+    """
+    Insert a CalendarEvent row, or return the existing one for the same
+    (user, type, supplement, start) slot. Supplement events are deduplicated by
+    a partial unique index; todos have no supplement and are always inserted.
+    With `rrule` the row is a whole repeating series starting at start_datetime.
+    """
+    repeat_cycle, rrule, series_until = _series_columns(rrule, start_datetime)
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        insert_sql = (
+            'insert into "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, rrule, series_until, linked_supplement_id, created_at, updated_at) '
+            'values (%s, %s, %s, %s, %s, %s, %s, %s, %s, now(), now()) '
+        )
+        if linked_supplement_id is not None:
+            # DO UPDATE (not DO NOTHING) so RETURNING also yields the row that already existed
+            insert_sql += (
+                'on conflict (user_id, type, linked_supplement_id, start_datetime) '
+                'where linked_supplement_id is not null '
+                'do update set title = excluded.title '
+            )
+        await cur.execute(
+            insert_sql + 'returning *',
+            (
+                user_id,
+                type,
+                title,
+                start_datetime,
+                None,
+                repeat_cycle,
+                rrule,
+                series_until,
+                linked_supplement_id,
+            ),
+        )
+        return await cur.fetchone()
+
+
+async def delete_calendar_event(event_id: int, user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    """
+    Delete a calendar event.
+    """
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        # First delete notifications linked to this event
+        await cur.execute('DELETE FROM "Notification" WHERE event_id = %s', (event_id,))
+        await cur.execute('DELETE FROM "CalendarEventOverride" WHERE event_id = %s AND user_id = %s', (event_id, user_id))
+
+        await cur.execute(
+            'DELETE FROM "CalendarEvent" WHERE id = %s AND user_id = %s',
+            (event_id, user_id),
+        )
+        return cur.rowcount > 0
+
+
+async def upsert_event_override(
+    user_id: int,
+    event_id: int,
+    occurrence_date: date,
+    title: Optional[str] = None,
+    start_datetime: Optional[datetime] = None,
+    cancelled: bool = False,
+    uow: Optional[AsyncUnitOfWork] = None,
+) -> dict:
+    """Move, rename or cancel one occurrence of a repeating event; only changed occurrences get a row."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "CalendarEventOverride" (event_id, user_id, occurrence_date, cancelled, title, start_datetime, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, NOW()) '
+            'ON CONFLICT (event_id, occurrence_date) DO UPDATE SET cancelled = EXCLUDED.cancelled, '
+            'title = EXCLUDED.title, start_datetime = EXCLUDED.start_datetime, updated_at = NOW() '
+            'WHERE "CalendarEventOverride".user_id = EXCLUDED.user_id '
+            'RETURNING *',
+            (event_id, user_id, occurrence_date, cancelled, title, start_datetime),
+        )
+        return await cur.fetchone()
+
+
+async def delete_event_override(user_id: int, event_id: int, occurrence_date: date, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    """Restore one occurrence to what the rule says."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "CalendarEventOverride" WHERE event_id = %s AND occurrence_date = %s AND user_id = %s',
+            (event_id, occurrence_date, user_id),
+        )
+        return cur.rowcount > 0
+
+
+async def create_todos(user_id: int, todos: list[tuple], uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    """
+    Insert many todos in one statement. `todos` holds (title, start_datetime, rrule)
+    tuples; rows come back in the same order.
+    """
+    if not todos:
+        return []
+    columns = [(title, start) + _series_columns(rrule, start) for title, start, rrule in todos]
+    titles, starts, cycles, rrules, untils = (list(c) for c in zip(*columns))
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "CalendarEvent" (user_id, type, title, start_datetime, end_datetime, repeat_cycle, rrule, series_until, completed, created_at, updated_at) '
+            "SELECT %s, 'todo', t.title, t.start_datetime, NULL, t.repeat_cycle, t.rrule, t.series_until, FALSE, NOW(), NOW() "
+            'FROM unnest(%s::varchar[], %s::timestamp[], %s::varchar[], %s::text[], %s::timestamp[]) '
+            'WITH ORDINALITY AS t(title, start_datetime, repeat_cycle, rrule, series_until, ord) '
+            'ORDER BY t.ord '
+            'RETURNING *',
+            (user_id, titles, starts, cycles, rrules, untils),
+        )
+        # Ids are assigned in ORDER BY order, so sorting by id restores the input order
+        return sorted(await cur.fetchall(), key=lambda row: row["id"])
+
+
+async def delete_todos(user_id: int, event_ids: list[int], uow: Optional[AsyncUnitOfWork] = None) -> set[int]:
+    """Delete the user's todos among `event_ids` with their notifications and overrides; returns the ids deleted."""
+    if not event_ids:
+        return set()
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "Notification" WHERE event_id IN '
+            "(SELECT id FROM \"CalendarEvent\" WHERE id = ANY(%s) AND user_id = %s AND type = 'todo')",
+            (event_ids, user_id),
+        )
+        await cur.execute('DELETE FROM "CalendarEventOverride" WHERE event_id = ANY(%s) AND user_id = %s', (event_ids, user_id))
+        await cur.execute(
+            "DELETE FROM \"CalendarEvent\" WHERE id = ANY(%s) AND user_id = %s AND type = 'todo' RETURNING id",
+            (event_ids, user_id),
+        )
+        return {row["id"] for row in await cur.fetchall()}
+
+
+async def set_todos_completed(user_id: int, items: list[tuple], uow: Optional[AsyncUnitOfWork] = None) -> set[tuple]:
+    """
+    Mark todos done or not done. `items` holds (event_id, occurrence_date, completed);
+    occurrence_date is None for one-off todos and the rule date for an occurrence
+    of a repeating one. Returns the (event_id, occurrence_date) pairs that were updated.
+    """
+    single = [(event_id, done) for event_id, day, done in items if day is None]
+    occurrences = [(event_id, day, done) for event_id, day, done in items if day is not None]
+    updated = set()
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        if single:
+            ids, done = (list(c) for c in zip(*single))
+            await cur.execute(
+                'UPDATE "CalendarEvent" e SET completed = v.completed, updated_at = NOW() '
+                'FROM unnest(%s::bigint[], %s::boolean[]) AS v(id, completed) '
+                "WHERE e.id = v.id AND e.user_id = %s AND e.type = 'todo' AND e.rrule IS NULL "
+                'RETURNING e.id',
+                (ids, done, user_id),
+            )
+            updated |= {(row["id"], None) for row in await cur.fetchall()}
+        if occurrences:
+            ids, days, done = (list(c) for c in zip(*occurrences))
+            await cur.execute(
+                'INSERT INTO "CalendarEventOverride" (event_id, user_id, occurrence_date, completed, updated_at) '
+                'SELECT v.id, e.user_id, v.day, v.completed, NOW() '
+                'FROM unnest(%s::bigint[], %s::date[], %s::boolean[]) AS v(id, day, completed) '
+                "JOIN \"CalendarEvent\" e ON e.id = v.id AND e.user_id = %s AND e.type = 'todo' AND e.rrule IS NOT NULL "
+                'ON CONFLICT (event_id, occurrence_date) DO UPDATE SET completed = EXCLUDED.completed, updated_at = NOW() '
+                'RETURNING event_id, occurrence_date',
+                (ids, days, done, user_id),
+            )
+            updated |= {(row["event_id"], row["occurrence_date"]) for row in await cur.fetchall()}
+    return updated
+
+
+async def fetch_calendar_events_by_ids(user_id: int, event_ids: list[int], uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('SELECT * FROM "CalendarEvent" WHERE id = ANY(%s) AND user_id = %s', (event_ids, user_id))
+        return await cur.fetchall() or []
+
+
+async def ensure_calendar_feed(user_id: int, token: str, uow: Optional[AsyncUnitOfWork] = None) -> str:
+    """The user's feed token; `token` is stored only if the user has none yet."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "CalendarFeed" (user_id, token) VALUES (%s, %s) '
+            'ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id RETURNING token',
+            (user_id, token),
+        )
+        return (await cur.fetchone())["token"]
+
+
+async def rotate_calendar_feed(user_id: int, token: str, uow: Optional[AsyncUnitOfWork] = None) -> str:
+    """Replace the user's feed token; the old feed URL stops working."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "CalendarFeed" (user_id, token) VALUES (%s, %s) '
+            'ON CONFLICT (user_id) DO UPDATE SET token = EXCLUDED.token, created_at = NOW() RETURNING token',
+            (user_id, token),
+        )
+        return (await cur.fetchone())["token"]
+
+
+async def delete_calendar_feed(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('DELETE FROM "CalendarFeed" WHERE user_id = %s', (user_id,))
+        return cur.rowcount > 0
+
+
+async def fetch_calendar_feed(token: str, uow: Optional[AsyncUnitOfWork] = None) -> Optional[dict]:
+    """Owner and data version (see fetch_user_data_version) of a feed token in one lookup."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'SELECT f.user_id, COALESCE(v.version, 0) AS version, v.updated_at '
+            'FROM "CalendarFeed" f LEFT JOIN "UserDataVersion" v ON v.user_id = f.user_id '
+            'WHERE f.token = %s',
+            (token,),
+        )
+        return await cur.fetchone()
+
+
+async def fetch_user_todo_events(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    """Every todo row of the user, series unexpanded, with its overrides under "overrides"."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            "SELECT * FROM \"CalendarEvent\" WHERE user_id = %s AND type = 'todo' ORDER BY start_datetime, id",
+            (user_id,),
+        )
+        events = await cur.fetchall() or []
+        await cur.execute(
+            'SELECT * FROM "CalendarEventOverride" WHERE user_id = %s ORDER BY event_id, occurrence_date',
+            (user_id,),
+        )
+        overrides: dict[int, list[dict]] = {}
+        for o in await cur.fetchall():
+            overrides.setdefault(o["event_id"], []).append(o)
+        return [dict(ev, overrides=overrides.get(ev["id"], [])) for ev in events]
+
+
+# Alias for backward compatibility if needed, or just use upsert_calendar_event directly
+async def upsert_calendar_event_for_supplement(
+    user_id: int,
+    supplement_id: str | int,
+    start_dt,
+    title: str,
+    uow: Optional[AsyncUnitOfWork] = None,
+) -> dict:
+    return await upsert_calendar_event(user_id, title, start_dt, supplement_id, type="supplement", uow=uow)
+
+
+async def ensure_notification(event_id: int, notify_time, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'insert into "Notification" (event_id, notify_time, is_sent) values (%s, %s, %s) '
+            'on conflict (event_id, notify_time) do update set notify_time = excluded.notify_time '
+            'returning *',
+            (event_id, notify_time, False),
+        )
+        return await cur.fetchone()
+
+
+async def fetch_notifications_due(now, limit: int = 500, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(_DUE_NOTIFICATIONS_SQL, {"now": now, "limit": limit})
+        return await cur.fetchall() or []
+
+
+async def fetch_user_notifications_due(user_id: int, now, since, limit: int = 100, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    """One user's unsent reminders due in (since, now], reached through their CalendarEvent rows."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(_USER_DUE_NOTIFICATIONS_SQL, (user_id, now, since, limit))
+        return await cur.fetchall() or []
+
+
+async def mark_notification_sent(notification_id: int, user_id: Optional[int] = None, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    """Mark one reminder sent; with `user_id`, only if it belongs to that user's event."""
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'UPDATE "Notification" n SET is_sent = true, updated_at = now() WHERE n.id = %s '
+            'AND (%s::bigint IS NULL OR EXISTS (SELECT 1 FROM "CalendarEvent" e WHERE e.id = n.event_id AND e.user_id = %s::bigint))',
+            (notification_id, user_id, user_id),
+        )
+        return cur.rowcount > 0
+
+# ---------------- User Settings ----------------
+
+async def fetch_user_settings(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('select * from "UserSetting" where user_id = %s order by default_notify_time', (user_id,))
+        return await cur.fetchall() or []
+
+
+async def add_user_setting_time(user_id: int, notify_time: time, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
+        # New times inherit the enabled flag from the user's other rows, or default to True
+        await cur.execute(
+            'INSERT INTO "UserSetting" (user_id, notification_enabled, default_notify_time, language) '
+            'SELECT %s, COALESCE((SELECT notification_enabled FROM "UserSetting" WHERE user_id = %s LIMIT 1), TRUE), %s, %s '
+            'ON CONFLICT (user_id, default_notify_time) DO UPDATE SET default_notify_time = EXCLUDED.default_notify_time '
+            'RETURNING *',
+            (user_id, user_id, notify_time, 'ko')
+        )
+        return await cur.fetchone()
+
+
+async def delete_user_setting_time(user_id: int, notify_time: time, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'DELETE FROM "UserSetting" WHERE user_id = %s AND default_notify_time = %s',
+            (user_id, notify_time)
+        )
+        return cur.rowcount > 0
+
+
+async def update_user_notification_toggle(user_id: int, enabled: bool, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with unit_of_work(uow) as uow:
+        uow.invalidate_delivery_plan(user_id)
+        cur = uow.conn.cursor()
+        await cur.execute(
+            'UPDATE "UserSetting" SET notification_enabled = %s WHERE user_id = %s',
+            (enabled, user_id)
+        )
+        if cur.rowcount == 0:
+            # No reminder times yet: keep the flag on a row without one
+            await cur.execute(
+                'INSERT INTO "UserSetting" (user_id, notification_enabled, default_notify_time, language) VALUES (%s, %s, NULL, %s)',
+                (user_id, enabled, 'ko')
+            )
+        return True
+
+
+async def add_custom_supplement(user_id: int, name: str, note: str = None, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "CustomSupplement" (id, user_id, name, note, start_date, is_active) VALUES (%s, %s, %s, %s, NOW(), FALSE) RETURNING *',
+            (_generate_id(), user_id, name, note)
+        )
+        return await cur.fetchone()
+
+
+async def toggle_custom_supplement(user_id: int, id: int, is_active: bool, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'UPDATE "CustomSupplement" SET is_active = %s WHERE id = %s AND user_id = %s',
+            (is_active, id, user_id)
+        )
+        return cur.rowcount > 0
+
+
+async def delete_custom_supplement(user_id: int, id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "CustomSupplement" WHERE id = %s AND user_id = %s',
+            (id, user_id)
+        )
+        return cur.rowcount > 0
+
+
+async def fetch_custom_supplements(user_id: int, active_only: bool = False, uow: Optional[AsyncUnitOfWork] = None) -> list:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        if active_only:
+            await cur.execute('SELECT * FROM "CustomSupplement" WHERE user_id = %s AND is_active = TRUE', (user_id,))
+        else:
+            await cur.execute('SELECT * FROM "CustomSupplement" WHERE user_id = %s', (user_id,))
+        return await cur.fetchall()
+
+
+
+
+async def fetch_user_profile(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute('SELECT * FROM "UserProfile" WHERE user_id = %s', (user_id,))
+        return await cur.fetchone()
+
+
+
+
+# ---------------- Doctor's Note ----------------
+
+async def fetch_doctors_notes(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'SELECT * FROM "DoctorsNote" WHERE user_id = %s ORDER BY visit_date DESC, created_at DESC',
+            (user_id,)
+        )
+        return await cur.fetchall() or []
+
+
+async def create_doctors_note(user_id: int, content: str, visit_date: date = None, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "DoctorsNote" (id, user_id, content, visit_date, created_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, NOW(), NOW()) RETURNING *',
+            (_generate_id(), user_id, content, visit_date)
+        )
+        return await cur.fetchone()
+
+
+async def delete_doctors_note(note_id: int, user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "DoctorsNote" WHERE id = %s AND user_id = %s',
+            (note_id, user_id)
+        )
+        return cur.rowcount > 0
+
+
+# ---------------- Tips ----------------
+
+async def fetch_random_tips(limit: int = 3, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        # Use RANDOM() for PostgreSQL to get random rows
+        await cur.execute('SELECT * FROM "Tip" ORDER BY RANDOM() LIMIT %s', (limit,))
+        return await cur.fetchall() or []
+
+
+# ---------------- User Supplements ----------------
+
+async def add_user_supplement(user_id: int, supplement_id: int, cycle: str = 'daily', time_of_day: time = None, uow: Optional[AsyncUnitOfWork] = None) -> dict:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'INSERT INTO "UserSupplement" (id, user_id, supplement_id, cycle, time_of_day, start_date) '
+            'VALUES (%s, %s, %s, %s, %s, NOW()) RETURNING *',
+            (_generate_id(), user_id, supplement_id, cycle, time_of_day)
+        )
+        return await cur.fetchone()
+
+async def fetch_user_supplements(user_id: int, uow: Optional[AsyncUnitOfWork] = None) -> list[dict]:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        # Join with Supplement table to get name
+        query = '''
+            SELECT us.*, s.name 
+            FROM "UserSupplement" us
+            JOIN "Supplement" s ON us.supplement_id = s.id
+            WHERE us.user_id = %s
+        '''
+        await cur.execute(query, (user_id,))
+        return await cur.fetchall() or []
+
+
+async def delete_user_supplement(user_id: int, id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "UserSupplement" WHERE id = %s AND user_id = %s',
+            (id, user_id)
+        )
+        return cur.rowcount > 0
+
+
+async def delete_user_supplement_by_supplement_id(user_id: int, supplement_id: int, uow: Optional[AsyncUnitOfWork] = None) -> bool:
+    async with get_conn(uow) as conn:
+        cur = conn.cursor()
+        await cur.execute(
+            'DELETE FROM "UserSupplement" WHERE supplement_id = %s AND user_id = %s',
+            (supplement_id, user_id)
+        )
+        return cur.rowcount > 0
+
+
+
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import os
+import threading
+import time
+
+# Snowflake-style 53-bit ids: | 1 | 40-bit ms since ID_EPOCH_MS | 6-bit worker | 6-bit sequence |
+# The leading bit puts every new id above the old ms*1000+rand ids (< 2**52),
+# and 53 bits keep ids exact as JavaScript numbers in the frontend.
+ID_EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+TIMESTAMP_BITS = 40
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+_HIGH_BIT = 1 << (TIMESTAMP_BITS + WORKER_BITS + SEQUENCE_BITS)
+
+
+# Advisory lock class of the worker id leases (two-key form; migrations lock the one-key form)
+_LEASE_LOCK_CLASS = 2025_0002
+
+
+def _configured_worker_id() -> int | None:
+    value = os.getenv("WORKER_ID")
+    if value is None:
+        return None
+    worker_id = int(value)
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise RuntimeError(f"WORKER_ID must be between 0 and {MAX_WORKER_ID}.")
+    return worker_id
+
+
+def _lease_worker_id():
+    """
+    Claim the lowest free worker id with a session advisory lock, so no two live
+    processes share one. The lock lasts as long as the returned connection,
+    which the caller keeps open for the life of the process.
+    """
+    # Imported here: db imports this module, and most processes never need a lease
+    import psycopg2
+
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise RuntimeError("Set WORKER_ID, or DATABASE_URL so a worker id can be leased.")
+    conn = psycopg2.connect(url, keepalives=1, application_name="id-worker-lease")
+    conn.autocommit = True
+    cur = conn.cursor()
+    for worker_id in range(MAX_WORKER_ID + 1):
+        cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (_LEASE_LOCK_CLASS, worker_id))
+        if cur.fetchone()[0]:
+            return worker_id, conn
+    conn.close()
+    raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker ids are leased; set WORKER_ID or run fewer processes.")
+
+
+class IdGenerator:
+    """
+    Time-ordered id generator. Ids from one process are strictly increasing;
+    ids from processes with different worker ids never collide. Without a
+    worker id (argument or WORKER_ID) one is leased from Postgres on first use.
+    """
+
+    def __init__(self, worker_id: int | None = None):
+        self._fixed_worker_id = worker_id
+        self._lease = None
+        # Leases inherited over fork belong to the parent; closing them would end its session
+        self._inherited_leases = []
+        self._reset()
+
+    def _reset(self) -> None:
+        if self._lease is not None:
+            self._inherited_leases.append(self._lease)
+            self._lease = None
+        self.worker_id = self._fixed_worker_id if self._fixed_worker_id is not None else _configured_worker_id()
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self.worker_id is None:
+                self.worker_id, self._lease = _lease_worker_id()
+            now = int(time.time() * 1000) - ID_EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                # Same millisecond, or the wall clock stepped back: keep counting
+                # on the last timestamp and borrow the next one on overflow.
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (
+                _HIGH_BIT
+                | (self._last_ms << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+
+
+def parse_id(value: int) -> dict:
+    """Split an id into its parts; handy when debugging ordering issues."""
+    return {
+        "timestamp_ms": ((value & (_HIGH_BIT - 1)) >> (WORKER_BITS + SEQUENCE_BITS)) + ID_EPOCH_MS,
+        "worker_id": (value >> SEQUENCE_BITS) & MAX_WORKER_ID,
+        "sequence": value & MAX_SEQUENCE,
+    }
+
+
+id_generator = IdGenerator()
+
+# A forked child inherits the parent's counters and possibly a held lock; start fresh
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=id_generator._reset)
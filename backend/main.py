@@ -1,8 +1,33 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, calendar, supplements, users, chatbot
+from fastapi.responses import JSONResponse
+import db
+import db_async
+import query_stats
+from services import materialize_service, push_service
+from routers import auth, calendar, supplements, users, chatbot, metrics, notification
 
-app = FastAPI(title="Baby Prep API", version="0.1.0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db_async.open_pool()
+    if materialize_service.MATERIALIZE_ROLLING:
+        materialize_service.rolling_materializer.start()
+    push_service.hub.bind(asyncio.get_running_loop())
+    if push_service.PUSH_NOTIFICATIONS:
+        push_service.relay.start()
+        push_service.push_scheduler.start()
+    yield
+    push_service.push_scheduler.stop()
+    push_service.relay.stop()
+    materialize_service.rolling_materializer.stop()
+    await db_async.close_pool()
+
+
+app = FastAPI(title="Baby Prep API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,11 +37,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def db_query_timing(request: Request, call_next):
+    # Statements issued while serving this request accumulate into `queries`
+    queries = query_stats.begin_request()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = f'db;dur={queries.total_ms:.1f};desc="{queries.count} queries"'
+    return response
+
+
 app.include_router(auth.router)
 app.include_router(calendar.router)
 app.include_router(supplements.router)
 app.include_router(users.router)
 app.include_router(chatbot.router)
+app.include_router(metrics.router)
+app.include_router(notification.router)
+
+
+@app.exception_handler(db.PoolExhaustedError)
+def pool_exhausted_handler(request: Request, exc: db.PoolExhaustedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "서버가 혼잡합니다. 잠시 후 다시 시도해주세요."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 @app.get("/")
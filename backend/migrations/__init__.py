@@ -0,0 +1,163 @@
+"""
+Versioned schema migrations.
+
+Each step is a module named mNNNN_<name>.py in this package that defines
+up(cur) and down(cur). Steps that build indexes CONCURRENTLY set
+TRANSACTIONAL = False and run in autocommit mode; everything else runs in one
+transaction together with its "schema_version" bookkeeping.
+
+Usage: python -m migrations [status | upgrade [VERSION] | downgrade VERSION | check]
+"""
+from __future__ import annotations
+import importlib
+import pkgutil
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from db import DEFAULT_DATABASE_URL
+
+# Arbitrary key so two deploys never migrate at the same time
+_ADVISORY_LOCK_KEY = 2025_0001
+
+
+class IrreversibleMigration(RuntimeError):
+    pass
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+
+def discover() -> list[Migration]:
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = re.fullmatch(r"m(\d{4})_(\w+)", info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            found.append(Migration(int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda m: m.version)
+    return found
+
+
+@contextmanager
+def _connect():
+    # A dedicated connection: migrations toggle autocommit and hold an advisory lock
+    conn = psycopg2.connect(DEFAULT_DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(
+            'CREATE TABLE IF NOT EXISTS "schema_version" ('
+            '"version" INT PRIMARY KEY, "name" TEXT NOT NULL, "applied_at" TIMESTAMPTZ DEFAULT NOW())'
+        )
+        cur.execute('SELECT pg_advisory_lock(%s)', (_ADVISORY_LOCK_KEY,))
+        yield conn
+    finally:
+        conn.close()
+
+
+def _applied(conn) -> set[int]:
+    cur = conn.cursor()
+    cur.execute('SELECT version FROM "schema_version"')
+    return {row["version"] for row in cur.fetchall()}
+
+
+def _run(conn, migration: Migration, direction: str) -> None:
+    step = getattr(migration.module, direction)
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            step(conn.cursor())
+            _record(conn.cursor(), migration, direction)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    else:
+        # Each statement commits on its own, so steps must be safe to re-run
+        step(conn.cursor())
+        _record(conn.cursor(), migration, direction)
+
+
+def _record(cur, migration: Migration, direction: str) -> None:
+    if direction == "up":
+        cur.execute(
+            'INSERT INTO "schema_version" (version, name) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING',
+            (migration.version, migration.name),
+        )
+    else:
+        cur.execute('DELETE FROM "schema_version" WHERE version = %s', (migration.version,))
+
+
+def status() -> list[dict]:
+    with _connect() as conn:
+        applied = _applied(conn)
+    return [{"version": m.version, "name": m.name, "applied": m.version in applied} for m in discover()]
+
+
+def upgrade(target: Optional[int] = None) -> list[int]:
+    """Apply every pending migration up to and including `target` (default: latest)."""
+    done = []
+    with _connect() as conn:
+        applied = _applied(conn)
+        for migration in discover():
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            print(f"Applying {migration.version:04d}_{migration.name}...")
+            _run(conn, migration, "up")
+            done.append(migration.version)
+    return done
+
+
+def downgrade(target: int) -> list[int]:
+    """Revert applied migrations newer than `target`, newest first."""
+    done = []
+    with _connect() as conn:
+        applied = _applied(conn)
+        for migration in reversed(discover()):
+            if migration.version <= target or migration.version not in applied:
+                continue
+            print(f"Reverting {migration.version:04d}_{migration.name}...")
+            _run(conn, migration, "down")
+            done.append(migration.version)
+    return done
+
+
+# ---------------- Helpers for migration steps ----------------
+
+def create_index(cur, name: str, table: str, columns: str, where: Optional[str] = None, unique: bool = False, concurrently: bool = True) -> None:
+    """
+    CREATE INDEX IF NOT EXISTS, optionally CONCURRENTLY (autocommit steps only).
+    A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS
+    would keep forever, so such leftovers are dropped and rebuilt.
+    """
+    cur.execute(
+        'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = %s',
+        (name,),
+    )
+    row = cur.fetchone()
+    if row and not row["indisvalid"]:
+        drop_index(cur, name, concurrently=concurrently)
+    cur.execute(
+        f'CREATE {"UNIQUE " if unique else ""}INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS "{name}" '
+        f'ON "{table}" ({columns}){f" WHERE {where}" if where else ""}'
+    )
+
+
+def drop_index(cur, name: str, concurrently: bool = True) -> None:
+    cur.execute(f'DROP INDEX {"CONCURRENTLY " if concurrently else ""}IF EXISTS "{name}"')
@@ -0,0 +1,26 @@
+import sys
+
+from migrations import downgrade, status, upgrade
+from migrations.check import check_hot_queries
+
+
+def main(argv: list[str]) -> int:
+    command = argv[0] if argv else "status"
+    if command == "status":
+        for row in status():
+            print(f"{row['version']:04d}  {'applied' if row['applied'] else 'pending':8} {row['name']}")
+    elif command == "upgrade":
+        upgrade(int(argv[1]) if len(argv) > 1 else None)
+        print("Database is up to date.")
+    elif command == "downgrade" and len(argv) > 1:
+        downgrade(int(argv[1]))
+    elif command == "check":
+        return 0 if check_hot_queries() else 1
+    else:
+        print(__import__("migrations").__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
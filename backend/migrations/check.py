@@ -0,0 +1,127 @@
+"""
+Report hot queries that cannot be answered with an index.
+
+Each query is planned with sequential scans disabled. If the plan still
+contains a Seq Scan on the queried table, no index matches its predicate.
+Parameters are placeholders; only the plan shape matters.
+"""
+from __future__ import annotations
+import json
+from datetime import datetime, time
+
+from db import get_conn
+
+# (label, table that must be index-scanned, sql, params) mirroring the queries in db.py
+HOT_QUERIES = [
+    (
+        "fetch_calendar_events_range",
+        "CalendarEvent",
+        'SELECT * FROM "CalendarEvent" WHERE user_id = %s AND start_datetime >= %s AND start_datetime < %s AND type = %s',
+        (1, datetime(2025, 1, 1), datetime(2025, 2, 1), "supplement"),
+    ),
+    (
+        "fetch_calendar_events_range (series)",
+        "CalendarEvent",
+        'SELECT * FROM "CalendarEvent" WHERE user_id = %s AND rrule IS NOT NULL AND start_datetime < %s',
+        (1, datetime(2025, 2, 1)),
+    ),
+    (
+        "fetch_calendar_events_range (overrides)",
+        "CalendarEventOverride",
+        'SELECT * FROM "CalendarEventOverride" WHERE event_id = ANY(%s) AND occurrence_date >= %s AND occurrence_date < %s',
+        ([1, 2], datetime(2025, 1, 1).date(), datetime(2025, 2, 1).date()),
+    ),
+    (
+        "upsert_calendar_event (conflict target)",
+        "CalendarEvent",
+        'SELECT id FROM "CalendarEvent" WHERE user_id = %s AND type = %s AND linked_supplement_id = %s AND start_datetime = %s',
+        (1, "supplement", 1, datetime(2025, 1, 1, 9)),
+    ),
+    (
+        "fetch_notifications_due",
+        "Notification",
+        'SELECT * FROM "Notification" WHERE notify_time <= %s AND is_sent = false '
+        'AND (retry_at IS NULL OR retry_at <= %s) ORDER BY notify_time, id LIMIT %s',
+        (datetime(2025, 1, 1), datetime(2025, 1, 1), 500),
+    ),
+    (
+        "fetch_pending_notifications",
+        "Notification",
+        'SELECT id FROM "Notification" WHERE notify_time < %s AND is_sent = false AND (retry_at IS NULL OR retry_at < %s)',
+        (datetime(2025, 1, 1), datetime(2025, 1, 1)),
+    ),
+    (
+        "delete_calendar_event (notifications)",
+        "Notification",
+        'SELECT id FROM "Notification" WHERE event_id = %s',
+        (1,),
+    ),
+    (
+        "fetch_user_settings",
+        "UserSetting",
+        'SELECT * FROM "UserSetting" WHERE user_id = %s ORDER BY default_notify_time',
+        (1,),
+    ),
+    (
+        "delete_user_setting_time",
+        "UserSetting",
+        'SELECT * FROM "UserSetting" WHERE user_id = %s AND default_notify_time = %s',
+        (1, time(9)),
+    ),
+    (
+        "fetch_doctors_notes",
+        "DoctorsNote",
+        'SELECT * FROM "DoctorsNote" WHERE user_id = %s ORDER BY visit_date DESC, created_at DESC',
+        (1,),
+    ),
+    ("fetch_user_by_email", "User", 'SELECT * FROM "User" WHERE email = %s LIMIT 1', ("a@b.c",)),
+    (
+        "fetch_user_by_social",
+        "User",
+        'SELECT * FROM "User" WHERE provider = %s AND social_id = %s LIMIT 1',
+        ("kakao", "1"),
+    ),
+    ("fetch_pregnancy_info", "PregnancyInfo", 'SELECT * FROM "PregnancyInfo" WHERE user_id = %s LIMIT 1', (1,)),
+    ("fetch_period_info", "PeriodInfo", 'SELECT * FROM "PeriodInfo" WHERE user_id = %s LIMIT 1', (1,)),
+    ("fetch_user_profile", "UserProfile", 'SELECT * FROM "UserProfile" WHERE user_id = %s', (1,)),
+    ("fetch_custom_supplements", "CustomSupplement", 'SELECT * FROM "CustomSupplement" WHERE user_id = %s', (1,)),
+    ("fetch_user_supplements", "UserSupplement", 'SELECT * FROM "UserSupplement" WHERE user_id = %s', (1,)),
+    (
+        "fetch_supplement_user_batch",
+        "UserSupplement",
+        'SELECT DISTINCT user_id FROM "UserSupplement" WHERE user_id > %s ORDER BY user_id LIMIT %s',
+        (0, 5000),
+    ),
+    (
+        "materialize_supplement_events (schedule batch)",
+        "UserSupplement",
+        'SELECT * FROM "UserSupplement" WHERE user_id BETWEEN %s AND %s',
+        (1, 2),
+    ),
+]
+
+
+def _seq_scanned(plan: dict) -> set[str]:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan":
+        found.add(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found |= _seq_scanned(child)
+    return found
+
+
+def check_hot_queries() -> bool:
+    ok = True
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for label, table, sql, params in HOT_QUERIES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            indexed = table not in _seq_scanned(plan[0]["Plan"])
+            ok = ok and indexed
+            print(f"{'OK ' if indexed else 'SEQ'}  {label}")
+        conn.rollback()
+    return ok
@@ -0,0 +1,32 @@
+"""Tables and columns that init_db.py used to create by hand."""
+from migrations import IrreversibleMigration
+
+
+def up(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "PregnancyInfo" (
+            "user_id" BIGINT PRIMARY KEY,
+            "pregnancy_start" DATE NULL,
+            "due_date" DATE NULL,
+            "ovulation_week_start" DATE NULL,
+            "created_at" TIMESTAMP DEFAULT NOW(),
+            "updated_at" TIMESTAMP DEFAULT NOW()
+        );
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "DoctorsNote" (
+            "id" BIGINT PRIMARY KEY,
+            "user_id" BIGINT NOT NULL,
+            "content" TEXT NOT NULL,
+            "visit_date" DATE NULL,
+            "created_at" TIMESTAMP DEFAULT NOW(),
+            "updated_at" TIMESTAMP DEFAULT NOW()
+        );
+    ''')
+    cur.execute('ALTER TABLE "User" ADD COLUMN IF NOT EXISTS "is_pregnant" BOOLEAN DEFAULT FALSE;')
+    cur.execute('ALTER TABLE "User" ADD COLUMN IF NOT EXISTS "gender" VARCHAR(10);')
+
+
+def down(cur):
+    # These tables predate versioning and hold user data
+    raise IrreversibleMigration("The baseline schema cannot be reverted.")
@@ -0,0 +1,11 @@
+"""CustomSupplement.is_active, formerly add_active_column.py."""
+
+
+def up(cur):
+    cur.execute('ALTER TABLE "CustomSupplement" ADD COLUMN IF NOT EXISTS "is_active" BOOLEAN DEFAULT FALSE;')
+    # Rows that existed before the column stay visible in the active list
+    cur.execute('UPDATE "CustomSupplement" SET is_active = TRUE WHERE is_active IS NULL;')
+
+
+def down(cur):
+    cur.execute('ALTER TABLE "CustomSupplement" DROP COLUMN IF EXISTS "is_active";')
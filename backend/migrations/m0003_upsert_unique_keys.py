@@ -0,0 +1,61 @@
+"""Unique indexes behind the ON CONFLICT upserts in db.py."""
+from migrations import create_index, drop_index
+
+TRANSACTIONAL = False
+
+# (index name, table, key columns, partial predicate, whether duplicates may be pruned)
+UNIQUE_INDEXES = [
+    ("uq_pregnancyinfo_user", "PregnancyInfo", ["user_id"], None, True),
+    ("uq_periodinfo_user", "PeriodInfo", ["user_id"], None, True),
+    ("uq_userprofile_user", "UserProfile", ["user_id"], None, True),
+    ("uq_notification_event_time", "Notification", ["event_id", "notify_time"], None, True),
+    ("uq_usersetting_user_time", "UserSetting", ["user_id", "default_notify_time"], None, True),
+    (
+        "uq_calendarevent_supplement_slot",
+        "CalendarEvent",
+        ["user_id", "type", "linked_supplement_id", "start_datetime"],
+        "linked_supplement_id IS NOT NULL",
+        True,
+    ),
+    # Duplicate users are never deleted automatically; they have to be merged by hand
+    ("uq_user_provider_social", "User", ["provider", "social_id"], "social_id IS NOT NULL", False),
+]
+
+
+def _prune_duplicates(cur, table, keys, where):
+    """Keep the physically newest row of each duplicate key and delete the rest."""
+    predicate = f"WHERE {where}" if where else ""
+    dupes = (
+        f'SELECT ctid FROM (SELECT ctid, row_number() OVER (PARTITION BY {keys} ORDER BY ctid DESC) AS rn '
+        f'FROM "{table}" {predicate}) t WHERE rn > 1'
+    )
+    if table == "CalendarEvent":
+        # Notifications hang off the event rows that are about to go away
+        cur.execute(
+            f'DELETE FROM "Notification" WHERE event_id IN (SELECT id FROM "CalendarEvent" WHERE ctid IN ({dupes}))'
+        )
+    cur.execute(f'DELETE FROM "{table}" WHERE ctid IN ({dupes})')
+    return cur.rowcount
+
+
+def _count_duplicates(cur, table, keys, where):
+    predicate = f"WHERE {where}" if where else ""
+    cur.execute(f'SELECT count(*) AS n FROM (SELECT 1 FROM "{table}" {predicate} GROUP BY {keys} HAVING count(*) > 1) t')
+    return cur.fetchone()["n"]
+
+
+def up(cur):
+    for name, table, columns, where, prunable in UNIQUE_INDEXES:
+        keys = ", ".join(f'"{c}"' for c in columns)
+        if prunable:
+            removed = _prune_duplicates(cur, table, keys, where)
+            if removed:
+                print(f"  {table}: removed {removed} duplicate rows")
+        elif _count_duplicates(cur, table, keys, where):
+            raise RuntimeError(f'"{table}" has duplicate ({keys}) rows; merge them before migrating.')
+        create_index(cur, name, table, keys, where=where, unique=True)
+
+
+def down(cur):
+    for name, *_ in reversed(UNIQUE_INDEXES):
+        drop_index(cur, name)
@@ -0,0 +1,32 @@
+"""
+Indexes for the predicates db.py filters on per request or per scheduler tick.
+The supplement-slot and UserSetting lookups are already served by the unique
+indexes from 0003.
+"""
+from migrations import create_index, drop_index
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    # fetch_calendar_events_range: user_id = ? AND start_datetime in [a, b) [AND type = ?]
+    ("ix_calendarevent_user_start_type", "CalendarEvent", '"user_id", "start_datetime", "type"', None),
+    # fetch_notifications_due: notify_time <= now AND is_sent = false
+    ("ix_notification_pending_time", "Notification", '"notify_time"', "is_sent = false"),
+    # fetch_doctors_notes: user_id = ? ORDER BY visit_date DESC, created_at DESC
+    ("ix_doctorsnote_user_visit", "DoctorsNote", '"user_id", "visit_date" DESC, "created_at" DESC', None),
+    # fetch_user_by_email on every email/social login
+    ("ix_user_email", "User", '"email"', None),
+    # fetch_custom_supplements / fetch_user_supplements and their deletes
+    ("ix_customsupplement_user", "CustomSupplement", '"user_id"', None),
+    ("ix_usersupplement_user_supplement", "UserSupplement", '"user_id", "supplement_id"', None),
+]
+
+
+def up(cur):
+    for name, table, columns, where in INDEXES:
+        create_index(cur, name, table, columns, where=where)
+
+
+def down(cur):
+    for name, *_ in reversed(INDEXES):
+        drop_index(cur, name)
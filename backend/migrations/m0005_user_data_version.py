@@ -0,0 +1,63 @@
+"""
+Per-user data version for calendar ETags.
+
+Statement-level triggers on the tables the calendar reads bump
+"UserDataVersion" once per affected user per statement, so every write path
+(API, background jobs, manual SQL) is covered. Supplement CalendarEvent rows
+are derived from "UserSupplement" and are not shown by the calendar, so the
+materialization jobs that insert them do not bump versions.
+"""
+
+TABLES = ["CalendarEvent", "UserSupplement", "PeriodInfo", "PregnancyInfo"]
+
+_BUMP = '''
+    INSERT INTO "UserDataVersion" (user_id, version, updated_at)
+    SELECT DISTINCT r.user_id, 1, now() FROM {rows} r
+    WHERE r.user_id IS NOT NULL
+      AND (TG_TABLE_NAME <> 'CalendarEvent' OR (to_jsonb(r) ->> 'type') IS DISTINCT FROM 'supplement')
+    ON CONFLICT (user_id) DO UPDATE
+    SET version = "UserDataVersion".version + 1, updated_at = now();
+'''
+
+
+def up(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "UserDataVersion" (
+            "user_id" BIGINT PRIMARY KEY,
+            "version" BIGINT NOT NULL DEFAULT 1,
+            "updated_at" TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    ''')
+    for rows in ("new_rows", "old_rows"):
+        cur.execute(f'''
+            CREATE OR REPLACE FUNCTION bump_user_data_version_{rows}() RETURNS trigger AS $$
+            BEGIN
+                {_BUMP.format(rows=rows)}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        ''')
+    for table in TABLES:
+        slug = table.lower()
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_ins" AFTER INSERT ON "{table}"
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+        ''')
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_upd" AFTER UPDATE ON "{table}"
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+        ''')
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_del" AFTER DELETE ON "{table}"
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_old_rows();
+        ''')
+
+
+def down(cur):
+    for table in TABLES:
+        slug = table.lower()
+        for suffix in ("ins", "upd", "del"):
+            cur.execute(f'DROP TRIGGER IF EXISTS "trg_{slug}_version_{suffix}" ON "{table}"')
+    cur.execute('DROP FUNCTION IF EXISTS bump_user_data_version_new_rows()')
+    cur.execute('DROP FUNCTION IF EXISTS bump_user_data_version_old_rows()')
+    cur.execute('DROP TABLE IF EXISTS "UserDataVersion"')
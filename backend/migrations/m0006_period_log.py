@@ -0,0 +1,54 @@
+"""
+"PeriodLog" history and precomputed "PeriodProjection" rows for the cycle
+prediction engine (period_prediction.py). Existing PeriodInfo dates seed the log.
+"""
+
+def up(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "PeriodLog" (
+            "id" BIGSERIAL PRIMARY KEY,
+            "user_id" BIGINT NOT NULL,
+            "start_date" DATE NOT NULL,
+            "end_date" DATE NULL,
+            "created_at" TIMESTAMP DEFAULT NOW(),
+            UNIQUE ("user_id", "start_date")
+        );
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "PeriodProjection" (
+            "user_id" BIGINT PRIMARY KEY,
+            "cycle_length" REAL NOT NULL,
+            "cycle_stddev" REAL NOT NULL,
+            "period_length" REAL NOT NULL,
+            -- Logged starts followed by predicted ones, ascending
+            "cycle_starts" DATE[] NOT NULL,
+            "computed_at" TIMESTAMPTZ DEFAULT NOW()
+        );
+    ''')
+    cur.execute('''
+        INSERT INTO "PeriodLog" (user_id, start_date)
+        SELECT user_id, d
+        FROM "PeriodInfo", LATERAL (VALUES (last_period), (period_start)) v(d)
+        WHERE d IS NOT NULL
+        ON CONFLICT (user_id, start_date) DO NOTHING
+    ''')
+    # Calendar ETags must change when the period layer's inputs change (see 0005)
+    for table in ("PeriodLog", "PeriodProjection"):
+        slug = table.lower()
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_ins" AFTER INSERT ON "{table}"
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+        ''')
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_upd" AFTER UPDATE ON "{table}"
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+        ''')
+        cur.execute(f'''
+            CREATE TRIGGER "trg_{slug}_version_del" AFTER DELETE ON "{table}"
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_old_rows();
+        ''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS "PeriodProjection"')
+    cur.execute('DROP TABLE IF EXISTS "PeriodLog"')
@@ -0,0 +1,53 @@
+"""
+Repeating CalendarEvent series stored once, with sparse per-occurrence overrides.
+
+A series row keeps its first occurrence in start_datetime, the RRULE text in
+"rrule", the same rule as a recurrence.parse_cycle string in repeat_cycle (for
+the SQL calendar engine) and the start of its final occurrence in
+"series_until" (NULL repeats forever). "CalendarEventOverride" holds only the
+occurrences that were moved, renamed or cancelled.
+"""
+from migrations import create_index
+
+
+def up(cur):
+    cur.execute('ALTER TABLE "CalendarEvent" ADD COLUMN IF NOT EXISTS "rrule" TEXT NULL;')
+    cur.execute('ALTER TABLE "CalendarEvent" ADD COLUMN IF NOT EXISTS "series_until" TIMESTAMP NULL;')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "CalendarEventOverride" (
+            "event_id" BIGINT NOT NULL,
+            "user_id" BIGINT NOT NULL,
+            -- The occurrence's date under the rule, whatever it was moved to
+            "occurrence_date" DATE NOT NULL,
+            "cancelled" BOOLEAN NOT NULL DEFAULT FALSE,
+            "title" VARCHAR(255) NULL,
+            "start_datetime" TIMESTAMP NULL,
+            "updated_at" TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY ("event_id", "occurrence_date")
+        );
+    ''')
+    # The series index on the (large) CalendarEvent table is built concurrently by 0014
+    # Occurrences moved into a window from a date outside it
+    create_index(cur, "ix_calendareventoverride_user_start", "CalendarEventOverride", '"user_id", "start_datetime"',
+                 where='start_datetime IS NOT NULL', concurrently=False)
+    # Overrides change what the calendar shows (see 0005)
+    cur.execute('''
+        CREATE TRIGGER "trg_calendareventoverride_version_ins" AFTER INSERT ON "CalendarEventOverride"
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+    ''')
+    cur.execute('''
+        CREATE TRIGGER "trg_calendareventoverride_version_upd" AFTER UPDATE ON "CalendarEventOverride"
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_new_rows();
+    ''')
+    cur.execute('''
+        CREATE TRIGGER "trg_calendareventoverride_version_del" AFTER DELETE ON "CalendarEventOverride"
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version_old_rows();
+    ''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS "CalendarEventOverride"')
+    # Series collapse to their first occurrence
+    cur.execute('''UPDATE "CalendarEvent" SET repeat_cycle = 'none' WHERE rrule IS NOT NULL;''')
+    cur.execute('ALTER TABLE "CalendarEvent" DROP COLUMN IF EXISTS "series_until";')
+    cur.execute('ALTER TABLE "CalendarEvent" DROP COLUMN IF EXISTS "rrule";')
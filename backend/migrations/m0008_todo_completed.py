@@ -0,0 +1,15 @@
+"""
+Todo completion. One-off todos keep it on their CalendarEvent row; occurrences of
+a repeating todo keep it on their CalendarEventOverride row (0007), so completing
+an occurrence is one more sparse override.
+"""
+
+
+def up(cur):
+    cur.execute('ALTER TABLE "CalendarEvent" ADD COLUMN IF NOT EXISTS "completed" BOOLEAN NOT NULL DEFAULT FALSE;')
+    cur.execute('ALTER TABLE "CalendarEventOverride" ADD COLUMN IF NOT EXISTS "completed" BOOLEAN NOT NULL DEFAULT FALSE;')
+
+
+def down(cur):
+    cur.execute('ALTER TABLE "CalendarEventOverride" DROP COLUMN IF EXISTS "completed";')
+    cur.execute('ALTER TABLE "CalendarEvent" DROP COLUMN IF EXISTS "completed";')
@@ -0,0 +1,15 @@
+"""Secret per-user tokens for the iCalendar subscription feed (GET /calendar/{token}.ics)."""
+
+
+def up(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "CalendarFeed" (
+            "user_id" BIGINT PRIMARY KEY,
+            "token" VARCHAR(64) NOT NULL UNIQUE,
+            "created_at" TIMESTAMP DEFAULT NOW()
+        );
+    ''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS "CalendarFeed"')
@@ -0,0 +1,15 @@
+"""
+Retry bookkeeping for the notification dispatcher (services/notification_service.py).
+A reminder the sender could not deliver is pushed back to "retry_at" with a growing
+delay instead of being re-claimed first on every pass.
+"""
+
+
+def up(cur):
+    cur.execute('ALTER TABLE "Notification" ADD COLUMN IF NOT EXISTS "attempts" INTEGER NOT NULL DEFAULT 0;')
+    cur.execute('ALTER TABLE "Notification" ADD COLUMN IF NOT EXISTS "retry_at" TIMESTAMP NULL;')
+
+
+def down(cur):
+    cur.execute('ALTER TABLE "Notification" DROP COLUMN IF EXISTS "retry_at";')
+    cur.execute('ALTER TABLE "Notification" DROP COLUMN IF EXISTS "attempts";')
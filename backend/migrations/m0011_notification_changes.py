@@ -0,0 +1,50 @@
+"""
+LISTEN/NOTIFY feed of reminder changes for the in-memory scheduler
+(services/notification_service.py).
+
+Statement-level triggers on "Notification" send the ids of the unsent rows a
+statement inserted, updated or deleted on channel "reminder_changes", at most
+500 ids per message (payloads are capped at 8000 bytes). Only rows due within
+NOTIFY_HORIZON are sent: the scheduler holds less than that in memory and
+picks up later rows when its window reaches them. Rows marked sent are left
+out; a scheduler re-checks is_sent when it claims anyway. Notifications are
+delivered on commit, so rolled-back writes are never seen.
+"""
+
+CHANNEL = "reminder_changes"
+NOTIFY_HORIZON = "1 hour"
+
+
+def up(cur):
+    cur.execute(f'''
+        CREATE OR REPLACE FUNCTION notify_reminder_changes() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', string_agg(id::text, ','))
+            FROM (
+                SELECT id, (row_number() OVER () - 1) / 500 AS chunk
+                FROM changed_rows
+                WHERE NOT is_sent AND notify_time < now() + interval '{NOTIFY_HORIZON}'
+            ) c
+            GROUP BY chunk;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+    cur.execute('''
+        CREATE TRIGGER "trg_notification_changes_ins" AFTER INSERT ON "Notification"
+        REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_reminder_changes();
+    ''')
+    cur.execute('''
+        CREATE TRIGGER "trg_notification_changes_upd" AFTER UPDATE ON "Notification"
+        REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_reminder_changes();
+    ''')
+    cur.execute('''
+        CREATE TRIGGER "trg_notification_changes_del" AFTER DELETE ON "Notification"
+        REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_reminder_changes();
+    ''')
+
+
+def down(cur):
+    for suffix in ("ins", "upd", "del"):
+        cur.execute(f'DROP TRIGGER IF EXISTS "trg_notification_changes_{suffix}" ON "Notification"')
+    cur.execute('DROP FUNCTION IF EXISTS notify_reminder_changes()')
@@ -0,0 +1,19 @@
+"""
+How far each incremental batch job has got. The nightly supplement reminder job
+(services/materialize_service.py) records the day its horizon reaches, so the next
+run only generates the days after it instead of the whole window again.
+"""
+
+
+def up(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS "JobWatermark" (
+            "job" TEXT PRIMARY KEY,
+            "done_until" DATE NOT NULL,
+            "updated_at" TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    ''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS "JobWatermark"')
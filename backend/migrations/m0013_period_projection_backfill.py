@@ -0,0 +1,43 @@
+"""
+"PeriodProjection" rows for users whose PeriodLog was seeded by 0006. Both
+calendar engines and the ICS feed read only projections, so without this the
+period phases of existing users stay empty until services/period_service.py
+runs. Users who already have a projection are left alone.
+"""
+from psycopg2.extras import execute_values
+
+import period_prediction
+
+BATCH_USERS = 5000
+
+
+def up(cur):
+    after = 0
+    while True:
+        cur.execute('''
+            SELECT l.user_id, array_agg(l.start_date ORDER BY l.start_date) AS starts,
+                   array_agg(l.end_date ORDER BY l.start_date) AS ends
+            FROM "PeriodLog" l
+            WHERE l.user_id > %s AND NOT EXISTS (SELECT 1 FROM "PeriodProjection" p WHERE p.user_id = l.user_id)
+            GROUP BY l.user_id ORDER BY l.user_id LIMIT %s
+        ''', (after, BATCH_USERS))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        estimates = period_prediction.estimate_batch(
+            [r["user_id"] for r in rows], [r["starts"] for r in rows], [r["ends"] for r in rows]
+        )
+        execute_values(
+            cur,
+            'INSERT INTO "PeriodProjection" (user_id, cycle_length, cycle_stddev, period_length, cycle_starts, computed_at) '
+            'VALUES %s ON CONFLICT (user_id) DO NOTHING',
+            [(e.user_id, e.cycle_length, e.cycle_stddev, e.period_length, e.cycle_starts) for e in estimates],
+            template='(%s, %s, %s, %s, %s::date[], NOW())',
+            page_size=1000,
+        )
+        after = rows[-1]["user_id"]
+
+
+def down(cur):
+    # Projections are derived data; period_service.refresh_all rebuilds them either way
+    pass
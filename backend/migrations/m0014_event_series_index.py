@@ -0,0 +1,18 @@
+"""
+Index for the repeating series of 0007. CalendarEvent is the largest table and
+takes writes all day, so it is built CONCURRENTLY instead of inside 0007's
+transaction, which would block every insert and update until it finished.
+"""
+from migrations import create_index, drop_index
+
+TRANSACTIONAL = False
+
+
+def up(cur):
+    # fetch_calendar_events_range: series of a user that started before the window ends
+    create_index(cur, "ix_calendarevent_user_series", "CalendarEvent", '"user_id", "start_datetime"',
+                 where='rrule IS NOT NULL')
+
+
+def down(cur):
+    drop_index(cur, "ix_calendarevent_user_series")
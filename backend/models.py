@@ -52,11 +52,35 @@ class Todo(BaseModel):
     text: str
     date: str
     completed: bool = False
+    # Set for occurrences of a repeating todo: the date the rule puts it on (YYYY-MM-DD)
+    occurrenceDate: Optional[str] = None
 
 
 class TodoCreate(BaseModel):
     text: str
     date: str
+    # Repeat rule, e.g. "FREQ=WEEKLY;INTERVAL=2;COUNT=10" (see recurrence.parse_rrule)
+    rrule: Optional[str] = None
+
+
+class OccurrenceUpdate(BaseModel):
+    text: Optional[str] = None
+    date: Optional[str] = None  # move to YYYY-MM-DD
+    cancelled: bool = False
+
+
+class TodoCompletion(BaseModel):
+    id: int
+    # Required for an occurrence of a repeating todo (Todo.occurrenceDate)
+    occurrenceDate: Optional[date] = None
+    completed: bool = True
+
+
+class TodoBatch(BaseModel):
+    # Bounded so one batch stays one short transaction
+    create: List[TodoCreate] = Field(default_factory=list, max_length=500)
+    delete: List[int] = Field(default_factory=list, max_length=500)
+    complete: List[TodoCompletion] = Field(default_factory=list, max_length=500)
 
 
 class UserSetting(BaseModel):
@@ -156,6 +180,11 @@ class DoctorsNoteCreate(BaseModel):
     visit_date: Optional[date] = None
 
 
+class PeriodLogCreate(BaseModel):
+    start_date: date
+    end_date: Optional[date] = None
+
+
 class Tip(BaseModel):
     id: int
     content: str
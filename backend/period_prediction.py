@@ -0,0 +1,161 @@
+from __future__ import annotations
+import os
+import warnings
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CYCLE_DAYS = 28.0
+DEFAULT_PERIOD_DAYS = 5.0
+# Gaps outside this range are missed logs or typos, not cycles
+MIN_CYCLE_DAYS = 15
+MAX_CYCLE_DAYS = 60
+# Only the most recent cycles describe the current pattern
+RECENT_CYCLES = 12
+PROJECTION_YEARS = int(os.getenv("PERIOD_PROJECTION_YEARS", "3"))
+
+PHASES = ("menstruation", "follicular", "ovulation", "luteal")
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+@dataclass
+class CycleEstimate:
+    user_id: int
+    cycle_length: float
+    cycle_stddev: float
+    period_length: float
+    # Logged starts followed by predicted ones, ascending
+    cycle_starts: List[date]
+
+
+def _to_days(values: Sequence[Optional[date]]) -> np.ndarray:
+    return np.array([np.nan if v is None else (v - date(1970, 1, 1)).days for v in values], dtype=float)
+
+
+def _padded(rows: Sequence[Sequence[Optional[date]]], width: int) -> np.ndarray:
+    out = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        days = _to_days(row[-width:])
+        out[i, width - len(days):] = days
+    return out
+
+
+def estimate_batch(
+    user_ids: Sequence[int],
+    starts: Sequence[Sequence[date]],
+    ends: Sequence[Sequence[Optional[date]]],
+    years: int = PROJECTION_YEARS,
+    today: Optional[date] = None,
+) -> List[CycleEstimate]:
+    """
+    Estimate cycle length, its spread and period length for many users at once
+    and project their cycle starts until `years` after `today` (or after the last
+    logged start, if that is later). `starts[i]` must be ascending
+    and `ends[i]` aligned with it. Users without any start are skipped.
+    All per-user work is done on padded (users x cycles) arrays.
+    """
+    keep = [i for i, row in enumerate(starts) if row]
+    if not keep:
+        return []
+    width = RECENT_CYCLES + 1
+    start_days = _padded([starts[i] for i in keep], width)
+    end_days = _padded([ends[i] for i in keep], width)
+
+    gaps = np.diff(start_days, axis=1)
+    gaps[(gaps < MIN_CYCLE_DAYS) | (gaps > MAX_CYCLE_DAYS)] = np.nan
+    has_gaps = ~np.all(np.isnan(gaps), axis=1)
+    with warnings.catch_warnings():
+        # nanmean/nanstd warn on all-NaN rows; those rows take the defaults
+        warnings.simplefilter("ignore", RuntimeWarning)
+        cycle = np.where(has_gaps, np.nanmean(gaps, axis=1), DEFAULT_CYCLE_DAYS)
+        stddev = np.where(np.sum(~np.isnan(gaps), axis=1) > 1, np.nanstd(gaps, axis=1), 0.0)
+        lengths = end_days - start_days + 1
+        lengths[(lengths < 1) | (lengths > 14)] = np.nan
+        period = np.where(np.all(np.isnan(lengths), axis=1), DEFAULT_PERIOD_DAYS, np.nanmean(lengths, axis=1))
+
+    # Projection: anchor on the last logged start, step by the user's mean cycle. The horizon
+    # counts from today, so users whose last log is old still get `years` of future cycles.
+    anchors = start_days[:, -1]
+    today_days = float(((today or date.today()) - date(1970, 1, 1)).days)
+    horizon = np.maximum(anchors, today_days) + years * 365
+    steps = int(np.ceil(np.max(horizon - anchors) / MIN_CYCLE_DAYS))
+    k = np.arange(1, steps + 1)
+    projected = anchors[:, None] + np.round(k[None, :] * cycle[:, None])
+
+    estimates = []
+    for row, i in enumerate(keep):
+        future = projected[row][projected[row] <= horizon[row]].astype(int)
+        predicted = (_EPOCH + future).astype(object).tolist()
+        estimates.append(CycleEstimate(
+            user_id=user_ids[i],
+            cycle_length=round(float(cycle[row]), 2),
+            cycle_stddev=round(float(stddev[row]), 2),
+            period_length=round(float(period[row]), 2),
+            cycle_starts=list(starts[i]) + predicted,
+        ))
+    return estimates
+
+
+def _round(value: float) -> int:
+    # Half away from zero, like SQL round(), so db.fetch_calendar_days agrees with this module
+    return int(np.floor(value + 0.5))
+
+
+def phase_codes(days: np.ndarray, cycle_starts: np.ndarray, cycle_length: float, period_length: float) -> np.ndarray:
+    """
+    Phase index into PHASES for each day (datetime64[D] arrays), -1 before the
+    first start or after the last projected cycle. Phase bounds scale with the
+    cycle: ovulation is counted back 14 days from the next start, as in the
+    fixed 28-day split of utils.calculate_period_phase (5 / 14 / 21).
+    """
+    idx = np.searchsorted(cycle_starts, days, side="right") - 1
+    valid = idx >= 0
+    offset = (days - cycle_starts[np.clip(idx, 0, None)]).astype(int)
+    cycle, period = _round(cycle_length), _round(period_length)
+    ovulation = max(cycle - 14, period)
+    codes = np.select(
+        [offset < period, offset < ovulation, offset < ovulation + 7],
+        [0, 1, 2],
+        default=3,
+    )
+    # Between two starts every day belongs to the earlier cycle; after the last one, one cycle only
+    valid &= (idx < len(cycle_starts) - 1) | (offset < max(cycle, 1))
+    return np.where(valid, codes, -1)
+
+
+def phases_for_window(
+    cycle_starts: Sequence[date], cycle_length: float, period_length: float, window_start: date, window_end: date
+) -> Dict[date, str]:
+    """{day: phase} for the days in [window_start, window_end) covered by the projection."""
+    if not cycle_starts or window_end <= window_start:
+        return {}
+    days = np.arange(np.datetime64(window_start, "D"), np.datetime64(window_end, "D"))
+    starts = np.array(cycle_starts, dtype="datetime64[D]")
+    codes = phase_codes(days, starts, cycle_length, period_length)
+    return {
+        window_start + timedelta(days=i): PHASES[code]
+        for i, code in enumerate(codes.tolist())
+        if code >= 0
+    }
+
+
+def phase_spans(cycle_starts: Sequence[date], cycle_length: float, period_length: float) -> List[tuple]:
+    """
+    The same phases as phase_codes() as (phase, first_day, end_day) spans,
+    end exclusive, in order. Each cycle runs to the next start; the last one
+    runs one cycle length.
+    """
+    cycle, period = _round(cycle_length), _round(period_length)
+    ovulation = max(cycle - 14, period)
+    bounds = ((PHASES[0], 0, period), (PHASES[1], period, ovulation), (PHASES[2], ovulation, ovulation + 7))
+    spans = []
+    for i, start in enumerate(cycle_starts):
+        cycle_end = cycle_starts[i + 1] if i + 1 < len(cycle_starts) else start + timedelta(days=max(cycle, 1))
+        for phase, lo, hi in bounds + ((PHASES[3], ovulation + 7, None),):
+            first = start + timedelta(days=lo)
+            end = cycle_end if hi is None else min(start + timedelta(days=hi), cycle_end)
+            if first < end:
+                spans.append((phase, first, end))
+    return spans
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import logging
+import os
+import re
+import sys
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger("db.slow_query")
+
+# Statements slower than this (milliseconds) are logged and kept for EXPLAIN
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_SLOW_QUERY_KEEP = int(os.getenv("DB_SLOW_QUERY_KEEP", "100"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?\s*,\s*)+\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Frames from these files are plumbing, not the code that issued the query
+_SKIP_FILES = (__file__, "psycopg2", "psycopg", "contextlib")
+
+# Values EXPLAIN (GENERIC_PLAN) can do without: driver placeholders, string literals and
+# bare numbers. Literals after a type name (TIME '09:00') are part of the statement and kept.
+_TYPED_LITERAL = r"\b(?:time|date|timestamp|interval)\s+'(?:[^']|'')*'"
+_VALUE = re.compile(
+    rf"({_TYPED_LITERAL})|'(?:[^']|'')*'|(?<![\w.$])\d+(?:\.\d+)?(?![\w.])|%\(\w+\)s|%s",
+    re.IGNORECASE,
+)
+
+
+def fingerprint(sql: str) -> str:
+    """Collapse literals and placeholders so one statement shape maps to one key."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def parameterize(sql: str) -> str:
+    """
+    The statement with every value replaced by $1, $2 ..., for EXPLAIN (GENERIC_PLAN).
+    Slow queries are kept in this form only, so captured SQL never holds user data.
+    """
+    counter = iter(range(1, sys.maxsize))
+    return _VALUE.sub(lambda m: m.group(1) or f"${next(counter)}", sql).replace("%%", "%")
+
+
+def _caller() -> str:
+    # Skip _caller, record() and the instrumented execute() itself
+    frame = sys._getframe(3)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not any(part in filename for part in _SKIP_FILES):
+            module = frame.f_globals.get("__name__", "?")
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+@dataclass
+class RequestQueries:
+    """Totals for the statements issued while serving one HTTP request."""
+    count: int = 0
+    total_ms: float = 0.0
+
+
+@dataclass
+class _Fingerprint:
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    callers: dict[str, int] = field(default_factory=dict)
+
+
+_current_request: ContextVar[Optional[RequestQueries]] = ContextVar("db_request_queries", default=None)
+
+
+class QueryStats:
+    """
+    Process-wide aggregates keyed by statement fingerprint, plus a bounded
+    list of recent slow statements. Fed by the instrumented cursors in
+    db.py and db_async.py.
+    """
+
+    def __init__(self, slow_ms: float, keep: int):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._by_fingerprint: dict[str, _Fingerprint] = {}
+        self._slow: deque[dict] = deque(maxlen=keep)
+        self._slow_seq = 0
+
+    def record(self, sql: Any, duration_ms: float, rowcount: int) -> None:
+        if not isinstance(sql, str):
+            # psycopg sql.Composed and friends; bytes from mogrify
+            sql = sql.decode() if isinstance(sql, bytes) else str(sql)
+        key = fingerprint(sql)
+        caller = _caller()
+        rows = max(rowcount, 0)
+
+        request = _current_request.get()
+        if request is not None:
+            request.count += 1
+            request.total_ms += duration_ms
+
+        with self._lock:
+            entry = self._by_fingerprint.get(key)
+            if entry is None:
+                entry = self._by_fingerprint[key] = _Fingerprint()
+            entry.calls += 1
+            entry.total_ms += duration_ms
+            entry.max_ms = max(entry.max_ms, duration_ms)
+            entry.rows += rows
+            entry.callers[caller] = entry.callers.get(caller, 0) + 1
+            if duration_ms >= self.slow_ms:
+                self._slow_seq += 1
+                # Kept without its values, only so a generic plan can be shown later; not listed
+                self._slow.append({
+                    "id": self._slow_seq,
+                    "fingerprint": key,
+                    "caller": caller,
+                    "duration_ms": round(duration_ms, 2),
+                    "rows": rows,
+                    "sql": parameterize(sql),
+                })
+
+        if duration_ms >= self.slow_ms:
+            logger.warning("slow query %.1f ms in %s: %s", duration_ms, caller, key)
+
+    def snapshot(self, limit: Optional[int] = None) -> list[dict]:
+        with self._lock:
+            rows = [
+                {
+                    "fingerprint": key,
+                    "calls": e.calls,
+                    "total_ms": round(e.total_ms, 2),
+                    "avg_ms": round(e.total_ms / e.calls, 3),
+                    "max_ms": round(e.max_ms, 2),
+                    "rows": e.rows,
+                    "callers": dict(e.callers),
+                }
+                for key, e in self._by_fingerprint.items()
+            ]
+        rows.sort(key=lambda r: r["total_ms"], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def slow_queries(self) -> list[dict]:
+        with self._lock:
+            return [{k: v for k, v in q.items() if k != "sql"} for q in self._slow]
+
+    def slow_query(self, query_id: int) -> Optional[dict]:
+        with self._lock:
+            return next((dict(q) for q in self._slow if q["id"] == query_id), None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_fingerprint.clear()
+            self._slow.clear()
+
+
+query_stats = QueryStats(DB_SLOW_QUERY_MS, DB_SLOW_QUERY_KEEP)
+
+
+def begin_request() -> RequestQueries:
+    """Start counting statements for the current request (see the middleware in main.py)."""
+    request = RequestQueries()
+    _current_request.set(request)
+    return request
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import calendar
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional, Union
+
+DAY = "day"
+WEEK = "week"
+MONTH = "month"
+
+# "3d", "2w", "6m": every N days / weeks / calendar months
+_CUSTOM_CYCLE = re.compile(r"^(\d+)([dwm])$")
+_CUSTOM_UNITS = {"d": DAY, "w": WEEK, "m": MONTH}
+_NAMED_CYCLES = {"daily": (DAY, 1), "weekly": (WEEK, 1), "monthly": (MONTH, 1)}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Repeat every `every` units from the start date; unit None means a single occurrence."""
+    unit: Optional[str]
+    every: int = 1
+
+    @property
+    def step_days(self) -> Optional[int]:
+        if self.unit == DAY:
+            return self.every
+        if self.unit == WEEK:
+            return self.every * 7
+        return None
+
+
+ONCE = Rule(None)
+
+
+def parse_cycle(cycle: Optional[str]) -> Rule:
+    """UserSupplement.cycle -> Rule. Unknown or empty cycles, including "none", occur once."""
+    if not cycle:
+        return ONCE
+    cycle = cycle.strip().lower()
+    if cycle in _NAMED_CYCLES:
+        return Rule(*_NAMED_CYCLES[cycle])
+    match = _CUSTOM_CYCLE.match(cycle)
+    if match and int(match.group(1)) > 0:
+        return Rule(_CUSTOM_UNITS[match.group(2)], int(match.group(1)))
+    return ONCE
+
+
+# RFC 5545 RRULE subset used by repeating CalendarEvent rows: FREQ, INTERVAL, COUNT, UNTIL.
+# YEARLY is every 12 months, so Feb 29 clamps to Feb 28 like monthly schedules do.
+_RRULE_FREQS = {"DAILY": (DAY, 1), "WEEKLY": (WEEK, 1), "MONTHLY": (MONTH, 1), "YEARLY": (MONTH, 12)}
+
+
+@dataclass(frozen=True)
+class Series:
+    """A parsed RRULE: repeat by `rule`, stop after `count` occurrences and/or not after `until`."""
+    rule: Rule
+    count: Optional[int] = None
+    until: Optional[datetime] = None
+
+
+def parse_rrule(text: str) -> Series:
+    """
+    "FREQ=WEEKLY;INTERVAL=2;COUNT=10" -> Series. An optional "RRULE:" prefix is
+    accepted. Raises ValueError for parts outside the subset (BYDAY, ...).
+    """
+    text = text.strip()
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    parts = {}
+    for part in filter(None, text.split(";")):
+        key, sep, value = part.partition("=")
+        if not sep or not value:
+            raise ValueError(f"Malformed RRULE part: {part!r}")
+        parts[key.strip().upper()] = value.strip().upper()
+
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "COUNT", "UNTIL"}
+    if unsupported:
+        raise ValueError(f"Unsupported RRULE parts: {', '.join(sorted(unsupported))}")
+    if parts.get("FREQ") not in _RRULE_FREQS:
+        raise ValueError("RRULE FREQ must be DAILY, WEEKLY, MONTHLY or YEARLY")
+    if "COUNT" in parts and "UNTIL" in parts:
+        # RFC 5545 forbids both
+        raise ValueError("RRULE cannot have both COUNT and UNTIL")
+
+    unit, base = _RRULE_FREQS[parts["FREQ"]]
+    interval = _positive_int(parts.get("INTERVAL", "1"), "INTERVAL")
+    count = _positive_int(parts["COUNT"], "COUNT") if "COUNT" in parts else None
+    until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    return Series(Rule(unit, base * interval), count=count, until=until)
+
+
+def _positive_int(value: str, name: str) -> int:
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f"RRULE {name} must be a positive integer")
+    return int(value)
+
+
+def _parse_until(value: str) -> datetime:
+    # Times are stored naive, so a trailing Z is dropped rather than converted
+    value = value.removesuffix("Z")
+    for fmt in ("%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            until = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # A date-only UNTIL includes the whole day
+        return until if "T" in value else until.replace(hour=23, minute=59, second=59)
+    raise ValueError("RRULE UNTIL must be YYYYMMDD or YYYYMMDDTHHMMSS")
+
+
+def format_rrule(series: Series) -> str:
+    """Series -> canonical RRULE text (without the "RRULE:" prefix)."""
+    rule = series.rule
+    if rule.unit == MONTH and rule.every % 12 == 0:
+        freq, interval = "YEARLY", rule.every // 12
+    else:
+        freq = {DAY: "DAILY", WEEK: "WEEKLY", MONTH: "MONTHLY"}[rule.unit]
+        interval = rule.every
+    parts = [f"FREQ={freq}"]
+    if interval != 1:
+        parts.append(f"INTERVAL={interval}")
+    if series.count is not None:
+        parts.append(f"COUNT={series.count}")
+    if series.until is not None:
+        parts.append(f"UNTIL={series.until:%Y%m%dT%H%M%S}")
+    return ";".join(parts)
+
+
+def cycle_of(rule: Rule) -> str:
+    """Rule -> the cycle string parse_cycle() reads back ("daily", "2w", "12m", "none")."""
+    if rule.unit is None:
+        return "none"
+    for name, value in _NAMED_CYCLES.items():
+        if value == (rule.unit, rule.every):
+            return name
+    suffix = next(s for s, unit in _CUSTOM_UNITS.items() if unit == rule.unit)
+    return f"{rule.every}{suffix}"
+
+
+def add_months(d: date, months: int) -> date:
+    """Same day-of-month `months` later, clamped to the end of shorter months (Jan 31 -> Feb 28)."""
+    index = d.year * 12 + (d.month - 1) + months
+    year, month = divmod(index, 12)
+    month += 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def nth(start: date, rule: Rule, k: int) -> date:
+    """The k-th occurrence (0-based). Always computed from `start`, so month clamping never drifts."""
+    if rule.unit == MONTH:
+        return add_months(start, k * rule.every)
+    return start + timedelta(days=k * (rule.step_days or 0))
+
+
+def _first_index_on_or_after(start: date, rule: Rule, target: date) -> int:
+    if target <= start:
+        return 0
+    if rule.unit == MONTH:
+        months = (target.year - start.year) * 12 + (target.month - start.month)
+        # Clamping can only pull an occurrence earlier, so this lands at most one step short
+        k = months // rule.every
+        return k if nth(start, rule, k) >= target else k + 1
+    step = rule.step_days
+    return -(-(target - start).days // step)
+
+
+def last_occurrence(start: datetime, series: Series) -> Optional[datetime]:
+    """
+    Start of the series' final occurrence, None when it repeats forever.
+    Raises ValueError when UNTIL leaves no occurrence at all.
+    """
+    rule = series.rule
+    bounds = []
+    if series.count is not None:
+        bounds.append(series.count - 1)
+    if series.until is not None:
+        # Last k with nth(k) on or before the UNTIL day, then one back if its time is past UNTIL
+        k = _first_index_on_or_after(start.date(), rule, series.until.date() + timedelta(days=1)) - 1
+        if k >= 0 and datetime.combine(nth(start.date(), rule, k), start.time()) > series.until:
+            k -= 1
+        if k < 0:
+            raise ValueError("RRULE UNTIL is before the first occurrence")
+        bounds.append(k)
+    if not bounds:
+        return None
+    return datetime.combine(nth(start.date(), rule, min(bounds)), start.time())
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def occurrences(
+    start: Union[date, datetime],
+    rule: Union[Rule, str, None],
+    window_start: date,
+    window_end: date,
+    until: Optional[Union[date, datetime]] = None,
+) -> Iterator[date]:
+    """
+    Occurrence dates within [window_start, window_end) and not after `until`
+    (inclusive, e.g. UserSupplement.end_date). Jumps straight to the first
+    in-window occurrence, so the cost is independent of how old `start` is.
+    """
+    if not isinstance(rule, Rule):
+        rule = parse_cycle(rule)
+    start = _as_date(start)
+    last = window_end - timedelta(days=1)
+    if until is not None:
+        last = min(last, _as_date(until))
+    if last < start or last < window_start:
+        return
+
+    if rule.unit is None:
+        if window_start <= start:
+            yield start
+        return
+
+    k = _first_index_on_or_after(start, rule, window_start)
+    current = nth(start, rule, k)
+    while current <= last:
+        yield current
+        k += 1
+        current = nth(start, rule, k)
+
+
+def naive_occurrences(
+    start: date,
+    rule: Union[Rule, str, None],
+    window_start: date,
+    window_end: date,
+    until: Optional[date] = None,
+) -> Iterator[date]:
+    """Step-by-step reference expansion; only used to check occurrences()."""
+    if not isinstance(rule, Rule):
+        rule = parse_cycle(rule)
+    k = 0
+    while True:
+        current = nth(start, rule, k)
+        if current >= window_end or (until is not None and current > until):
+            return
+        if current >= window_start:
+            yield current
+        if rule.unit is None:
+            return
+        k += 1
@@ -1,3 +1,3 @@
-from . import auth, calendar, supplements, users, chatbot
+from . import auth, calendar, supplements, users, chatbot, metrics
 
-__all__ = ["auth", "calendar", "supplements", "users", "chatbot"]
+__all__ = ["auth", "calendar", "supplements", "users", "chatbot", "metrics"]
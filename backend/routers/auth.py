@@ -1,16 +1,16 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from models import AuthSignup, AuthLogin, SocialLogin, GoogleLogin, KakaoLogin, SocialSignup
 import db
-from services import auth_service
+from services import auth_service, materialize_service
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/signup")
-def signup(payload: AuthSignup):
-    if db.fetch_user_by_email(payload.email):
+def signup(payload: AuthSignup, uow: db.UnitOfWork = Depends(db.get_uow)):
+    if db.fetch_user_by_email(payload.email, uow=uow):
         raise HTTPException(status_code=400, detail="이미 가입된 이메일입니다.")
-    user = db.create_user_email(payload.email, payload.password, payload.nickname, payload.pregnant)
+    user = db.create_user_email(payload.email, payload.password, payload.nickname, payload.pregnant, uow=uow)
     if payload.due_date:
         # Convert string to date object if needed, but payload.due_date might be string from Pydantic if not typed as date
         # Pydantic models usually handle date conversion if typed as date.
@@ -18,30 +18,30 @@ def signup(payload: AuthSignup):
         # db.upsert_pregnancy_info expects date objects.
         # AuthSignup model definition? I should check models.py.
         # Assuming payload.due_date is compatible.
-        db.upsert_pregnancy_info(user["id"], due_date=payload.due_date)
+        db.upsert_pregnancy_info(user["id"], due_date=payload.due_date, uow=uow)
     return {"token": auth_service.build_token(user["id"]), "user": user}
 
 @router.post("/login")
-def login(payload: AuthLogin):
-    user = db.fetch_user_by_email(payload.email)
+def login(payload: AuthLogin, uow: db.UnitOfWork = Depends(db.get_uow)):
+    user = db.fetch_user_by_email(payload.email, uow=uow)
     if not user or user["password"] != payload.password:
         raise HTTPException(status_code=401, detail="이메일 또는 비밀번호가 올바르지 않습니다.")
     return {"token": auth_service.build_token(user["id"]), "user": user}
 
 @router.post("/social")
-def social(payload: SocialLogin):
+def social(payload: SocialLogin, uow: db.UnitOfWork = Depends(db.get_uow)):
     email = f"{payload.provider.lower()}@connected"
-    user = db.fetch_user_by_email(email)
+    user = db.fetch_user_by_email(email, uow=uow)
     if not user:
         # This seems to be a mock social login?
         # create_user_email expects password.
-        user = db.create_user_email(email, payload.token, f"{payload.provider} 사용자", False)
+        user = db.create_user_email(email, payload.token, f"{payload.provider} 사용자", False, uow=uow)
     return {"token": auth_service.build_token(user["id"]), "user": user}
 
 @router.post("/signup/social")
-def social_signup(payload: SocialSignup):
+def social_signup(payload: SocialSignup, uow: db.UnitOfWork = Depends(db.get_uow)):
     # Check if already exists
-    if db.fetch_user_by_social(payload.provider, payload.social_id):
+    if db.fetch_user_by_social(payload.provider, payload.social_id, uow=uow):
         raise HTTPException(status_code=400, detail="이미 가입된 계정입니다.")
         
     new_user = db.create_social_user_with_profile(
@@ -54,13 +54,14 @@ def social_signup(payload: SocialSignup):
         last_period_date=payload.last_period_date,
         due_date=payload.due_date,
         height=payload.height,
-        weight=payload.weight
+        weight=payload.weight,
+        uow=uow
     )
     return {"token": auth_service.build_token(str(new_user["id"])), "user": new_user}
 
 
 @router.post("/google")
-def google_login(payload: GoogleLogin):
+def google_login(payload: GoogleLogin, uow: db.UnitOfWork = Depends(db.get_uow)):
     idinfo = auth_service.verify_google_token(payload.credential, payload.is_code)
     
     email = idinfo.get("email")
@@ -69,7 +70,7 @@ def google_login(payload: GoogleLogin):
         raise HTTPException(status_code=400, detail="구글 프로필에서 이메일을 가져올 수 없습니다.")
 
     # Check if user exists
-    existing_user = db.fetch_user_by_social("google", social_id)
+    existing_user = db.fetch_user_by_social("google", social_id, uow=uow)
     if not existing_user:
         # Check by email to link accounts? 
         # For now, if not found by social_id, require registration
@@ -78,10 +79,10 @@ def google_login(payload: GoogleLogin):
         # Let's check email just in case to avoid duplicates, but if email found, maybe we just link it?
         # User said: "If DB User table has no info -> popup".
         # So if email exists, we should probably just return the user (auto-link).
-        user_by_email = db.fetch_user_by_email(email)
+        user_by_email = db.fetch_user_by_email(email, uow=uow)
         if user_by_email:
              # Auto-link logic
-             user_record = auth_service.handle_social_login("google", social_id, email, user_by_email["nickname"])
+             user_record = auth_service.handle_social_login("google", social_id, email, user_by_email["nickname"], uow=uow)
              return {"token": auth_service.build_token(str(user_record["id"])), "user": user_record}
         
         # New user -> Return info for signup form
@@ -100,7 +101,7 @@ def google_login(payload: GoogleLogin):
 
 
 @router.post("/kakao")
-def kakao_login(payload: KakaoLogin):
+def kakao_login(payload: KakaoLogin, uow: db.UnitOfWork = Depends(db.get_uow)):
     profile = auth_service.verify_kakao_token(payload.code)
 
     social_id = str(profile.get("id"))
@@ -111,12 +112,12 @@ def kakao_login(payload: KakaoLogin):
     email = email or f"{social_id}@kakao.connected"
 
     # Check if user exists
-    existing_user = db.fetch_user_by_social("kakao", social_id)
+    existing_user = db.fetch_user_by_social("kakao", social_id, uow=uow)
     if not existing_user:
-        user_by_email = db.fetch_user_by_email(email)
+        user_by_email = db.fetch_user_by_email(email, uow=uow)
         if user_by_email:
              # Auto-link logic
-             user_record = auth_service.handle_social_login("kakao", social_id, email, user_by_email["nickname"])
+             user_record = auth_service.handle_social_login("kakao", social_id, email, user_by_email["nickname"], uow=uow)
              return {"token": auth_service.build_token(str(user_record["id"])), "user": user_record}
         
         # New user -> Return info for signup form
@@ -134,18 +135,9 @@ def kakao_login(payload: KakaoLogin):
     return {"token": auth_service.build_token(str(existing_user["id"])), "user": existing_user}
 
 @router.delete("/me")
-def delete_me(authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    # Explicitly cast to int as IDs are integers
-    try:
-        uid = int(user_id)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid user ID format")
-
+def delete_me(uid: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     # Check if user exists first
-    existing_user = db.fetch_user_by_id(uid)
+    existing_user = db.fetch_user_by_id(uid, uow=uow)
     if not existing_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -157,7 +149,7 @@ def delete_me(authorization: str = Header(None)):
             print(f"Failed to unlink Kakao user: {e}")
 
     # Remove try-except to expose DB errors
-    deleted = db.delete_user_by_id(uid)
+    deleted = db.delete_user_by_id(uid, uow=uow)
     
     if not deleted:
         raise HTTPException(status_code=500, detail="Failed to delete user record")
@@ -172,33 +164,22 @@ class UpdateProfile(BaseModel):
     nickname: str
 
 @router.patch("/me")
-def update_me(payload: UpdateProfile, authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
-    success = db.update_user_nickname(int(user_id), payload.nickname)
+def update_me(payload: UpdateProfile, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    success = db.update_user_nickname(user_id, payload.nickname, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
         
     return {"ok": True, "nickname": payload.nickname}
 
 @router.post("/logout")
-def logout(authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
+def logout(user_id: int = Depends(auth_service.current_user_id)):
     return {"ok": True}
 from models import TimePayload, TogglePayload
 from datetime import datetime, time
 
 @router.get("/settings")
-def get_settings(authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
-    rows = db.fetch_user_settings(user_id)
+def get_settings(user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    rows = db.fetch_user_settings(user_id, uow=uow)
     
     # If no rows, return default state (empty list, enabled=True)
     if not rows:
@@ -225,42 +206,33 @@ def get_settings(authorization: str = Header(None)):
 
 
 @router.post("/settings/time")
-def add_time(payload: TimePayload, authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
+def add_time(payload: TimePayload, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     try:
         parts = payload.time.split(":")
         notify_time = time(int(parts[0]), int(parts[1]))
     except (ValueError, IndexError):
         raise HTTPException(status_code=400, detail="Invalid time format")
 
-    db.add_user_setting_time(user_id, notify_time)
+    db.add_user_setting_time(user_id, notify_time, uow=uow)
+    # Supplements without their own time are reminded at the user's times
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
     return {"ok": True}
 
 
 @router.delete("/settings/time")
-def delete_time(payload: TimePayload, authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
+def delete_time(payload: TimePayload, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     try:
         parts = payload.time.split(":")
         notify_time = time(int(parts[0]), int(parts[1]))
     except (ValueError, IndexError):
         raise HTTPException(status_code=400, detail="Invalid time format")
 
-    db.delete_user_setting_time(user_id, notify_time)
+    db.delete_user_setting_time(user_id, notify_time, uow=uow)
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
     return {"ok": True}
 
 
 @router.patch("/settings/toggle")
-def toggle_notifications(payload: TogglePayload, authorization: str = Header(None)):
-    user_id = auth_service.parse_token(authorization)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
-    db.update_user_notification_toggle(user_id, payload.enabled)
+def toggle_notifications(payload: TogglePayload, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    db.update_user_notification_toggle(user_id, payload.enabled, uow=uow)
     return {"ok": True}
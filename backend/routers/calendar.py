@@ -1,49 +1,235 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException, Query
+from datetime import date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from models import CalendarDayInfo
 import db
-from services import calendar_service
-from typing import List
+from cache import calendar_cache
+from services import auth_service, calendar_service, ics_service
+from typing import Callable, List, Optional
 
 router = APIRouter(prefix="/calendar", tags=["calendar"])
 
+
+async def _calendar_user_id(
+    user_id: Optional[int] = Query(None),
+    token_user_id: int = Depends(auth_service.current_user_id),
+) -> int:
+    # Older clients still send ?user_id=; it must agree with the token
+    if user_id is not None and user_id != token_user_id:
+        raise HTTPException(status_code=403, detail="권한이 없습니다.")
+    return token_user_id
+
+
+def _not_modified(request: Request, etag: str, last_modified) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validators(request: Request, user_id: int, scope: str, data_version: dict) -> tuple[dict, bool]:
+    """ETag / Last-Modified headers for a data version, and whether the client already has it."""
+    etag = f'W/"{user_id}-{scope}-{data_version["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    last_modified = data_version["updated_at"]
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers, _not_modified(request, etag, last_modified)
+
+
+def _calendar_response(
+    request: Request,
+    user_id: int,
+    scope: str,
+    build: Callable[[], List[CalendarDayInfo]],
+    uow: db.UnitOfWork,
+    stream: bool = False,
+) -> Response:
+    """
+    Answer a calendar GET from the user's data version: 304 when the client is
+    current, cached bytes when another request already rendered this version,
+    and only otherwise run `build`.
+    """
+    # Read the version before the data, so a concurrent write can only make the cached body newer
+    data_version = db.fetch_user_data_version(user_id, uow=uow)
+    headers, not_modified = _validators(request, user_id, scope, data_version)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    key = (user_id, scope, data_version["version"])
+    body = calendar_cache.get(key)
+    if body is None:
+        days = build()
+        if stream:
+            return StreamingResponse(calendar_service.iter_days_json(days), media_type="application/json", headers=headers)
+        body = calendar_service.serialize_days(days)
+        calendar_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/monthly", response_model=List[CalendarDayInfo])
 def get_monthly(
+    request: Request,
     year: int = Query(..., ge=2000),
     month: int = Query(..., ge = 1, le = 12),
-    user_id : int = Query(...)
+    user_id: int = Depends(_calendar_user_id),
+    uow: db.UnitOfWork = Depends(db.get_uow),
 ):
-    user = db.fetch_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
+    return _calendar_response(
+        request, user_id, f"{year:04d}-{month:02d}",
+        lambda: calendar_service.get_monthly_data(user_id, year, month, uow=uow),
+        uow,
+    )
+
+
+@router.get("/range", response_model=List[CalendarDayInfo])
+def get_range(
+    request: Request,
+    from_month: str = Query(..., alias="from", pattern=r"^\d{4}-\d{2}$"),
+    to_month: str = Query(..., alias="to", pattern=r"^\d{4}-\d{2}$"),
+    stream: bool = Query(False),
+    user_id: int = Depends(_calendar_user_id),
+    uow: db.UnitOfWork = Depends(db.get_uow),
+):
+    # Up to 12 months of days in one round trip, e.g. ?from=2025-01&to=2025-12
+    try:
+        window = calendar_service.parse_month_range(from_month, to_month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _calendar_response(
+        request, user_id, f"{from_month}..{to_month}",
+        lambda: calendar_service.get_range_data(user_id, window, uow=uow),
+        uow,
+        stream=stream,
+    )
+
+
+def _feed_url(request: Request, token: str) -> dict:
+    return {"token": token, "url": str(request.url_for("calendar_feed", token=token))}
+
+
+@router.get("/feed")
+def get_feed(request: Request, user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    # Subscription URL for phone calendars; created on first use
+    return _feed_url(request, db.ensure_calendar_feed(user_id, ics_service.new_feed_token(), uow=uow))
+
 
-    return calendar_service.get_monthly_data(user["id"], year, month)
+@router.post("/feed/rotate")
+def rotate_feed(request: Request, user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    # The old URL stops working, e.g. after it was shared by mistake
+    return _feed_url(request, db.rotate_calendar_feed(user_id, ics_service.new_feed_token(), uow=uow))
 
 
-from models import TodoCreate
+@router.delete("/feed")
+def delete_feed(user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    return {"ok": db.delete_calendar_feed(user_id, uow=uow)}
+
+
+@router.get("/{token}.ics", name="calendar_feed")
+def calendar_feed(token: str, request: Request, uow: db.UnitOfWork = Depends(db.get_uow)):
+    """
+    iCalendar subscription feed. The token in the URL is the credential, since
+    calendar apps cannot send an Authorization header. Answered like the JSON
+    calendar: 304 from the data version, cached bytes, or a freshly streamed body.
+    """
+    feed = db.fetch_calendar_feed(token, uow=uow)
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Calendar feed not found")
+    user_id = feed["user_id"]
+    headers, not_modified = _validators(request, user_id, "ics", feed)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    media_type = "text/calendar; charset=utf-8"
+    key = (user_id, "ics", feed["version"])
+    body = calendar_cache.get(key)
+    if body is not None:
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    data = ics_service.load_feed(user_id, feed["updated_at"], uow=uow)
+
+    def stream():
+        # Cache the body once it has been streamed in full
+        chunks = []
+        for chunk in ics_service.iter_ics(data):
+            chunks.append(chunk)
+            yield chunk
+        calendar_cache.set(key, b"".join(chunks))
+
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+
+from models import OccurrenceUpdate, TodoBatch, TodoCreate
 
 @router.post("/events")
-def add_event(payload: TodoCreate, user_id: int = Query(...)):
-    user = db.fetch_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-    
+def add_event(payload: TodoCreate, user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     try:
-        return calendar_service.add_event(user["id"], payload.text, payload.date)
+        return calendar_service.add_event(user_id, payload.text, payload.date, rrule=payload.rrule, uow=uow)
+    except ValueError as e:
+        # Bad date or an RRULE outside the supported subset
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+@router.post("/events/batch")
+def batch_events(payload: TodoBatch, user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    # Lists of todos to create, delete and (un)complete, applied in one transaction; per-item results
+    return calendar_service.apply_todo_batch(user_id, payload.create, payload.delete, payload.complete, uow=uow)
+
+
 @router.delete("/events/{event_id}")
-def delete_event(event_id: int, user_id: int = Query(...)):
-    user = db.fetch_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
-        
-    success = calendar_service.delete_event(user["id"], event_id)
+def delete_event(event_id: int, user_id: int = Depends(_calendar_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    success = calendar_service.delete_event(user_id, event_id, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="이벤트를 찾을 수 없거나 삭제 권한이 없습니다.")
     
     return {"ok": True}
+
+
+@router.patch("/events/{event_id}/occurrences/{occurrence_date}")
+def update_occurrence(
+    event_id: int,
+    occurrence_date: date,
+    payload: OccurrenceUpdate,
+    user_id: int = Depends(_calendar_user_id),
+    uow: db.UnitOfWork = Depends(db.get_uow),
+):
+    # Move, rename or cancel a single occurrence of a repeating todo; an empty body restores it
+    try:
+        result = calendar_service.update_occurrence(
+            user_id, event_id, occurrence_date,
+            title=payload.text, date_str=payload.date, cancelled=payload.cancelled, uow=uow,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="반복 일정의 해당 날짜를 찾을 수 없습니다.")
+    return result
+
+
+@router.delete("/events/{event_id}/occurrences/{occurrence_date}")
+def delete_occurrence(
+    event_id: int,
+    occurrence_date: date,
+    user_id: int = Depends(_calendar_user_id),
+    uow: db.UnitOfWork = Depends(db.get_uow),
+):
+    # Remove one occurrence; the rest of the series stays
+    result = calendar_service.update_occurrence(user_id, event_id, occurrence_date, cancelled=True, uow=uow)
+    if result is None:
+        raise HTTPException(status_code=404, detail="반복 일정의 해당 날짜를 찾을 수 없습니다.")
+    return {"ok": True}
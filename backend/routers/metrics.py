@@ -0,0 +1,70 @@
+from __future__ import annotations
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+import psycopg2
+import db
+import db_async
+from cache import calendar_cache, delivery_plan_cache, user_cache
+from query_stats import query_stats
+from services import push_service
+
+# Operators' shared secret for /metrics; unset keeps the routes switched off
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+def _require_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_metrics_token or not hmac.compare_digest(x_metrics_token, METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(_require_metrics_token)])
+
+
+@router.get("/db")
+def db_metrics():
+    return {
+        "pool": db.pool_stats(),
+        "async_pool": db_async.pool_stats(),
+        "user_cache": user_cache.stats(),
+        "calendar_cache": calendar_cache.stats(),
+        "delivery_plan_cache": delivery_plan_cache.stats(),
+        "top_queries": query_stats.snapshot(limit=10),
+        "push": {**push_service.hub.stats(), **push_service.relay.stats()},
+        "reminder_scheduler": push_service.push_scheduler.stats(),
+    }
+
+
+@router.get("/db/queries")
+def db_queries(limit: Optional[int] = Query(None, ge=1)):
+    """Per-fingerprint call count, latency and row totals, most expensive first."""
+    return query_stats.snapshot(limit=limit)
+
+
+@router.delete("/db/queries")
+def reset_db_queries():
+    query_stats.reset()
+    return {"ok": True}
+
+
+@router.get("/db/slow")
+def slow_queries():
+    return query_stats.slow_queries()
+
+
+@router.get("/db/slow/{query_id}/explain")
+async def explain_slow_query(query_id: int):
+    captured = query_stats.slow_query(query_id)
+    if not captured:
+        raise HTTPException(status_code=404, detail="Slow query not found")
+    try:
+        # Captured without values, so this is the generic plan
+        plan = await run_in_threadpool(db.explain_query, captured["sql"])
+    except psycopg2.Error as exc:
+        # e.g. a placeholder whose type Postgres cannot infer, or a server before 16
+        raise HTTPException(status_code=400, detail=f"Statement cannot be explained: {exc.pgerror or exc}")
+    return {"id": query_id, "fingerprint": captured["fingerprint"], "plan": plan}
@@ -3,40 +3,71 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-import db
+import db_async
 from models import NotificationOut
+from services import auth_service, notification_service, push_service
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 
+async def _stream_user_id(
+    authorization: Optional[str] = Header(None),
+    token: Optional[str] = Query(None),
+) -> int:
+    # EventSource cannot set headers, so browsers pass the access token as ?token=
+    claims = auth_service.verify_token(authorization or token)
+    if not claims or not str(claims.get("sub", "")).isdigit():
+        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
+    return int(claims["sub"])
+
+
+@router.get("/stream")
+async def stream_notifications(user_id: int = Depends(_stream_user_id)):
+    """Server-sent `reminder` events for the user, pushed as they fall due (services/push_service.py)."""
+    return StreamingResponse(
+        push_service.hub.stream(user_id),
+        media_type="text/event-stream",
+        # No caching or proxy buffering, or events arrive late
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/due", response_model=List[NotificationOut])
-def get_due_notifications():
-    now = datetime.utcnow()
-    notis = db.fetch_notifications_due(now)
-
-    result = []
-    for n in notis:
-        ev = db.fetch_calendar_event(n["event_id"])
-        if not ev:
-            continue
-        result.append(
-            NotificationOut(
-                id=n["id"],
-                event_id=n["event_id"],
-                notify_time=n["notify_time"],
-                is_sent=n["is_sent"],
-                title=ev["title"],
-                user_id=ev["user_id"],
-            )
+async def get_due_notifications(
+    limit: int = Query(100, ge=1, le=500),
+    user_id: int = Depends(auth_service.current_user_id),
+    uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow),
+):
+    # Fallback for clients without a stream; reminders come joined with their event.
+    # Expired ones are left out, the dispatcher drops them.
+    now = datetime.now()
+    notis = await db_async.fetch_user_notifications_due(
+        user_id, now, now - notification_service.REMINDER_EXPIRY, limit, uow=uow
+    )
+    return [
+        NotificationOut(
+            id=n["id"],
+            event_id=n["event_id"],
+            notify_time=n["notify_time"],
+            is_sent=n["is_sent"],
+            title=n["title"],
+            user_id=n["user_id"],
         )
-    return result
+        for n in notis
+    ]
 
 
 @router.post("/{notification_id}/mark-sent")
-def mark_notification_sent(notification_id: int):
-    db.mark_notification_sent(notification_id)
+async def mark_notification_sent(
+    notification_id: int,
+    user_id: int = Depends(auth_service.current_user_id),
+    uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow),
+):
+    if not await db_async.mark_notification_sent(notification_id, user_id=user_id, uow=uow):
+        raise HTTPException(status_code=404, detail="Notification not found")
     return {"ok": True}
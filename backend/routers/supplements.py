@@ -1,40 +1,27 @@
 from __future__ import annotations
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from models import SupplementCreate, Supplement
 from presets import nutrient_catalog
 import db
 import uuid
-from services import supplement_service
+from services import materialize_service, supplement_service
+from services import auth_service
 
 router = APIRouter(prefix="/supplements", tags=["supplements"])
 
 
-def _user_from_header(auth_header: str | None):
-    if not auth_header:
-        return None
-    token = auth_header.replace("Bearer ", "")
-    if not token.startswith("token-"):
-        return None
-    user_id = token.split("token-", 1)[1]
-    return db.fetch_user_by_id(user_id)
-
-
 @router.get("/catalog")
 def catalog():
     return nutrient_catalog
 
 
 @router.get("/nutrients")
-def get_nutrients(period: str):
-    return db.fetch_nutrients_by_period(period)
+def get_nutrients(period: str, uow: db.UnitOfWork = Depends(db.get_uow)):
+    return db.fetch_nutrients_by_period(period, uow=uow)
 
 
 @router.get("/active")
-def active(authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
+def active(user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     # Fetch user supplements (UserSupplement + CustomSupplement)
     # The frontend expects a list of supplements.
     # UserSupplement has supplement_id. We need to join with Supplement table.
@@ -44,11 +31,11 @@ def active(authorization: str = Header(None)):
     # db.fetch_user_supplements returns list of UserSupplement rows.
     # We need to fetch details.
     
-    user_supplements = db.fetch_user_supplements(user["id"])
+    user_supplements = db.fetch_user_supplements(user_id, uow=uow)
     # We need to fetch Supplement details for each
     result = []
     for us in user_supplements:
-        sup = db.fetch_supplement_by_id(us["supplement_id"])
+        sup = db.fetch_supplement_by_id(us["supplement_id"], uow=uow)
         if sup:
             result.append({
                 "id": f"{us['supplement_id']}-{us['id']}", # Frontend expects unique ID
@@ -78,28 +65,24 @@ def active(authorization: str = Header(None)):
 
 
 @router.post("/recommend")
-def add_recommended(nutrient_id: str, supplement_id: str, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    return supplement_service.add_recommended_supplement(user["id"], nutrient_id, supplement_id)
+def add_recommended(nutrient_id: str, supplement_id: str, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
+    result = supplement_service.add_recommended_supplement(user_id, nutrient_id, supplement_id, uow=uow)
+    # Only catalog supplements (UserSupplement rows) have reminders; custom ones are skipped cheaply
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
+    return result
 
 
 @router.post("/custom")
-def add_custom(payload: SupplementCreate, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
+def add_custom(payload: SupplementCreate, user_id: int = Depends(auth_service.current_user_id), uow: db.UnitOfWork = Depends(db.get_uow)):
     # payload: name, nutrient, schedule, stage, notes
     # CustomSupplement: name, cycle, time_of_day, note
     # We map schedule to note or time_of_day?
     # Frontend sends 'schedule' string.
     
     return db.add_custom_supplement(
-        user_id=user["id"],
+        user_id=user_id,
         name=payload.name,
         schedule=payload.schedule,
-        notes=payload.notes
+        notes=payload.notes,
+        uow=uow
     )
@@ -1,31 +1,23 @@
 from __future__ import annotations
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from models import ProfilePayload, PregnancyPayload, DoctorsNoteCreate
 import models
 from utils import weight_status
-import db
+import db_async
+from services import auth_service, materialize_service, period_service
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
-def _user_from_header(auth_header: str | None):
-    if not auth_header:
-        return None
-    token = auth_header.replace("Bearer ", "")
-    if not token.startswith("token-"):
-        return None
-    user_id = token.split("token-", 1)[1]
-    return db.fetch_user_by_id(user_id)
-
-
 @router.get("/me")
-def me(authorization: str = Header(None)):
-    user = _user_from_header(authorization)
+async def me(user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    user = await db_async.fetch_user_by_id(user_id, uow=uow)
     if not user:
         raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    # Fetch profile separately as it's not in User table anymore
-    profile_data = db.fetch_user_profile(user["id"]) or {}
+
+    # Profile comes embedded in the user aggregate, no extra query needed
+    profile_data = user.get("profile") or {}
     
     # Map DB columns to frontend keys
     mapped_profile = {
@@ -46,20 +38,17 @@ def me(authorization: str = Header(None)):
 
 
 @router.put("/profile")
-def update_profile(payload: ProfilePayload, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    db.upsert_user_profile(
-        user_id=user["id"],
+async def update_profile(payload: ProfilePayload, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    await db_async.upsert_user_profile(
+        user_id=user_id,
         height=payload.height,
         initial_weight=payload.preWeight,
-        current_weight=payload.currentWeight
+        current_weight=payload.currentWeight,
+        uow=uow
     )
     
     # Fetch updated profile
-    profile_data = db.fetch_user_profile(user["id"]) or {}
+    profile_data = await db_async.fetch_user_profile(user_id, uow=uow) or {}
     
     # Map DB columns to frontend keys
     mapped_profile = {
@@ -77,16 +66,13 @@ def update_profile(payload: ProfilePayload, authorization: str = Header(None)):
 
 
 @router.patch("/pregnancy")
-def update_pregnancy(payload: PregnancyPayload, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    success = db.update_user_pregnancy(
-        user["id"], 
+async def update_pregnancy(payload: PregnancyPayload, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.update_user_pregnancy(
+        user_id, 
         payload.is_pregnant,
         last_period_date=payload.last_period_date,
-        due_date=payload.due_date
+        due_date=payload.due_date,
+        uow=uow
     )
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update pregnancy status")
@@ -95,7 +81,7 @@ def update_pregnancy(payload: PregnancyPayload, authorization: str = Header(None
 
 
 @router.put("/notifications")
-def notifications(notifications: list[str], authorization: str = Header(None)):
+async def notifications(notifications: list[str]):
     # This endpoint seems legacy/unused by new frontend hooks.
     # But to be safe, we can implement it or just pass.
     # storage.set_notifications used to update JSONB.
@@ -108,37 +94,68 @@ def notifications(notifications: list[str], authorization: str = Header(None)):
 
 
 @router.get("/notes")
-def get_notes(authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    return db.fetch_doctors_notes(user["id"])
+async def get_notes(user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    return await db_async.fetch_doctors_notes(user_id, uow=uow)
 
 
 @router.post("/notes")
-def create_note(payload: models.DoctorsNoteCreate, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    note = db.create_doctors_note(user["id"], payload.content, payload.visit_date)
+async def create_note(payload: models.DoctorsNoteCreate, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    note = await db_async.create_doctors_note(user_id, payload.content, payload.visit_date, uow=uow)
     return note
 
 
 @router.delete("/notes/{note_id}")
-def delete_note(note_id: int, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-        
-    success = db.delete_doctors_note(note_id, user["id"])
+async def delete_note(note_id: int, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.delete_doctors_note(note_id, user_id, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="Note not found")
     return {"ok": True}
 
 
+@router.get("/period-logs")
+async def get_period_logs(user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    logs = await db_async.fetch_period_logs(user_id, uow=uow)
+    projection = await db_async.fetch_period_projection(user_id, uow=uow)
+    estimate = None
+    if projection:
+        estimate = {
+            "cycleLength": projection["cycle_length"],
+            "cycleStddev": projection["cycle_stddev"],
+            "periodLength": projection["period_length"],
+        }
+    return {"logs": logs, "estimate": estimate}
+
+
+@router.post("/period-logs")
+async def add_period_log(
+    payload: models.PeriodLogCreate,
+    background_tasks: BackgroundTasks,
+    user_id: int = Depends(auth_service.current_user_id),
+    uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow),
+):
+    if payload.end_date and payload.end_date < payload.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    log = await db_async.add_period_log(user_id, payload.start_date, payload.end_date, uow=uow)
+    # Re-estimated after commit; the calendar picks it up through PeriodProjection
+    background_tasks.add_task(period_service.refresh_user, user_id)
+    return log
+
+
+@router.delete("/period-logs/{log_id}")
+async def delete_period_log(
+    log_id: int,
+    background_tasks: BackgroundTasks,
+    user_id: int = Depends(auth_service.current_user_id),
+    uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow),
+):
+    if not await db_async.delete_period_log(user_id, log_id, uow=uow):
+        raise HTTPException(status_code=404, detail="Period log not found")
+    background_tasks.add_task(period_service.refresh_user, user_id)
+    return {"ok": True}
+
+
 @router.get("/tips")
-def get_tips():
+async def get_tips(uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
     # Tips are public, no auth required (or maybe auth required? let's keep it open or auth optional)
     # User didn't specify, but usually tips are generic.
     # Let's require auth just to be consistent with other endpoints if needed, 
@@ -146,56 +163,45 @@ def get_tips():
     # Given the context, it's likely called from MyPage where user is logged in.
     # But strictly speaking, tips don't depend on user ID.
     # But strictly speaking, tips don't depend on user ID.
-    return db.fetch_random_tips(3)
+    return await db_async.fetch_random_tips(3, uow=uow)
 
 
 @router.get("/supplements")
-def get_user_supplements(authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    return db.fetch_user_supplements(user["id"])
+async def get_user_supplements(user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    return await db_async.fetch_user_supplements(user_id, uow=uow)
 
 
 @router.post("/supplements")
-def add_user_supplement(payload: models.UserSupplementCreate, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
+async def add_user_supplement(payload: models.UserSupplementCreate, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
     # Check if already added? (Optional, but good for UX)
     # For now, just add it.
     
-    result = db.add_user_supplement(
-        user["id"], 
+    result = await db_async.add_user_supplement(
+        user_id, 
         payload.supplement_id, 
         payload.cycle, 
-        payload.time_of_day
+        payload.time_of_day,
+        uow=uow
     )
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
     return result
 
 
 @router.delete("/supplements/{id}")
-def delete_user_supplement(id: int, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-        
-    success = db.delete_user_supplement(user["id"], id)
+async def delete_user_supplement(id: int, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.delete_user_supplement(user_id, id, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="Supplement not found")
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
     return {"ok": True}
 
 
 @router.delete("/supplements/by-supplement/{supplement_id}")
-def delete_user_supplement_by_supplement_id(supplement_id: int, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-
-    success = db.delete_user_supplement_by_supplement_id(user["id"], supplement_id)
+async def delete_user_supplement_by_supplement_id(supplement_id: int, background_tasks: BackgroundTasks, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.delete_user_supplement_by_supplement_id(user_id, supplement_id, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="Supplement not found")
+    background_tasks.add_task(materialize_service.refresh_user_supplements, user_id)
     return {"ok": True}
 
 
@@ -209,12 +215,10 @@ class WeightAnalysisRequest(BaseModel):
     weeks: int
 
 @router.post("/analyze-weight")
-def analyze_weight_endpoint(payload: WeightAnalysisRequest, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-        
-    result = ai_service.analyze_weight(
+async def analyze_weight_endpoint(payload: WeightAnalysisRequest, user_id: int = Depends(auth_service.current_user_id)):
+    # The OpenAI client is blocking, so keep it off the event loop
+    result = await run_in_threadpool(
+        ai_service.analyze_weight,
         payload.height,
         payload.preWeight,
         payload.currentWeight,
@@ -224,41 +228,26 @@ def analyze_weight_endpoint(payload: WeightAnalysisRequest, authorization: str =
 
 
 @router.get("/custom-supplements")
-def get_custom_supplements(active: bool = False, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    return db.fetch_custom_supplements(user["id"], active_only=active)
+async def get_custom_supplements(active: bool = False, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    return await db_async.fetch_custom_supplements(user_id, active_only=active, uow=uow)
 
 
 @router.post("/custom-supplements")
-def add_custom_supplement(payload: models.CustomSupplementCreate, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-    
-    return db.add_custom_supplement(user["id"], payload.name, payload.note)
+async def add_custom_supplement(payload: models.CustomSupplementCreate, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    return await db_async.add_custom_supplement(user_id, payload.name, payload.note, uow=uow)
 
 
 @router.patch("/custom-supplements/{id}")
-def toggle_custom_supplement(id: int, payload: models.TogglePayload, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-        
-    success = db.toggle_custom_supplement(user["id"], id, payload.enabled)
+async def toggle_custom_supplement(id: int, payload: models.TogglePayload, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.toggle_custom_supplement(user_id, id, payload.enabled, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="Custom supplement not found")
     return {"ok": True}
 
 
 @router.delete("/custom-supplements/{id}")
-def delete_custom_supplement(id: int, authorization: str = Header(None)):
-    user = _user_from_header(authorization)
-    if not user:
-        raise HTTPException(status_code=401, detail="토큰이 필요합니다.")
-        
-    success = db.delete_custom_supplement(user["id"], id)
+async def delete_custom_supplement(id: int, user_id: int = Depends(auth_service.current_user_id), uow: db_async.AsyncUnitOfWork = Depends(db_async.get_uow)):
+    success = await db_async.delete_custom_supplement(user_id, id, uow=uow)
     if not success:
         raise HTTPException(status_code=404, detail="Custom supplement not found")
     return {"ok": True}
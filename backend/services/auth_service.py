@@ -1,8 +1,13 @@
+import base64
+import hashlib
+import hmac
+import json
 import os
+import time
 import requests
 from google.oauth2 import id_token
 from google.auth.transport import requests as grequests
-from fastapi import HTTPException
+from fastapi import Header, HTTPException
 import db
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -10,22 +15,83 @@ GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 KAKAO_CLIENT_ID = os.getenv("KAKAO_CLIENT_ID")
 KAKAO_CLIENT_SECRET = os.getenv("KAKAO_CLIENT_SECRET")
 KAKAO_REDIRECT_URI = os.getenv("KAKAO_REDIRECT_URI")
+AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+# Access token lifetime in seconds (default 7 days)
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", str(60 * 60 * 24 * 7)))
 
 def _require_env(var_name: str, value: str | None) -> str:
     if not value:
         raise HTTPException(status_code=500, detail=f"{var_name} is not configured.")
     return value
 
-def build_token(user_id: str | int) -> str:
-    return f"token-{user_id}"
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
 
-def parse_token(token: str | None) -> str | None:
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+# HS256 JWT header never changes, so encode it once
+_TOKEN_HEADER = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+
+def _sign(signing_input: bytes) -> bytes:
+    secret = _require_env("AUTH_SECRET_KEY", AUTH_SECRET_KEY)
+    return hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
+
+
+def build_token(user_id: str | int, **claims) -> str:
+    """
+    Issue a signed, expiring access token (HS256 JWT).
+    Extra keyword arguments are added as claims.
+    """
+    now = int(time.time())
+    payload = {"sub": str(user_id), "iat": now, "exp": now + ACCESS_TOKEN_TTL, **claims}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signing_input = f"{_TOKEN_HEADER}.{body}"
+    return f"{signing_input}.{_b64encode(_sign(signing_input.encode()))}"
+
+
+def verify_token(token: str | None) -> dict | None:
+    """
+    Returns the token claims if the signature and expiry check out, otherwise None.
+    Pure CPU work: no database lookup is involved.
+    """
     if not token:
         return None
-    token = token.replace("Bearer ", "")
-    if not token.startswith("token-"):
+    if token.startswith("Bearer "):
+        token = token[len("Bearer "):]
+    try:
+        header, body, signature = token.split(".")
+    except ValueError:
         return None
-    return token.split("token-", 1)[1]
+    if header != _TOKEN_HEADER:
+        return None
+
+    expected = _sign(f"{header}.{body}".encode())
+    try:
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+async def current_user_id(authorization: str = Header(None)) -> int:
+    """
+    Shared FastAPI dependency for authenticated routes.
+    Declared async so it runs inline on the event loop instead of the threadpool.
+    """
+    claims = verify_token(authorization)
+    if not claims or not str(claims.get("sub", "")).isdigit():
+        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
+    return int(claims["sub"])
+
 
 def verify_google_token(credential: str, is_code: bool) -> dict:
     google_client_id = _require_env("GOOGLE_CLIENT_ID", GOOGLE_CLIENT_ID)
@@ -98,8 +164,8 @@ def verify_kakao_token(code: str) -> dict:
         
     return profile_resp.json()
 
-def handle_social_login(provider: str, social_id: str, email: str, nickname: str) -> dict:
-    user_record = db.upsert_social_user(provider, social_id, email, nickname)
+def handle_social_login(provider: str, social_id: str, email: str, nickname: str, uow: db.UnitOfWork | None = None) -> dict:
+    user_record = db.upsert_social_user(provider, social_id, email, nickname, uow=uow)
     return user_record
 
 KAKAO_ADMIN_KEY = os.getenv("KAKAO_ADMIN_KEY")
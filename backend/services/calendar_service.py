@@ -1,137 +1,190 @@
 from __future__ import annotations
-from datetime import date, datetime, time
-from typing import List
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pydantic import TypeAdapter
 from models import CalendarDayInfo, SupplementInfo, Todo
 import db
+import period_prediction
+import recurrence
 import utils
 
-def create_calendar_event_for_supplement_intake(
-    user_id: int, user_supplement: dict, intake_date: date
-) -> dict:
-    time_of_day: time = user_supplement.get("time_of_day") or time(9, 0, 0)
-    start_dt = datetime.combine(intake_date, time_of_day)
 
-    sup_def = db.fetch_supplement_by_id(user_supplement["supplement_id"])
-    title = f"{sup_def['name']} 복용" if sup_def else "영양제 복용"
+@dataclass
+class CalendarWindow:
+    """
+    Half-open date range [start, end) that every layer fills in.
+    Day keys ("YYYY-MM-DD") are formatted once here and shared by all layers.
+    """
+    start: date
+    end: date
 
-    return db.upsert_calendar_event(
-        user_id=user_id,
-        title=title,
-        start_datetime=start_dt,
-        linked_supplement_id=user_supplement["supplement_id"],
-        type="supplement"
-    )
+    def __post_init__(self):
+        self.days: List[date] = [self.start + timedelta(days=i) for i in range((self.end - self.start).days)]
+        self.keys: Dict[date, str] = {d: d.strftime("%Y-%m-%d") for d in self.days}
+
+    def key(self, d: date) -> str:
+        return self.keys.get(d) or d.strftime("%Y-%m-%d")
 
-def get_monthly_data(user_id: int, year: int, month: int) -> List[CalendarDayInfo]:
-    # month range
-    month_start = date(year, month, 1)
-    if month == 12:
-        month_end = date(year + 1, 1, 1)
-    else:
-        month_end = date(year, month + 1, 1)
+    @classmethod
+    def month(cls, year: int, month: int) -> "CalendarWindow":
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return cls(start, end)
 
-    # 영양제
-    supplement_events = {}
-    user_supplements = db.fetch_user_supplements(user_id)
-    all_supplements = db.fetch_supplements() # List of dicts with id, name
+
+@dataclass
+class CalendarLayer:
+    """
+    One source of per-day calendar data. `build` returns {day: value} for the days
+    inside the window that have something to show; `field` is the CalendarDayInfo
+    attribute it fills.
+    """
+    field: str
+    build: Callable[[int, CalendarWindow, Optional[db.UnitOfWork]], Dict[date, Any]]
+
+
+# 영양제
+def _supplement_layer(user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None) -> Dict[date, List[SupplementInfo]]:
+    entries: Dict[date, List[SupplementInfo]] = {}
+    # Rows are joined with "Supplement" already, so the catalog is not loaded separately
+    user_supplements = db.fetch_user_supplements(user_id, uow=uow)
 
     for us in user_supplements:
-        start = us["start_date"] #복용 시작일
-        end = us["end_date"] or month_end #복용 종료일이라면 그 날짜, 복용 종료일이 없다면 이번 달 범위까지만
-        current = start #지금 계산 중인 날짜 (초기값은 start)
-        max_loop = 500
-
-        for _ in range(max_loop):
-            #복용 기간 종료
-            if current > end: 
-                break
-            #날짜가 이번 달 범위 안에 있을 때
-            if month_start <= current < month_end:
-                key = current.strftime("%Y-%m-%d")
-                sup_def = next((s for s in all_supplements if s["id"] == us["supplement_id"]), None)
-                if sup_def:
-                    supplement_events.setdefault(key, []).append(
-                        SupplementInfo(name=sup_def["name"], time=us["time_of_day"])
-                    )
-
-                    # 이벤트 및 알림 생성
-                    event = create_calendar_event_for_supplement_intake(
-                        user_id, us, current
-                    )
-                    db.ensure_notification(event["id"], event["start_datetime"])
-
-            #복용 주기가 없는 영양제
-            if us["cycle"] == "none":
-                break
-            #복용 주기가 있다면 날짜를 cycle 뒤 날짜로 옮김
-            current = current + utils.step_cycle(us["cycle"])  
-
-
-    # 임신
-    pregnancy_map = {}
-    preg = db.fetch_pregnancy_info(user_id)
-    if preg:
-        current = preg["pregnancy_start"]
-        while current <= preg["due_date"]:
-            if month_start <= current < month_end:
-                key = current.strftime("%Y-%m-%d")
-                pregnancy_map[key] = utils.calculate_pregnancy_stage_label(
-                    current, preg["pregnancy_start"], preg["due_date"]
-                )
-            current = current + utils.one_day()
-
-    # 생리
-    period_map = {}
-    period = db.fetch_period_info(user_id)
-    if period:
-        last = period["last_period"]
-        #기본 주기 -> 28일
-        cycle_days = 28
-        current = last
-        for _ in range(60):
-            if current > month_end: break
-            if month_start <= current < month_end:
-                key = current.strftime("%Y-%m-%d")
-                phase = utils.calculate_period_phase(current, last)
-                period_map[key] = phase
-            current = current + utils.cycle_days(cycle_days)
-
-    # Todos (CalendarEvent type='todo')
-    todo_events = db.fetch_calendar_events_range(user_id, month_start, month_end, type="todo")
-    todo_map = {}
+        # 이번 기간 안의 복용일로 바로 이동 (reminder rows come from services/materialize_service.py)
+        for current in recurrence.occurrences(us["start_date"], us["cycle"], window.start, window.end, until=us["end_date"]):
+            entries.setdefault(current, []).append(
+                SupplementInfo(name=us["name"], time=us["time_of_day"])
+            )
+    return entries
+
+
+# 임신
+def _pregnancy_layer(user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None) -> Dict[date, str]:
+    entries: Dict[date, str] = {}
+    preg = db.fetch_pregnancy_info(user_id, uow=uow)
+    if not preg or not preg["pregnancy_start"] or not preg["due_date"]:
+        return entries
+    start, due = preg["pregnancy_start"], preg["due_date"]
+
+    # [pregnancy_start, due_date] ∩ window; nothing to do for months outside the pregnancy
+    first = max(start, window.start)
+    last = min(due, window.end - timedelta(days=1))
+    current = first
+    while current <= last:
+        # The label only changes weekly, so compute it once per pregnancy week
+        week_end = min(start + timedelta(days=((current - start).days // 7 + 1) * 7), last + timedelta(days=1))
+        label = utils.calculate_pregnancy_stage_label(current, start, due)
+        while current < week_end:
+            entries[current] = label
+            current += timedelta(days=1)
+    return entries
+
+
+# 생리
+def _period_layer(user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None) -> Dict[date, str]:
+    # Precomputed by services/period_service.py from the user's PeriodLog history
+    projection = db.fetch_period_projection(user_id, uow=uow)
+    if not projection or not projection["cycle_starts"]:
+        return {}
+    return period_prediction.phases_for_window(
+        projection["cycle_starts"],
+        projection["cycle_length"],
+        projection["period_length"],
+        window.start,
+        window.end,
+    )
+
+
+# Todos (CalendarEvent type='todo')
+def _todo_layer(user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None) -> Dict[date, List[Todo]]:
+    entries: Dict[date, List[Todo]] = {}
+    todo_events = db.fetch_calendar_events_range(user_id, window.start, window.end, type="todo", uow=uow)
     for ev in todo_events:
-        # ev is a dict from DB: id, title, start_datetime, etc.
-        d_str = ev["start_datetime"].strftime("%Y-%m-%d")
-        todo_map.setdefault(d_str, []).append(
+        day = ev["start_datetime"].date()
+        entries.setdefault(day, []).append(
             Todo(
                 id=str(ev["id"]),
                 text=ev["title"],
-                date=d_str,
-                completed=False # DB doesn't have completed status yet
+                date=window.key(day),
+                completed=ev["completed"],
+                occurrenceDate=ev["occurrence_date"] and ev["occurrence_date"].strftime("%Y-%m-%d"),
             )
         )
+    return entries
+
+
+CALENDAR_LAYERS: List[CalendarLayer] = [
+    CalendarLayer("supplements", _supplement_layer),
+    CalendarLayer("todos", _todo_layer),
+    CalendarLayer("pregnancyPhase", _pregnancy_layer),
+    CalendarLayer("menstrualPhase", _period_layer),
+]
+
+
+# "python" merges CALENDAR_LAYERS in process; "sql" has Postgres return finished day rows
+# (db.fetch_calendar_days). Both produce the same days; see bench_calendar.py.
+CALENDAR_ENGINE = os.getenv("CALENDAR_ENGINE", "python")
 
-    # 최종 list 
-    result = []
-    for day in range(1, 32):
-        try:
-            d = date(year, month, day)
-        except ValueError:
-            break
-        key = d.strftime("%Y-%m-%d")
-        result.append(
-            CalendarDayInfo(
-                date=key,
-                supplements=supplement_events.get(key, []),
-                todos=todo_map.get(key, []),
-                pregnancyPhase=pregnancy_map.get(key),
-                menstrualPhase=period_map.get(key),
-            )
-        )
 
-    return result
+def build_calendar_days(
+    user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None, engine: Optional[str] = None
+) -> List[CalendarDayInfo]:
+    if (engine or CALENDAR_ENGINE) == "sql":
+        rows = db.fetch_calendar_days(user_id, window.start, window.end, uow=uow)
+        return [CalendarDayInfo(**row) for row in rows]
 
-def add_event(user_id: int, title: str, date_str: str) -> dict:
+    layers = [(layer.field, layer.build(user_id, window, uow)) for layer in CALENDAR_LAYERS]
+    # 최종 list
+    return [
+        CalendarDayInfo(date=window.keys[d], **{field: entries[d] for field, entries in layers if d in entries})
+        for d in window.days
+    ]
+
+
+def get_monthly_data(user_id: int, year: int, month: int, uow: Optional[db.UnitOfWork] = None) -> List[CalendarDayInfo]:
+    return build_calendar_days(user_id, CalendarWindow.month(year, month), uow=uow)
+
+
+CALENDAR_RANGE_MAX_MONTHS = 12
+
+
+def parse_month_range(from_month: str, to_month: str) -> CalendarWindow:
+    """
+    "YYYY-MM".."YYYY-MM" (both inclusive) -> one window spanning the months.
+    Raises ValueError for malformed, reversed or too long ranges.
+    """
+    first = datetime.strptime(from_month, "%Y-%m").date()
+    last = datetime.strptime(to_month, "%Y-%m").date()
+    months = (last.year - first.year) * 12 + (last.month - first.month) + 1
+    if months < 1:
+        raise ValueError("'from' must not be after 'to'")
+    if months > CALENDAR_RANGE_MAX_MONTHS:
+        raise ValueError(f"at most {CALENDAR_RANGE_MAX_MONTHS} months per request")
+    return CalendarWindow(first, CalendarWindow.month(last.year, last.month).end)
+
+
+def get_range_data(user_id: int, window: CalendarWindow, uow: Optional[db.UnitOfWork] = None) -> List[CalendarDayInfo]:
+    # Every layer queries its source once for the whole span
+    return build_calendar_days(user_id, window, uow=uow)
+
+
+_DAYS_ADAPTER = TypeAdapter(List[CalendarDayInfo])
+
+
+def serialize_days(days: List[CalendarDayInfo]) -> bytes:
+    return _DAYS_ADAPTER.dump_json(days)
+
+
+def iter_days_json(days: List[CalendarDayInfo]) -> Iterator[bytes]:
+    """Serialize a day list as a JSON array one day at a time, for StreamingResponse."""
+    yield b"["
+    for i, day in enumerate(days):
+        yield (b"," if i else b"") + day.model_dump_json().encode()
+    yield b"]"
+
+def add_event(user_id: int, title: str, date_str: str, rrule: Optional[str] = None, uow: Optional[db.UnitOfWork] = None) -> dict:
     # date_str is YYYY-MM-DD
     # We need to convert it to datetime
     from datetime import datetime
@@ -139,12 +192,101 @@ def add_event(user_id: int, title: str, date_str: str) -> dict:
     # upsert_calendar_event requires datetime
     start_dt = datetime.combine(dt, datetime.min.time())
     
+    # With an rrule the row is the whole series; occurrences are expanded on read
     return db.upsert_calendar_event(
         user_id=user_id,
         title=title,
         start_datetime=start_dt,
-        type="todo"
+        type="todo",
+        rrule=rrule,
+        uow=uow
+    )
+
+def delete_event(user_id: int, event_id: int, uow: Optional[db.UnitOfWork] = None) -> bool:
+    return db.delete_calendar_event(event_id, user_id, uow=uow)
+
+
+def update_occurrence(
+    user_id: int,
+    event_id: int,
+    occurrence_date: date,
+    title: Optional[str] = None,
+    date_str: Optional[str] = None,
+    cancelled: bool = False,
+    uow: Optional[db.UnitOfWork] = None,
+) -> Optional[dict]:
+    """
+    Override one occurrence of a repeating event. Nothing to change restores it.
+    Returns None when the event is not the user's series or has no occurrence on that date.
+    """
+    event = db.fetch_calendar_event(event_id, uow=uow)
+    if not event or event["user_id"] != user_id or not event["rrule"]:
+        return None
+    rule = recurrence.parse_rrule(event["rrule"]).rule
+    next_day = occurrence_date + timedelta(days=1)
+    if not any(recurrence.occurrences(event["start_datetime"], rule, occurrence_date, next_day, until=event["series_until"])):
+        return None
+
+    if not (title or date_str or cancelled):
+        db.delete_event_override(user_id, event_id, occurrence_date, uow=uow)
+        return {"event_id": event_id, "occurrence_date": occurrence_date, "restored": True}
+    start = None
+    if date_str:
+        moved = datetime.strptime(date_str, "%Y-%m-%d").date()
+        start = datetime.combine(moved, event["start_datetime"].time())
+    return db.upsert_event_override(
+        user_id, event_id, occurrence_date, title=title or None, start_datetime=start, cancelled=cancelled, uow=uow
     )
 
-def delete_event(user_id: int, event_id: int) -> bool:
-    return db.delete_calendar_event(event_id, user_id)
+
+def apply_todo_batch(
+    user_id: int,
+    create: List[Any],
+    delete: List[int],
+    complete: List[Any],
+    uow: Optional[db.UnitOfWork] = None,
+) -> dict:
+    """
+    Create, delete and complete todos in the caller's transaction with one
+    statement per kind of change. Items that fail validation are reported and
+    skipped; every other item is applied.
+    """
+    created: List[dict] = [{"index": i, "ok": False} for i in range(len(create))]
+    valid: List[tuple] = []
+    for i, item in enumerate(create):
+        try:
+            start = datetime.combine(datetime.strptime(item.date, "%Y-%m-%d").date(), datetime.min.time())
+            if item.rrule:
+                recurrence.last_occurrence(start, recurrence.parse_rrule(item.rrule))
+        except ValueError as e:
+            created[i]["error"] = str(e)
+            continue
+        valid.append((i, (item.text, start, item.rrule)))
+    rows = db.create_todos(user_id, [todo for _, todo in valid], uow=uow)
+    for (i, _), row in zip(valid, rows):
+        created[i].update(ok=True, event=row)
+
+    deleted_ids = db.delete_todos(user_id, list(dict.fromkeys(delete)), uow=uow)
+    deleted = [{"id": event_id, "ok": event_id in deleted_ids} for event_id in delete]
+
+    # Occurrence dates must be dates the series' rule actually produces
+    series = {}
+    if any(c.occurrenceDate for c in complete):
+        ids = list({c.id for c in complete if c.occurrenceDate})
+        series = {ev["id"]: ev for ev in db.fetch_calendar_events_by_ids(user_id, ids, uow=uow) if ev["rrule"]}
+    items = []
+    for c in complete:
+        if c.occurrenceDate is not None:
+            ev = series.get(c.id)
+            if ev is None or not any(recurrence.occurrences(
+                ev["start_datetime"], recurrence.parse_rrule(ev["rrule"]).rule,
+                c.occurrenceDate, c.occurrenceDate + timedelta(days=1), until=ev["series_until"],
+            )):
+                continue
+        items.append((c.id, c.occurrenceDate, c.completed))
+    updated = db.set_todos_completed(user_id, items, uow=uow)
+    completed = [
+        {"id": c.id, "occurrenceDate": c.occurrenceDate, "ok": (c.id, c.occurrenceDate) in updated}
+        for c in complete
+    ]
+    return {"created": created, "deleted": deleted, "completed": completed}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import db
+from cache import delivery_plan_cache
+
+# Intake reminder time for supplements without their own, when the user set no reminder times
+DEFAULT_SUPPLEMENT_TIME = time(9, 0)
+
+
+@dataclass(frozen=True)
+class DeliveryPlan:
+    """
+    How reminders reach one user, compiled from their "UserSetting" rows.
+    db.materialize_supplement_events applies the same supplement_times() rule in SQL.
+    """
+    user_id: int
+    enabled: bool = True
+    # UserSetting.default_notify_time values, ascending
+    default_times: Tuple[time, ...] = ()
+
+    def supplement_times(self, time_of_day: Optional[time]) -> Tuple[time, ...]:
+        """When a supplement's intake reminders go out: its own time, else the user's times, else 09:00."""
+        if time_of_day is not None:
+            return (time_of_day,)
+        return self.default_times or (DEFAULT_SUPPLEMENT_TIME,)
+
+
+def _compile(user_id: int, row: Optional[dict]) -> DeliveryPlan:
+    if row is None:
+        return DeliveryPlan(user_id)
+    return DeliveryPlan(user_id, enabled=row["enabled"], default_times=tuple(sorted(row["times"])))
+
+
+def get_plans(user_ids: Iterable[int], uow: Optional[db.UnitOfWork] = None) -> Dict[int, DeliveryPlan]:
+    """Plans for many users: cached ones as is, all misses compiled from one query."""
+    plans: Dict[int, DeliveryPlan] = {}
+    missing = []
+    for user_id in set(user_ids):
+        plan = delivery_plan_cache.get(user_id)
+        if plan is None:
+            missing.append(user_id)
+        else:
+            plans[user_id] = plan
+    if missing:
+        # Taken before the query so a settings write during it keeps the result out of the cache
+        since = delivery_plan_cache.generation()
+        rows = {row["user_id"]: row for row in db.fetch_delivery_settings(missing, uow=uow)}
+        for user_id in missing:
+            plans[user_id] = _compile(user_id, rows.get(user_id))
+            delivery_plan_cache.set(user_id, plans[user_id], since=since)
+    return plans
+
+
+def get_plan(user_id: int, uow: Optional[db.UnitOfWork] = None) -> DeliveryPlan:
+    return get_plans([user_id], uow=uow)[user_id]
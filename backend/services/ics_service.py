@@ -0,0 +1,230 @@
+from __future__ import annotations
+import secrets
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+
+import db
+import period_prediction
+import recurrence
+from services import delivery_plan
+
+# Times are stored without a zone, so the feed uses floating local times (RFC 5545 3.3.5)
+_CRLF = b"\r\n"
+_UID_DOMAIN = "babyprep"
+# Supplement reminders get a short slot rather than a zero-length event
+_SUPPLEMENT_DURATION = "PT10M"
+# Pregnancy milestones: (week the milestone starts, title)
+_PREGNANCY_MILESTONES = ((1, "임신 시작"), (14, "임신 중기 (14주차)"), (28, "임신 후기 (28주차)"))
+_PERIOD_TITLES = {"menstruation": "생리", "ovulation": "가임기"}
+
+
+def new_feed_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+@dataclass
+class FeedData:
+    """Everything the feed shows for one user, loaded up front so the body can stream without a connection."""
+    user_id: int
+    stamp: datetime
+    todos: List[dict] = field(default_factory=list)
+    supplements: List[dict] = field(default_factory=list)
+    plan: Optional[delivery_plan.DeliveryPlan] = None
+    pregnancy: Optional[dict] = None
+    projection: Optional[dict] = None
+    logged_starts: set = field(default_factory=set)
+
+
+def load_feed(user_id: int, updated_at: Optional[datetime], uow: Optional[db.UnitOfWork] = None) -> FeedData:
+    return FeedData(
+        user_id=user_id,
+        # DTSTAMP follows the data version, so the same version always renders the same bytes
+        stamp=updated_at or datetime(2025, 1, 1, tzinfo=timezone.utc),
+        todos=db.fetch_user_todo_events(user_id, uow=uow),
+        supplements=db.fetch_user_supplements(user_id, uow=uow),
+        plan=delivery_plan.get_plan(user_id, uow=uow),
+        pregnancy=db.fetch_pregnancy_info(user_id, uow=uow),
+        projection=db.fetch_period_projection(user_id, uow=uow),
+        logged_starts={log["start_date"] for log in db.fetch_period_logs(user_id, uow=uow)},
+    )
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> bytes:
+    """Encode one content line, folded at 75 octets without splitting a UTF-8 character."""
+    raw = line.encode()
+    if len(raw) <= 75:
+        return raw + _CRLF
+    out = bytearray()
+    limit = 75
+    while raw:
+        cut = min(limit, len(raw))
+        # Back up to a character boundary (continuation bytes are 10xxxxxx)
+        while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1
+        out += raw[:cut] + _CRLF
+        raw = raw[cut:]
+        if raw:
+            out += b" "
+            # The leading space counts toward the next line's 75 octets
+            limit = 74
+    return bytes(out)
+
+
+def _date_value(d: date) -> str:
+    return f"{d:%Y%m%d}"
+
+
+def _datetime_value(dt: datetime) -> str:
+    return f"{dt:%Y%m%dT%H%M%S}"
+
+
+def _day(value) -> date:
+    # UserSupplement dates may come back as timestamps
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _is_all_day(dt: datetime) -> bool:
+    # Todos are stored at midnight of their day
+    return dt.time() == time.min
+
+
+def _start_property(name: str, dt: datetime) -> str:
+    if _is_all_day(dt):
+        return f"{name};VALUE=DATE:{_date_value(dt.date())}"
+    return f"{name}:{_datetime_value(dt)}"
+
+
+def _rrule(first: date, rule: recurrence.Rule, until: Optional[datetime], all_day: bool) -> str:
+    """
+    RRULE for a recurrence.Rule starting on `first`. Monthly rules clamp to the
+    end of short months (recurrence.add_months) where RFC 5545 would skip the
+    month, so days after the 28th are spelled out with BYMONTHDAY/BYSETPOS.
+    """
+    parts = [recurrence.format_rrule(recurrence.Series(rule))]
+    if rule.unit == recurrence.MONTH and first.day > 28:
+        days = ",".join(str(d) for d in range(28, first.day + 1))
+        if rule.every % 12 == 0:
+            parts.append(f"BYMONTH={first.month}")
+        parts.append(f"BYMONTHDAY={days};BYSETPOS=-1")
+    if until is not None:
+        parts.append(f"UNTIL={_date_value(until.date()) if all_day else _datetime_value(until)}")
+    return "RRULE:" + ";".join(parts)
+
+
+def _event(uid: str, stamp: datetime, lines: Iterable[str]) -> bytes:
+    """One VEVENT; the stream is written one component at a time."""
+    head = ["BEGIN:VEVENT", f"UID:{uid}@{_UID_DOMAIN}", f"DTSTAMP:{stamp.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}"]
+    return b"".join(_fold(line) for line in [*head, *lines, "END:VEVENT"])
+
+
+def _todo_title(title: str, completed: bool) -> str:
+    return _escape(("✓ " if completed else "") + title)
+
+
+def _todo_events(data: FeedData) -> Iterator[bytes]:
+    for ev in data.todos:
+        uid = f"todo-{ev['id']}"
+        start = ev["start_datetime"]
+        all_day = _is_all_day(start)
+        lines = [_start_property("DTSTART", start), f"SUMMARY:{_todo_title(ev['title'], ev['completed'])}"]
+        if not ev["rrule"]:
+            yield _event(uid, data.stamp, lines)
+            continue
+
+        # Stored once per series: one RRULE plus EXDATEs and RECURRENCE-ID overrides
+        rule = recurrence.parse_rrule(ev["rrule"]).rule
+        lines.append(_rrule(start.date(), rule, ev["series_until"], all_day))
+        cancelled = [o["occurrence_date"] for o in ev["overrides"] if o["cancelled"]]
+        if cancelled:
+            if all_day:
+                lines.append("EXDATE;VALUE=DATE:" + ",".join(_date_value(d) for d in cancelled))
+            else:
+                lines.append("EXDATE:" + ",".join(_datetime_value(datetime.combine(d, start.time())) for d in cancelled))
+        yield _event(uid, data.stamp, lines)
+
+        for o in ev["overrides"]:
+            if o["cancelled"]:
+                continue
+            original = datetime.combine(o["occurrence_date"], start.time())
+            yield _event(uid, data.stamp, [
+                _start_property("RECURRENCE-ID", original),
+                _start_property("DTSTART", o["start_datetime"] or original),
+                f"SUMMARY:{_todo_title(o['title'] or ev['title'], o['completed'])}",
+            ])
+
+
+def _supplement_events(data: FeedData) -> Iterator[bytes]:
+    for us in data.supplements:
+        rule = recurrence.parse_cycle(us["cycle"])
+        # end_date is inclusive, like the until of recurrence.occurrences
+        until = datetime.combine(_day(us["end_date"]), time.max.replace(microsecond=0)) if us["end_date"] else None
+        # One series per reminder time, at the same times as the materialized reminders
+        for at in data.plan.supplement_times(us["time_of_day"]):
+            start = datetime.combine(_day(us["start_date"]), at)
+            lines = [
+                f"DTSTART:{_datetime_value(start)}",
+                f"DURATION:{_SUPPLEMENT_DURATION}",
+                f"SUMMARY:{_escape(us['name'] + ' 복용')}",
+            ]
+            if rule.unit is not None:
+                lines.append(_rrule(start.date(), rule, until, all_day=False))
+            yield _event(f"supplement-{us['id']}-{at:%H%M}", data.stamp, lines)
+
+
+def _all_day(uid: str, stamp: datetime, title: str, first: date, end: Optional[date] = None) -> bytes:
+    lines = [f"DTSTART;VALUE=DATE:{_date_value(first)}", f"SUMMARY:{_escape(title)}"]
+    if end is not None:
+        lines.append(f"DTEND;VALUE=DATE:{_date_value(end)}")
+    return _event(uid, stamp, lines)
+
+
+def _pregnancy_events(data: FeedData) -> Iterator[bytes]:
+    preg = data.pregnancy
+    if not preg or not preg["pregnancy_start"] or not preg["due_date"]:
+        return
+    start, due = preg["pregnancy_start"], preg["due_date"]
+    for week, title in _PREGNANCY_MILESTONES:
+        day = start + timedelta(weeks=week - 1)
+        if day < due:
+            yield _all_day(f"pregnancy-{data.user_id}-w{week}", data.stamp, title, day)
+    yield _all_day(f"pregnancy-{data.user_id}-due", data.stamp, "출산 예정일", due)
+
+
+def _period_events(data: FeedData) -> Iterator[bytes]:
+    # Projected starts are not evenly spaced (rounded mean cycle), so each cycle is its own event
+    proj = data.projection
+    if not proj or not proj["cycle_starts"]:
+        return
+    spans = period_prediction.phase_spans(proj["cycle_starts"], proj["cycle_length"], proj["period_length"])
+    for phase, first, end in spans:
+        if phase not in _PERIOD_TITLES:
+            continue
+        title = _PERIOD_TITLES[phase]
+        if phase == "menstruation" and first not in data.logged_starts:
+            title += " (예상)"
+        yield _all_day(f"period-{data.user_id}-{phase}-{_date_value(first)}", data.stamp, title, first, end)
+
+
+def iter_ics(data: FeedData) -> Iterator[bytes]:
+    """The feed as iCalendar content lines, one component at a time, for StreamingResponse."""
+    yield b"".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Baby Prep//Calendar Feed//KO",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:Baby Prep",
+        # Polling hint for subscribing clients; unchanged feeds are answered with 304
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+        "X-PUBLISHED-TTL:PT1H",
+    ))
+    yield from _todo_events(data)
+    yield from _supplement_events(data)
+    yield from _pregnancy_events(data)
+    yield from _period_events(data)
+    yield _fold("END:VCALENDAR")
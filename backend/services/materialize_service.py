@@ -0,0 +1,131 @@
+from __future__ import annotations
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Supplement reminders exist this many days ahead of today
+MATERIALIZE_HORIZON_DAYS = int(os.getenv("MATERIALIZE_HORIZON_DAYS", "14"))
+# Run the rolling job inside the API process. Off by default: the nightly
+# `python -m services.materialize_service` run covers it, and every API worker
+# would otherwise regenerate the whole horizon on its own
+MATERIALIZE_ROLLING = os.getenv("MATERIALIZE_ROLLING", "0") == "1"
+# How often the rolling job pushes the horizon forward for every user
+MATERIALIZE_INTERVAL_SECONDS = float(os.getenv("MATERIALIZE_INTERVAL_SECONDS", str(6 * 3600)))
+# Users per INSERT ... SELECT statement (and transaction) in materialize_users
+MATERIALIZE_BATCH_USERS = int(os.getenv("MATERIALIZE_BATCH_USERS", "5000"))
+# "JobWatermark" row holding the day every user's reminders reach, exclusive
+WATERMARK_JOB = "supplement_reminders"
+
+
+def _window(today: Optional[date] = None) -> tuple[date, date]:
+    today = today or date.today()
+    return today, today + timedelta(days=MATERIALIZE_HORIZON_DAYS + 1)
+
+
+def refresh_user_supplements(user_id: int) -> dict:
+    """
+    Rebuild a user's pending supplement reminders after a UserSupplement was
+    added, changed or removed. Runs as a background task after the request
+    committed, in its own transaction.
+    """
+    start, until = _window()
+    with db.unit_of_work() as uow:
+        db.delete_pending_supplement_events(user_id, datetime.now(), uow=uow)
+        return db.materialize_supplement_events(start, until, user_id, uow=uow)
+
+
+def materialize_users(
+    start: date,
+    until: date,
+    batch_size: int = MATERIALIZE_BATCH_USERS,
+    after_user_id: int = 0,
+    through_user_id: Optional[int] = None,
+) -> dict:
+    """
+    Create the supplement events and reminders in [start, until) for every user
+    with a UserSupplement, `batch_size` users per statement. Each batch commits
+    on its own, so an interrupted run keeps what it finished and a rerun only
+    fills the gaps.
+    """
+    started = time.perf_counter()
+    report = {"users": 0, "events": 0, "reminders": 0, "batches": 0}
+    after = after_user_id
+    if start >= until:
+        report["seconds"] = round(time.perf_counter() - started, 2)
+        return report
+    while True:
+        with db.unit_of_work() as uow:
+            batch = db.fetch_supplement_user_batch(after, batch_size, through_user_id, uow=uow)
+            if batch is None:
+                break
+            created = db.materialize_supplement_events(start, until, batch["first_user"], batch["last_user"], uow=uow)
+        report["users"] += batch["users"]
+        report["events"] += created["events"]
+        report["reminders"] += created["reminders"]
+        report["batches"] += 1
+        after = batch["last_user"]
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def materialize_horizon(today: Optional[date] = None, full: bool = False) -> dict:
+    """
+    Extend every user's supplement reminders up to the rolling horizon. Only the
+    days past the last completed run are generated; schedule changes in between
+    are rebuilt per user by refresh_user_supplements. `full` regenerates the
+    whole window, e.g. after UserSupplement rows were written outside the API.
+    """
+    start, until = _window(today)
+    done_until = None if full else db.fetch_job_watermark(WATERMARK_JOB)
+    if done_until is not None:
+        start = max(start, done_until)
+    report = materialize_users(start, until)
+    db.set_job_watermark(WATERMARK_JOB, until)
+    report.update({"from": start.isoformat(), "until": until.isoformat()})
+    logger.info("supplement reminders materialized: %s", report)
+    return report
+
+
+class RollingMaterializer:
+    """Daemon thread that calls materialize_horizon() every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="materialize-horizon", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                materialize_horizon()
+            except Exception:
+                logger.exception("supplement materialization failed")
+            self._stop.wait(self.interval)
+
+
+rolling_materializer = RollingMaterializer(MATERIALIZE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    # python -m services.materialize_service [--full]  (nightly; --full rebuilds the whole window)
+    logging.basicConfig(level=logging.INFO)
+    print(materialize_horizon(full="--full" in sys.argv[1:]))
@@ -0,0 +1,264 @@
+from __future__ import annotations
+import logging
+import heapq
+import os
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Type
+
+import db
+from services import delivery_plan
+
+logger = logging.getLogger(__name__)
+
+# Reminders claimed per transaction, and so the most one worker holds locked at a time
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "500"))
+# How far ahead the scheduler keeps reminders in memory
+REMINDER_WINDOW = timedelta(minutes=float(os.getenv("REMINDER_WINDOW_MINUTES", "10")))
+# Delivery attempts before an undelivered reminder is left to GET /notifications/due
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+# Reminders this much past their time are dropped (marked sent) instead of delivered late
+REMINDER_EXPIRY = timedelta(minutes=float(os.getenv("REMINDER_EXPIRE_MINUTES", "180")))
+# Pause before reconnecting after the listener connection failed
+SCHEDULER_RETRY_SECONDS = 5.0
+# Channel and horizon of the change triggers in migrations/m0011_notification_changes.py
+CHANNEL = "reminder_changes"
+NOTIFY_HORIZON = timedelta(hours=1)
+# Key into SENDERS
+NOTIFICATION_SENDER = os.getenv("NOTIFICATION_SENDER", "log")
+
+
+class NotificationSender(ABC):
+    """
+    Delivers one claimed batch. `send` gets rows from db.claim_due_notifications
+    and returns the ids it delivered; the others are retried after a backoff
+    (db.defer_notifications), at most REMINDER_MAX_ATTEMPTS times.
+    """
+
+    @abstractmethod
+    def send(self, notifications: List[dict]) -> Iterable[int]:
+        ...
+
+
+class LogSender(NotificationSender):
+    """Writes each reminder to the log. Stands in until a push provider is wired up."""
+
+    def send(self, notifications: List[dict]) -> Iterable[int]:
+        for n in notifications:
+            logger.info("reminder %s for user %s at %s: %s", n["id"], n["user_id"], n["notify_time"], n["title"])
+        return [n["id"] for n in notifications]
+
+
+class FakeSender(NotificationSender):
+    """Records deliveries in memory (shared by all threads); ids in `fail` are reported undelivered."""
+
+    def __init__(self, fail: Iterable[int] = ()):
+        self.fail = set(fail)
+        self.sent: List[dict] = []
+        self._lock = threading.Lock()
+
+    def send(self, notifications: List[dict]) -> Iterable[int]:
+        delivered = [n for n in notifications if n["id"] not in self.fail]
+        with self._lock:
+            self.sent.extend(delivered)
+        return [n["id"] for n in delivered]
+
+
+SENDERS: Dict[str, Type[NotificationSender]] = {"log": LogSender, "fake": FakeSender}
+
+
+def _deliver(sender: NotificationSender, batch: List[dict], now: datetime, uow: db.UnitOfWork) -> int:
+    """
+    Hand a claimed batch to `sender`, mark what it delivered and defer the
+    rest; returns how many were marked sent. Reminders of users who turned
+    notifications off, and reminders older than REMINDER_EXPIRY, are marked
+    sent without delivery, so they never go out late in a burst.
+    """
+    plans = delivery_plan.get_plans([n["user_id"] for n in batch], uow=uow)
+    expired_before = now - REMINDER_EXPIRY
+    deliverable = [n for n in batch if plans[n["user_id"]].enabled and n["notify_time"] > expired_before]
+    delivering = {n["id"] for n in deliverable}
+    suppressed = [n["id"] for n in batch if n["id"] not in delivering]
+    delivered = set(sender.send(deliverable)) if deliverable else set()
+    sent = db.mark_notifications_sent([*delivered, *suppressed], uow=uow)
+    db.defer_notifications(
+        [i for i in delivering if i not in delivered], now, REMINDER_MAX_ATTEMPTS, REMINDER_EXPIRY, uow=uow
+    )
+    return sent
+
+
+def dispatch_batch(sender: NotificationSender, limit: int = DISPATCH_BATCH_SIZE, now: Optional[datetime] = None) -> tuple[int, int]:
+    """
+    Claim up to `limit` due reminders, deliver them through `sender`, mark the
+    delivered ones sent and defer the rest, in one transaction. Returns
+    (claimed, sent).
+
+    The rows stay locked until the commit, so other workers skip them. If the
+    sender raises, the transaction rolls back and the whole batch is claimed
+    again later: delivery is at least once, never concurrent.
+    """
+    # notify_time is naive local time, like CalendarEvent.start_datetime
+    now = now or datetime.now()
+    with db.unit_of_work() as uow:
+        batch = db.claim_due_notifications(now, limit, uow=uow)
+        if not batch:
+            return 0, 0
+        sent = _deliver(sender, batch, now, uow)
+    return len(batch), sent
+
+
+def drain(sender: NotificationSender, limit: int = DISPATCH_BATCH_SIZE, now: Optional[datetime] = None) -> dict:
+    """Dispatch batches until fewer than `limit` reminders are left to claim."""
+    started = time.perf_counter()
+    claimed = sent = batches = 0
+    while True:
+        batch_claimed, batch_sent = dispatch_batch(sender, limit, now)
+        claimed += batch_claimed
+        sent += batch_sent
+        batches += bool(batch_claimed)
+        if batch_claimed < limit:
+            break
+    return {"claimed": claimed, "sent": sent, "batches": batches, "seconds": round(time.perf_counter() - started, 2)}
+
+
+class Scheduler:
+    """
+    Daemon thread that keeps the reminders due in the next `window` in a heap
+    and fires each at its notify_time (or retry_at), instead of polling.
+
+    Postgres is read once per half window to extend the heap, and otherwise
+    only when migration 0011's triggers report changed reminders on
+    CHANNEL; those ids are re-read and rescheduled. Firing claims the ids with
+    db.claim_notifications, so any number of schedulers and drain() workers
+    can run side by side without delivering a reminder twice.
+    """
+
+    def __init__(self, sender: NotificationSender, window: timedelta = REMINDER_WINDOW, limit: int = DISPATCH_BATCH_SIZE):
+        self.sender = sender
+        # The triggers only announce reminders due within NOTIFY_HORIZON
+        self.window = min(window, NOTIFY_HORIZON)
+        self.limit = limit
+        self._heap: List[tuple[datetime, int]] = []
+        # id -> due time; heap entries that disagree with it are stale
+        self._due: Dict[int, datetime] = {}
+        self._refill_at = datetime.min
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._wake: Optional[tuple[int, int]] = None
+        self.counters = {"fired": 0, "sent": 0, "changes": 0, "reloads": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._wake = os.pipe()
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            os.write(self._wake[1], b"x")
+            self._thread.join(timeout=5)
+            self._thread = None
+            for fd in self._wake:
+                os.close(fd)
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._due), "window_seconds": self.window.total_seconds(), **self.counters}
+
+    def schedule(self, notification_id: int, due: datetime) -> None:
+        self._due[notification_id] = due
+        heapq.heappush(self._heap, (due, notification_id))
+
+    def unschedule(self, notification_id: int) -> None:
+        self._due.pop(notification_id, None)
+
+    def _next_due(self) -> Optional[datetime]:
+        while self._heap:
+            due, notification_id = self._heap[0]
+            if self._due.get(notification_id) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        fired = []
+        while (due := self._next_due()) is not None and due <= now:
+            fired.append(heapq.heappop(self._heap)[1])
+            del self._due[fired[-1]]
+        return fired
+
+    def _reload(self, now: datetime, replace: bool = False) -> None:
+        # Merged into the heap: reminders announced beyond the window must survive a refill
+        if replace:
+            self._heap, self._due = [], {}
+        for row in db.fetch_pending_notifications(now + self.window):
+            self.schedule(row["id"], row["retry_at"] or row["notify_time"])
+        self._refill_at = now + self.window / 2
+        self.counters["reloads"] += 1
+
+    def _apply_changes(self, notification_ids: List[int]) -> None:
+        rows = {row["id"]: row for row in db.fetch_notification_schedule(notification_ids)}
+        for notification_id in notification_ids:
+            row = rows.get(notification_id)
+            if row is None or row["is_sent"]:
+                self.unschedule(notification_id)
+            else:
+                self.schedule(notification_id, row["retry_at"] or row["notify_time"])
+        self.counters["changes"] += len(notification_ids)
+
+    def _fire(self, now: datetime) -> None:
+        fired = self._pop_due(now)
+        for i in range(0, len(fired), self.limit):
+            with db.unit_of_work() as uow:
+                batch = db.claim_notifications(fired[i:i + self.limit], now, uow=uow)
+                if batch:
+                    # Deferred ones come back through the update trigger with their retry_at
+                    self.counters["sent"] += _deliver(self.sender, batch, now, uow)
+        self.counters["fired"] += len(fired)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("reminder scheduler failed; reconnecting")
+                self._stop.wait(SCHEDULER_RETRY_SECONDS)
+
+    def _listen(self) -> None:
+        conn = db.open_listener(CHANNEL)
+        try:
+            # LISTEN before loading, so nothing changed in between goes unnoticed
+            self._reload(datetime.now(), replace=True)
+            while not self._stop.is_set():
+                now = datetime.now()
+                if now >= self._refill_at:
+                    self._reload(now)
+                self._fire(now)
+
+                wake_at = min(self._next_due() or self._refill_at, self._refill_at)
+                timeout = max((wake_at - datetime.now()).total_seconds(), 0)
+                ready, _, _ = select.select([conn, self._wake[0]], [], [], timeout)
+                if conn in ready:
+                    conn.poll()
+                    ids = [int(i) for n in conn.notifies for i in n.payload.split(",") if i]
+                    conn.notifies.clear()
+                    if ids:
+                        self._apply_changes(ids)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    # python -m services.notification_service  (start as many workers as needed)
+    logging.basicConfig(level=logging.INFO)
+    scheduler = Scheduler(SENDERS[NOTIFICATION_SENDER]())
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import logging
+import time
+from typing import Optional
+
+import db
+import period_prediction
+
+logger = logging.getLogger(__name__)
+
+# Users estimated per numpy batch and per upsert statement
+PROJECTION_BATCH_USERS = 5000
+
+
+def _project(rows: list[dict], uow: Optional[db.UnitOfWork] = None) -> int:
+    estimates = period_prediction.estimate_batch(
+        [r["user_id"] for r in rows],
+        [r["starts"] for r in rows],
+        [r["ends"] for r in rows],
+    )
+    db.upsert_period_projections(estimates, uow=uow)
+    return len(estimates)
+
+
+def refresh_user(user_id: int) -> None:
+    """
+    Re-estimate one user's cycle after a PeriodLog write. Runs as a background
+    task after the request committed, in its own transaction.
+    """
+    with db.unit_of_work() as uow:
+        rows = db.fetch_period_histories(user_ids=[user_id], uow=uow)
+        if rows:
+            _project(rows, uow=uow)
+        else:
+            db.delete_period_projection(user_id, uow=uow)
+
+
+def refresh_all(batch_size: int = PROJECTION_BATCH_USERS) -> dict:
+    """
+    Re-project every user with a period log, `batch_size` users per query,
+    estimate and upsert. Each batch commits on its own, so an interrupted run
+    keeps what it finished.
+    """
+    started = time.perf_counter()
+    users = batches = 0
+    after = 0
+    while True:
+        with db.unit_of_work() as uow:
+            rows = db.fetch_period_histories(after_user_id=after, limit=batch_size, uow=uow)
+            if not rows:
+                break
+            users += _project(rows, uow=uow)
+        batches += 1
+        after = rows[-1]["user_id"]
+    report = {"users": users, "batches": batches, "seconds": round(time.perf_counter() - started, 2)}
+    logger.info("period projections refreshed: %s", report)
+    return report
+
+
+if __name__ == "__main__":
+    # python -m services.period_service  (e.g. nightly, after PERIOD_PROJECTION_YEARS changes)
+    logging.basicConfig(level=logging.INFO)
+    print(refresh_all())
@@ -0,0 +1,270 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+import db
+from services.notification_service import NotificationSender, Scheduler
+
+logger = logging.getLogger(__name__)
+
+# Run the in-process scheduler that pushes reminders to connected sessions
+PUSH_NOTIFICATIONS = os.getenv("PUSH_NOTIFICATIONS", "1") == "1"
+# Comment line sent on an idle stream so proxies keep the connection open
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+_PING = ": ping\n\n"
+# Events buffered per session; a client that falls further behind loses the oldest
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "100"))
+# Channel that carries pushes to the process holding the stream (PushRelay)
+PUSH_CHANNEL = "reminder_push"
+# pg_notify payloads are capped at 8000 bytes
+_PAYLOAD_LIMIT = 7500
+# Pause before reconnecting after the relay's connection failed
+RELAY_RETRY_SECONDS = 5.0
+
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}", f"data: {json.dumps(data, ensure_ascii=False, default=str)}"]
+    if event_id is not None:
+        lines.insert(0, f"id: {event_id}")
+    return "\n".join(lines) + "\n\n"
+
+
+def reminder_event(n: dict) -> str:
+    data = {
+        "id": n["id"],
+        "event_id": n["event_id"],
+        "type": n["type"],
+        "title": n["title"],
+        "notify_time": n["notify_time"].isoformat(),
+    }
+    return sse_event("reminder", data, n["id"])
+
+
+class PushHub:
+    """
+    Open server-sent event streams by user id, one asyncio.Queue per stream.
+    Streams come and go on the event loop; publish() may be called from any
+    thread (the scheduler runs in one) and hands a whole batch to the loop in
+    a single callback. One timer sends the keep-alives of all idle streams, so
+    a parked stream costs a queue and a suspended generator, nothing more.
+    """
+
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE, heartbeat: float = PUSH_HEARTBEAT_SECONDS):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._sessions: Dict[int, Set[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Called when the set of users with a stream changes (PushRelay)
+        self.on_presence: Optional[Callable[[], None]] = None
+        self.published = 0
+        self.dropped = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        loop.call_later(self.heartbeat, self._beat)
+
+    def _beat(self) -> None:
+        with self._lock:
+            queues = [queue for sessions in self._sessions.values() for queue in sessions]
+        for queue in queues:
+            if queue.empty():
+                queue.put_nowait(_PING)
+        self._loop.call_later(self.heartbeat, self._beat)
+
+    def connect(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            first = user_id not in self._sessions
+            self._sessions.setdefault(user_id, set()).add(queue)
+        if first and self.on_presence:
+            self.on_presence()
+        return queue
+
+    def disconnect(self, user_id: int, queue: asyncio.Queue) -> None:
+        last = False
+        with self._lock:
+            sessions = self._sessions.get(user_id)
+            if sessions is not None:
+                sessions.discard(queue)
+                if not sessions:
+                    del self._sessions[user_id]
+                    last = True
+        if last and self.on_presence:
+            self.on_presence()
+
+    def online_users(self) -> Set[int]:
+        with self._lock:
+            return set(self._sessions)
+
+    def publish(self, messages: Iterable[tuple[int, str]]) -> Set[int]:
+        """Queue (user_id, event) pairs on every stream of each user; returns the users that had one."""
+        targets = []
+        reached = set()
+        with self._lock:
+            for user_id, event in messages:
+                sessions = self._sessions.get(user_id)
+                if sessions:
+                    reached.add(user_id)
+                    targets.extend((queue, event) for queue in sessions)
+        if targets and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, targets)
+        return reached if self._loop is not None else set()
+
+    def _deliver(self, targets: List[tuple[asyncio.Queue, str]]) -> None:
+        for queue, event in targets:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+        self.published += len(targets)
+
+    async def stream(self, user_id: int) -> AsyncIterator[str]:
+        """SSE body for one client; unregisters when the client disconnects and the generator is closed."""
+        queue = self.connect(user_id)
+        try:
+            # Reconnect delay hint for EventSource
+            yield "retry: 5000\n\n"
+            while True:
+                yield await queue.get()
+        finally:
+            self.disconnect(user_id, queue)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = sum(len(s) for s in self._sessions.values())
+            users = len(self._sessions)
+        return {"users": users, "sessions": sessions, "published": self.published, "dropped": self.dropped}
+
+
+def _payloads(messages: List[list]) -> List[str]:
+    """[user_id, event] pairs as JSON arrays, as few NOTIFY payloads as fit the size cap."""
+    payloads, chunk, size = [], [], 2
+    for message in messages:
+        encoded = json.dumps(message, ensure_ascii=False)
+        length = len(encoded.encode()) + 1
+        if chunk and size + length > _PAYLOAD_LIMIT:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += length
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+    return payloads
+
+
+class PushRelay:
+    """
+    Connects the hubs of all app processes. Each process LISTENs on PUSH_CHANNEL
+    and hands what arrives to its own hub, and holds a shared advisory lock per
+    user with an open stream on the same connection, so a sender in any process
+    can tell who is connected somewhere (db.fetch_push_presence). The locks go
+    with the connection, so a crashed process never looks connected.
+    """
+
+    def __init__(self, hub: PushHub, channel: str = PUSH_CHANNEL):
+        self.hub = hub
+        self.channel = channel
+        # User ids locked on the current connection
+        self._held: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._wake: Optional[tuple[int, int]] = None
+        self.relayed = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._wake = os.pipe()
+            # Written from the event loop, which must never block on a full pipe
+            os.set_blocking(self._wake[1], False)
+            self.hub.on_presence = self._presence_changed
+            self._thread = threading.Thread(target=self._run, name="push-relay", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self.hub.on_presence = None
+            os.write(self._wake[1], b"x")
+            self._thread.join(timeout=5)
+            self._thread = None
+            for fd in self._wake:
+                os.close(fd)
+
+    def stats(self) -> dict:
+        return {"present": len(self._held), "relayed": self.relayed}
+
+    def _presence_changed(self) -> None:
+        try:
+            os.write(self._wake[1], b"x")
+        except BlockingIOError:
+            # Already woken; the relay reads the whole presence when it gets to it
+            pass
+
+    def _sync_presence(self, conn) -> None:
+        online = self.hub.online_users()
+        db.set_push_presence(conn, list(online - self._held), list(self._held - online))
+        self._held = online
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("push relay failed; reconnecting")
+                self._stop.wait(RELAY_RETRY_SECONDS)
+
+    def _listen(self) -> None:
+        conn = db.open_listener(self.channel)
+        # A new connection holds no locks yet
+        self._held = set()
+        try:
+            while not self._stop.is_set():
+                self._sync_presence(conn)
+                ready, _, _ = select.select([conn, self._wake[0]], [], [])
+                if self._wake[0] in ready:
+                    os.read(self._wake[0], 4096)
+                if conn in ready:
+                    conn.poll()
+                    messages = [(user_id, event) for n in conn.notifies for user_id, event in json.loads(n.payload)]
+                    conn.notifies.clear()
+                    self.relayed += len(self.hub.publish(messages))
+        finally:
+            self._held = set()
+            conn.close()
+
+
+class PushSender(NotificationSender):
+    """
+    Delivers reminders to the recipients' open streams. With a `channel` the
+    reminders go through Postgres to whichever process holds each stream
+    (PushRelay); without one only to `hub`, the streams of this process.
+    Reminders of users without a stream are reported undelivered: the
+    scheduler retries them a few times, then leaves them to the
+    GET /notifications/due fallback until they expire.
+    """
+
+    def __init__(self, hub: Optional[PushHub] = None, channel: Optional[str] = None):
+        self.hub = hub
+        self.channel = channel
+
+    def send(self, notifications: List[dict]) -> Iterable[int]:
+        if self.channel is None:
+            reached = self.hub.publish((n["user_id"], reminder_event(n)) for n in notifications)
+        else:
+            reached = db.fetch_push_presence({n["user_id"] for n in notifications})
+            messages = [[n["user_id"], reminder_event(n)] for n in notifications if n["user_id"] in reached]
+            db.publish_push(self.channel, _payloads(messages))
+        return [n["id"] for n in notifications if n["user_id"] in reached]
+
+
+hub = PushHub()
+relay = PushRelay(hub)
+# The one scheduler per process; SKIP LOCKED claims keep the processes' schedulers apart
+push_scheduler = Scheduler(PushSender(hub, PUSH_CHANNEL))
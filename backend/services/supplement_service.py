@@ -1,9 +1,10 @@
 from __future__ import annotations
 import db
 import uuid
+from typing import Optional
 from fastapi import HTTPException
 
-def add_recommended_supplement(user_id: str | int, nutrient_id: str, supplement_id: str):
+def add_recommended_supplement(user_id: str | int, nutrient_id: str, supplement_id: str, uow: Optional[db.UnitOfWork] = None):
     # supplement_id from frontend might be string (from presets) or int (from DB)
     # If it's a string that parses to int, we assume it's a DB ID.
     # If it's a string like "folic800", it's from presets and we can't link it to DB table easily unless we map it.
@@ -16,9 +17,9 @@ def add_recommended_supplement(user_id: str | int, nutrient_id: str, supplement_
     try:
         sup_id_int = int(supplement_id)
         # Check if it exists in DB
-        sup = db.fetch_supplement_by_id(sup_id_int)
+        sup = db.fetch_supplement_by_id(sup_id_int, uow=uow)
         if sup:
-            return db.add_user_supplement(int(user_id), sup_id_int)
+            return db.add_user_supplement(int(user_id), sup_id_int, uow=uow)
     except ValueError:
         pass
 
@@ -40,5 +41,6 @@ def add_recommended_supplement(user_id: str | int, nutrient_id: str, supplement_
         user_id=int(user_id),
         name=supplement["name"],
         schedule=supplement["schedule"],
-        notes=supplement.get("caution")
+        notes=supplement.get("caution"),
+        uow=uow
     )
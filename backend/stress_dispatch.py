@@ -0,0 +1,92 @@
+"""
+Run several notification dispatchers at once against a scratch user's
+reminders and check that SKIP LOCKED claiming delivers each one exactly once,
+and that undelivered reminders stay unsent until their retry time.
+Run `python -m migrations upgrade` first. The scratch user is deleted afterwards.
+
+The reminders are dated in 2000 and dispatched "as of" 2000-01-01 01:00, so
+only rows older than that (normally none) besides the scratch ones are touched.
+A last pass after REMINDER_EXPIRY checks that the undelivered ones expire.
+
+Usage: python stress_dispatch.py [reminders] [workers]
+"""
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import db
+from services import notification_service
+
+AS_OF = datetime(2000, 1, 1, 1)
+
+
+def seed(user_id: int, count: int) -> list[int]:
+    first = datetime(2000, 1, 1)
+    todos = [(f"stress {i}", first + timedelta(milliseconds=i), None) for i in range(count)]
+    with db.unit_of_work() as uow:
+        events = db.create_todos(user_id, todos, uow=uow)
+        with db.get_conn(uow) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                'INSERT INTO "Notification" (event_id, notify_time, is_sent) '
+                'SELECT e.id, e.start_datetime, FALSE FROM "CalendarEvent" e WHERE e.id = ANY(%s) RETURNING id',
+                ([e["id"] for e in events],),
+            )
+            return [row["id"] for row in cur.fetchall()]
+
+
+def unsent(ids: list[int]) -> set[int]:
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT id FROM "Notification" WHERE id = ANY(%s) AND is_sent = false', (ids,))
+        return {row["id"] for row in cur.fetchall()}
+
+
+def check(label, actual, expected):
+    ok = actual == expected
+    print(f"{'OK ' if ok else 'FAIL'} {label}: {actual} (expected {expected})")
+    return ok
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    social_id = f"stress-{uuid.uuid4().hex}"
+    user = db.create_social_user_with_profile(
+        provider="stress", social_id=social_id, email=f"{social_id}@stress.local",
+        nickname="stress", gender="F", height=160, weight=55.0,
+    )
+    try:
+        ids = seed(user["id"], count)
+        # Every 50th reminder fails to deliver and must be deferred, not re-claimed
+        failing = set(ids[::50])
+        sender = notification_service.FakeSender(fail=failing)
+
+        def worker(_):
+            # Small batches so the workers actually contend for rows
+            return notification_service.drain(sender, limit=50, now=AS_OF)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            reports = [f.result() for f in [pool.submit(worker, i) for i in range(workers)]]
+        seconds = time.perf_counter() - started
+
+        deliveries = Counter(n["id"] for n in sender.sent if n["id"] in set(ids))
+        print(f"{count} reminders, {workers} workers, {sum(r['batches'] for r in reports)} batches: {seconds:.2f}s")
+        checks = [
+            check("reminders delivered", len(deliveries), count - len(failing)),
+            check("reminders delivered more than once", sum(1 for n in deliveries.values() if n > 1), 0),
+            check("failed reminders still unsent", unsent(ids), failing),
+        ]
+        notification_service.drain(sender, now=AS_OF + notification_service.REMINDER_EXPIRY)
+        checks.append(check("failed reminders unsent after expiry", unsent(ids), set()))
+        return all(checks)
+    finally:
+        db.delete_user_by_id(user["id"])
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,180 @@
+"""
+Load-test the reminder push hub (services/push_service.py) with many idle
+server-sent event streams. Each simulated client consumes PushHub.stream(),
+the same generator GET /notifications/stream returns. The test reports:
+
+- memory per idle stream: tracemalloc growth after all streams are parked
+  on their queues, divided by the stream count. This covers the hub, queue
+  and generator; uvicorn adds its own per-socket buffers on top.
+- fan-out latency: one reminder per user is published from a separate thread,
+  as the dispatcher does. Latency runs from publish() to each client receiving
+  its event.
+
+With [workers] above 1, the streams are spread over that many processes,
+each with its own hub and PushRelay, like uvicorn workers. One reminder per
+user, plus some for users without a stream, is then sent from the parent
+process through Postgres (PushSender with PUSH_CHANNEL). Every stream must get
+its reminder and only the connected users may be reported delivered. This
+mode needs DATABASE_URL; the single-process mode needs no database or server.
+
+Usage: python stress_push.py [connections] [workers]
+"""
+import asyncio
+import multiprocessing
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from services import push_service
+
+# Stream user ids for the multi-worker run, far above real ids so their presence locks never clash
+SCRATCH_USER_BASE = 2**60
+OFFLINE_USERS = 10
+
+
+async def client(hub: push_service.PushHub, user_id: int, ready: asyncio.Event, received: dict, done: asyncio.Event, expected: int):
+    stream = hub.stream(user_id)
+    try:
+        async for chunk in stream:
+            if chunk.startswith("retry:"):
+                ready.set()
+                continue
+            received[user_id] = time.perf_counter()
+            if len(received) == expected:
+                done.set()
+            return
+    finally:
+        await stream.aclose()
+
+
+async def run(connections: int) -> bool:
+    # No keep-alives during the run; they would only add noise
+    hub = push_service.PushHub(heartbeat=3600)
+    hub.bind(asyncio.get_running_loop())
+    received: dict = {}
+    done = asyncio.Event()
+    readies = [asyncio.Event() for _ in range(connections)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tasks = [
+        asyncio.create_task(client(hub, user_id, readies[user_id], received, done, connections))
+        for user_id in range(connections)
+    ]
+    for ready in readies:
+        await ready.wait()
+    # Let every client park on its queue
+    await asyncio.sleep(0.1)
+    idle = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    stats = hub.stats()
+    print(f"{stats['sessions']} idle streams: {idle / connections / 1024:.2f} KiB each ({idle / 2**20:.1f} MiB total)")
+
+    reminders = [reminder(user_id) for user_id in range(connections)]
+    sender = push_service.PushSender(hub)
+    published = {}
+
+    def dispatch():
+        published["at"] = time.perf_counter()
+        published["delivered"] = len(list(sender.send(reminders)))
+
+    thread = threading.Thread(target=dispatch)
+    thread.start()
+    await asyncio.wait_for(done.wait(), timeout=60)
+    thread.join()
+    await asyncio.gather(*tasks)
+
+    latencies = sorted((t - published["at"]) * 1000 for t in received.values())
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"fan-out to {connections} streams: p50 {statistics.median(latencies):.1f} ms, "
+        f"p99 {p99:.1f} ms, last {latencies[-1]:.1f} ms"
+    )
+
+    ok = published["delivered"] == connections and len(received) == connections and hub.stats()["sessions"] == 0
+    print(f"{'OK ' if ok else 'FAIL'} every stream got its reminder and unregistered")
+    return ok
+
+
+def reminder(user_id: int) -> dict:
+    return {"id": user_id, "event_id": user_id, "user_id": user_id, "type": "todo", "title": "병원 방문", "notify_time": datetime(2025, 1, 1, 9)}
+
+
+async def serve_streams(user_ids: list[int], ready, results) -> None:
+    """One worker process: streams for `user_ids` on a hub connected through a relay."""
+    hub = push_service.PushHub(heartbeat=3600)
+    hub.bind(asyncio.get_running_loop())
+    relay = push_service.PushRelay(hub)
+    relay.start()
+    received: dict = {}
+    done = asyncio.Event()
+    readies = {user_id: asyncio.Event() for user_id in user_ids}
+    tasks = [
+        asyncio.create_task(client(hub, user_id, readies[user_id], received, done, len(user_ids)))
+        for user_id in user_ids
+    ]
+    for event in readies.values():
+        await event.wait()
+    # Ready once every stream's presence lock is held
+    while relay.stats()["present"] < len(user_ids):
+        await asyncio.sleep(0.05)
+    ready.put(len(user_ids))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=60)
+    except asyncio.TimeoutError:
+        pass
+    for task in tasks:
+        task.cancel()
+    relay.stop()
+    # perf_counter is per process; wall clock compares across them
+    results.put([time.time() - (time.perf_counter() - t) for t in received.values()])
+
+
+def worker(user_ids: list[int], ready, results) -> None:
+    asyncio.run(serve_streams(user_ids, ready, results))
+
+
+def run_workers(connections: int, workers: int) -> bool:
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Queue(), context.Queue()
+    users = [SCRATCH_USER_BASE + i for i in range(connections)]
+    processes = [context.Process(target=worker, args=(users[w::workers], ready, results)) for w in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get(timeout=120)
+
+    offline = [SCRATCH_USER_BASE + connections + i for i in range(OFFLINE_USERS)]
+    sender = push_service.PushSender(channel=push_service.PUSH_CHANNEL)
+    published_at = time.time()
+    delivered = set(sender.send([reminder(user_id) for user_id in users + offline]))
+    arrivals = [t for _ in processes for t in results.get(timeout=120)]
+    for process in processes:
+        process.join()
+
+    latencies = sorted((t - published_at) * 1000 for t in arrivals)
+    if latencies:
+        print(
+            f"fan-out to {connections} streams over {workers} workers: "
+            f"p50 {statistics.median(latencies):.1f} ms, last {latencies[-1]:.1f} ms"
+        )
+    ok_delivered = delivered == set(users)
+    ok_received = len(arrivals) == connections
+    print(f"{'OK ' if ok_delivered else 'FAIL'} exactly the connected users reported delivered: {len(delivered)} of {len(users) + len(offline)}")
+    print(f"{'OK ' if ok_received else 'FAIL'} every stream got its reminder in its own worker: {len(arrivals)} of {connections}")
+    return ok_delivered and ok_received
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    if workers > 1:
+        return run_workers(connections, workers)
+    return asyncio.run(run(connections))
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
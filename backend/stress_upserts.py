@@ -0,0 +1,118 @@
+"""
+Hammer the upsert helpers from many threads against a scratch user and check
+that the unique indexes hold: one row per key and no lost column updates.
+Run `python -m migrations upgrade` first. The scratch user is deleted afterwards.
+"""
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+
+import db
+
+THREADS = 16
+ROUNDS = 50
+
+
+def hammer(fn, count=THREADS * ROUNDS):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for future in [pool.submit(fn, i) for i in range(count)]:
+            future.result()
+
+
+def count_rows(sql, params):
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchone()["n"]
+
+
+def check(label, actual, expected):
+    ok = actual == expected
+    print(f"{'OK ' if ok else 'FAIL'} {label}: {actual} (expected {expected})")
+    return ok
+
+
+def main():
+    social_id = f"stress-{uuid.uuid4().hex}"
+    ids = set()
+
+    def signup(i):
+        user = db.create_social_user_with_profile(
+            provider="stress", social_id=social_id, email=f"{social_id}@stress.local",
+            nickname="stress", gender="F", height=160, weight=55.0,
+        )
+        ids.add(user["id"])
+
+    hammer(signup, THREADS * 4)
+    results = [check("users created for one social account", len(ids), 1)]
+    user_id = ids.pop()
+
+    try:
+        start = date(2025, 1, 1)
+        event_time = datetime(2025, 1, 1, 9, 0)
+
+        # Half the threads set due_date, the other half pregnancy_start; COALESCE must keep both
+        def pregnancy(i):
+            if i % 2:
+                db.upsert_pregnancy_info(user_id, due_date=start + timedelta(days=280))
+            else:
+                db.upsert_pregnancy_info(user_id, pregnancy_start=start)
+
+        def period(i):
+            if i % 2:
+                db.upsert_period_info(user_id, last_period=start)
+            else:
+                db.upsert_period_info(user_id, period_start=start)
+
+        def profile(i):
+            db.upsert_user_profile(user_id, height=160, initial_weight=55.0, current_weight=55.0 + i % 5)
+
+        def event(i):
+            row = db.upsert_calendar_event(user_id, "stress", event_time, linked_supplement_id=1)
+            db.ensure_notification(row["id"], event_time)
+
+        def setting(i):
+            db.add_user_setting_time(user_id, time(8 + i % 3, 0))
+
+        for fn in (pregnancy, period, profile, event, setting):
+            hammer(fn)
+
+        results += [
+            check("PregnancyInfo rows", count_rows('SELECT count(*) AS n FROM "PregnancyInfo" WHERE user_id = %s', (user_id,)), 1),
+            check(
+                "PregnancyInfo rows with both dates",
+                count_rows(
+                    'SELECT count(*) AS n FROM "PregnancyInfo" WHERE user_id = %s AND due_date IS NOT NULL AND pregnancy_start IS NOT NULL',
+                    (user_id,),
+                ),
+                1,
+            ),
+            check(
+                "PeriodInfo rows with both dates",
+                count_rows(
+                    'SELECT count(*) AS n FROM "PeriodInfo" WHERE user_id = %s AND last_period IS NOT NULL AND period_start IS NOT NULL',
+                    (user_id,),
+                ),
+                1,
+            ),
+            check("UserProfile rows", count_rows('SELECT count(*) AS n FROM "UserProfile" WHERE user_id = %s', (user_id,)), 1),
+            check("CalendarEvent rows", count_rows('SELECT count(*) AS n FROM "CalendarEvent" WHERE user_id = %s', (user_id,)), 1),
+            check(
+                "Notification rows",
+                count_rows(
+                    'SELECT count(*) AS n FROM "Notification" WHERE event_id IN (SELECT id FROM "CalendarEvent" WHERE user_id = %s)',
+                    (user_id,),
+                ),
+                1,
+            ),
+            check("UserSetting rows", count_rows('SELECT count(*) AS n FROM "UserSetting" WHERE user_id = %s', (user_id,)), 3),
+        ]
+    finally:
+        db.delete_user_by_id(user_id)
+
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -116,6 +116,7 @@ export default CalendarTab
 import { useMemo, useEffect, useState } from 'react'
 import CalendarGrid from './CalendarGrid'
 import TodoForm from './TodoForm'
+import { todoKey } from '../utils/helpers'
 import './CalendarTab.css'
 
 const TodoList = ({ selectedDate, todos, onAdd, onToggle, onDelete }) => (
@@ -128,18 +129,18 @@ const TodoList = ({ selectedDate, todos, onAdd, onToggle, onDelete }) => (
     <ul className="todo-list-ui">
       {todos.length === 0 && <li className="empty-msg">등록된 할 일이 없어요 🍃</li>}
       {todos.map((todo) => (
-        <li key={todo.id} className="todo-item">
+        <li key={todoKey(todo)} className="todo-item">
           <label className="todo-label">
             <input
               type="checkbox"
               checked={todo.completed}
-              onChange={() => onToggle(todo.id)}
+              onChange={() => onToggle(todoKey(todo))}
             />
             <span className={todo.completed ? 'done' : ''}>{todo.text}</span>
           </label>
           <button
             className="delete-btn minus-btn"
-            onClick={() => onDelete(todo.id)}
+            onClick={() => onDelete(todoKey(todo))}
             aria-label="Delete todo"
           >
             -
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react'
 import { initialTodos } from '../data/presets'
-import { generateId } from '../utils/helpers'
+import { generateId, todoKey } from '../utils/helpers'
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000'
 
@@ -27,12 +27,14 @@ export function useCalendar(authToken, user) {
         })
     }
 
-    // Fetch monthly data
+    // The whole year comes back in one /calendar/range request, so paging
+    // through its months needs no further round trips
     useEffect(() => {
         if (!authToken) return
-        const fetchMonthly = async () => {
+        const fetchYear = async () => {
+            const year = calendarMonth.year
             try {
-                const res = await fetch(`${API_BASE}/calendar/monthly?year=${calendarMonth.year}&month=${calendarMonth.month + 1}&user_id=${user.id || 0}`, {
+                const res = await fetch(`${API_BASE}/calendar/range?from=${year}-01&to=${year}-12&user_id=${user.id || 0}`, {
                     headers: { 'Authorization': `Bearer ${authToken}` }
                 })
                 if (res.ok) {
@@ -44,8 +46,8 @@ export function useCalendar(authToken, user) {
                 console.error("Failed to fetch calendar data", e)
             }
         }
-        fetchMonthly()
-    }, [calendarMonth, authToken, user?.id])
+        fetchYear()
+    }, [calendarMonth.year, authToken, user?.id])
 
     const handleAddTodo = async (text, date) => {
         if (!text || !date) return
@@ -77,17 +79,42 @@ export function useCalendar(authToken, user) {
         }
     }
 
-    const handleToggleTodo = async (id) => {
-        setTodos((prev) => prev.map((todo) => (todo.id === id ? { ...todo, completed: !todo.completed } : todo)))
+    const handleToggleTodo = async (key) => {
+        // Only the one occurrence is toggled, not every occurrence of its series
+        const target = todos.find((todo) => todoKey(todo) === key)
+        setTodos((prev) => prev.map((todo) => (todoKey(todo) === key ? { ...todo, completed: !todo.completed } : todo)))
+
+        // Todos still waiting for their server id are only toggled locally
+        if (authToken && target && /^\d+$/.test(String(target.id))) {
+            try {
+                await fetch(`${API_BASE}/calendar/events/batch?user_id=${user.id}`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${authToken}`
+                    },
+                    body: JSON.stringify({
+                        complete: [{ id: Number(target.id), occurrenceDate: target.occurrenceDate, completed: !target.completed }]
+                    })
+                })
+            } catch (e) {
+                console.error("Failed to update todo", e)
+            }
+        }
     }
 
-    const handleDeleteTodo = async (id) => {
+    const handleDeleteTodo = async (key) => {
+        const target = todos.find((todo) => todoKey(todo) === key)
         // Optimistic update
-        setTodos((prev) => prev.filter((todo) => todo.id !== id))
+        setTodos((prev) => prev.filter((todo) => todoKey(todo) !== key))
 
-        if (authToken) {
+        if (authToken && target) {
+            // One occurrence of a repeating todo is cancelled on its own; the rest of the series stays
+            const path = target.occurrenceDate
+                ? `events/${target.id}/occurrences/${target.occurrenceDate}`
+                : `events/${target.id}`
             try {
-                const res = await fetch(`${API_BASE}/calendar/events/${id}?user_id=${user.id}`, {
+                const res = await fetch(`${API_BASE}/calendar/${path}?user_id=${user.id}`, {
                     method: 'DELETE',
                     headers: { 'Authorization': `Bearer ${authToken}` }
                 })
@@ -26,6 +26,23 @@ export function useNotifications(authToken, user) {
         fetchSettings()
     }, [authToken, user?.id])
 
+    // Reminders are pushed over server-sent events (GET /notifications/stream)
+    useEffect(() => {
+        if (!authToken || !notificationsEnabled || typeof EventSource === 'undefined') return
+        if ('Notification' in window && Notification.permission === 'default') {
+            Notification.requestPermission()
+        }
+        // EventSource cannot send headers, so the token goes in the query string
+        const source = new EventSource(`${API_BASE}/notifications/stream?token=${encodeURIComponent(authToken)}`)
+        source.addEventListener('reminder', (e) => {
+            const reminder = JSON.parse(e.data)
+            if ('Notification' in window && Notification.permission === 'granted') {
+                new Notification(reminder.title, { tag: `reminder-${reminder.id}` })
+            }
+        })
+        return () => source.close()
+    }, [authToken, notificationsEnabled])
+
     const addNotification = async (time) => {
         // Optimistic
         setNotifications(prev => [...prev, time].sort())
@@ -9,6 +9,9 @@ export const formatDate = (date) => {
 
 export const generateId = () => `${Date.now()}-${Math.random().toString(36).slice(2, 7)}`
 
+// Occurrences of a repeating todo share the series id; the occurrence date tells them apart
+export const todoKey = (todo) => (todo.occurrenceDate ? `${todo.id}:${todo.occurrenceDate}` : String(todo.id))
+
 export const calculateStage = (startDate, dueDate) => {
   if (!startDate || !dueDate) {
     return {